@@ -7,6 +7,7 @@ from mpos import Activity, add_focus_border, AppearanceManager, Intent, Connecti
 from confetti import Confetti
 from fullscreen_qr import FullscreenQR
 from payment import Payment
+from payments_view import PaymentsView
 import wallet_cache
 
 # Import wallet modules at the top so they're available when sys.path is restored
@@ -932,11 +933,15 @@ class DisplayWallet(Activity):
         self.payments_container.add_flag(lv.obj.FLAG.CLICKABLE)
         self.payments_container.add_event_cb(self.payments_label_clicked, lv.EVENT.CLICKED, None)
         add_focus_border(self.payments_container)
+        # payments_label carries status messages ("Connecting…", errors);
+        # the transactions themselves are per-row labels managed by
+        # PaymentsView, stacked below it in the same container.
         self.payments_label = lv.label(self.payments_container)
         self.payments_label.set_text("")
         # Label width follows its container (the 1.1× narrowing now
         # lives on the container; the label fills it).
         self.payments_label.set_width(lv.pct(100))
+        self.payments_view = PaymentsView(self.payments_container, self.payments_label)
         self.update_payments_label_font()
         # Force word-wrap as a belt-and-braces against any line that does
         # exceed the label width (long zap comments, long Bitcoin tx labels
@@ -1208,6 +1213,10 @@ class DisplayWallet(Activity):
         # Ensure the app's effective theme (local override or OS) is applied.
         # This never writes to OS prefs — see _apply_displaywallet_theme.
         _apply_displaywallet_theme(self.prefs)
+        # The user may have changed the MPOS number format (thousands
+        # separator) while we were in the background; move the render
+        # stamp so the next repaint re-formats the payment rows.
+        Payment.invalidate_rendered()
         # Detect wallet config change EARLY (before _apply_qr_theme and before
         # the else branch below) so we can wipe the display state before any
         # code path repaints the previous wallet's data onto the now-visible
@@ -1245,7 +1254,7 @@ class DisplayWallet(Activity):
                 lv.anim_delete(self.balance_label, None)
                 self.balance_label.set_text(lv.SYMBOL.REFRESH)
                 self.balance_unit_label.set_text("")
-                self.payments_label.set_text("")
+                self.payments_view.show_message("")
                 # Hide the QR widget until the new wallet emits a static
                 # receive code. redraw_static_receive_code_cb un-hides it
                 # when it has fresh data to draw. show_wallet_screen()
@@ -1287,7 +1296,7 @@ class DisplayWallet(Activity):
                 if hasattr(self, '_last_balance'):
                     self.display_balance(self._last_balance)
                 if self.wallet.payment_list and len(self.wallet.payment_list) > 0:
-                    self.payments_label.set_text(str(self.wallet.payment_list))
+                    self._show_wallet_payments()
             else:
                 # Wallet not running — reconnect
                 self.network_changed(cm.is_online())
@@ -1404,6 +1413,9 @@ class DisplayWallet(Activity):
         self.destination = None
         cm = ConnectivityManager.get()
         cm.unregister_callback(self.network_changed)
+        # Persist any write-behind cache updates now rather than up to
+        # FLUSH_DELAY_SECONDS later — the app may not come back.
+        wallet_cache.flush()
 
     def onDestroy(self, main_screen):
         # Stop the BOOT button watcher (its task checks
@@ -1418,6 +1430,7 @@ class DisplayWallet(Activity):
             except Exception:
                 pass
             self._stale_timer = None
+        wallet_cache.flush()
         # would be good to cleanup lv.layer_top() of those confetti images
 
     # ---- ESP32 BOOT button (GPIO0) handling ----------------------------------
@@ -1580,7 +1593,7 @@ class DisplayWallet(Activity):
         # doesn't keep ticking display_balance during the swap.
         lv.anim_delete(self.balance_label, None)
         self.balance_label.set_text(lv.SYMBOL.REFRESH)
-        self.payments_label.set_text("")
+        self.payments_view.show_message("")
         # Hide the previous wallet's QR until the new slot's static_receive_code
         # is loaded (from cache or fresh fetch).
         self.receive_qr.add_flag(lv.obj.FLAG.HIDDEN)
@@ -1610,18 +1623,71 @@ class DisplayWallet(Activity):
         Called from went_online() before wallet.start() so the UI shows
         the last-known data instantly while the network fetch is in
         flight. Any field whose fingerprint doesn't match comes back None
-        and is left in its default (spinner / Connecting... text)."""
+        and is left in its default (spinner / Connecting... text).
+
+        When the cache holds a display snapshot rendered with the current
+        settings, that is painted first (three set_text calls, no slot
+        parsing or number formatting) and the raw slot data is hydrated
+        into the real payment rows on the next scheduler pass."""
         if slot is None:
             slot, _ = self._active_slot_and_suffix()
         slot_key = wallet_cache.compute_slot_key(wallet_type, slot)
         creds_fp, qr_fp = wallet_cache.compute_fingerprints(wallet_type, self.prefs, slot=slot)
+        self._hydrating_slot_key = None
+        snapshot = wallet_cache.load_snapshot(slot_key, creds_fp, qr_fp, self._render_fingerprint())
+        if snapshot is not None:
+            self._paint_snapshot(snapshot)
+            print("Cache: painted slot '{}' from snapshot".format(slot_key))
+            self._hydrating_slot_key = slot_key
+            TaskManager.create_task(self._hydrate_from_cache(slot_key, creds_fp, qr_fp))
+            return True
+        return self._paint_cached_slot(slot_key, creds_fp, qr_fp)
+
+    def _paint_snapshot(self, snapshot):
+        self._current_denomination()  # payment rows hydrated later must match
+        self._last_balance = snapshot.get("balance")
+        self._set_balance_texts(snapshot.get("balance_number", ""), snapshot.get("balance_unit", ""))
+        if snapshot.get("payments_text"):
+            self.payments_view.show_message(snapshot["payments_text"])
+        qr_data = snapshot.get("static_receive_code")
+        if qr_data:
+            self.receive_qr_data = qr_data
+            self.receive_qr.update(qr_data, len(qr_data))
+            self.receive_qr.remove_flag(lv.obj.FLAG.HIDDEN)
+
+    async def _hydrate_from_cache(self, slot_key, creds_fp, qr_fp):
+        """Second half of a snapshot paint: swap the pre-rendered text for
+        real payment rows and seed the stale indicator. Skipped if another
+        paint or the wallet's own data got there first."""
+        await TaskManager.sleep(0)
+        if getattr(self, '_hydrating_slot_key', None) != slot_key:
+            return
+        self._hydrating_slot_key = None
+        cached = wallet_cache.load_slot(slot_key, creds_fp, qr_fp)
+        payments = cached["payments"]
+        # A wallet that already has payments (fetched, or seeded from this
+        # same cache by an incremental sync) wins over the raw slot.
+        wallet_payments = getattr(self.wallet, "payment_list", None) if self.wallet else None
+        if wallet_payments:
+            payments = wallet_payments
+        if payments is not None:
+            self.payments_view.show_payments(payments, self._payments_to_show())
+        # went_online resets stale tracking once the wallet is running;
+        # only the offline paint keeps the cache's age.
+        if not (self.wallet and self.wallet.is_running()):
+            self._seed_stale_from_cache(cached)
+
+    def _paint_cached_slot(self, slot_key, creds_fp, qr_fp):
         cached = wallet_cache.load_slot(slot_key, creds_fp, qr_fp)
         painted_anything = False
         if cached["balance"] is not None:
             self.display_balance(cached["balance"])
             painted_anything = True
         if cached["payments"] is not None:
-            self.payments_label.set_text(str(cached["payments"]))
+            # Only the rows that fit the "Transactions Shown" setting are
+            # hydrated from the cache; the wallet's first fetch replaces
+            # the list anyway.
+            self.payments_view.show_payments(cached["payments"], self._payments_to_show())
             painted_anything = True
         if cached["static_receive_code"] is not None:
             self.receive_qr_data = cached["static_receive_code"]
@@ -1630,24 +1696,62 @@ class DisplayWallet(Activity):
             painted_anything = True
         if painted_anything:
             print("Cache: painted slot '{}' from disk".format(slot_key))
-            # Seed the stale-tracking timer from the cache's last_updated so
-            # the indicator reflects true age of the painted data, across
-            # app restarts. If the slot is weeks old, the user sees an
-            # orange/red dot the moment the app opens.
-            #
-            # Fallback: slots written by older builds (pre last_updated
-            # support) don't have a timestamp. Treat those as "fresh right
-            # now" so the dot doesn't appear immediately on cached data we
-            # can't date — the next successful refresh will stamp a real
-            # last_updated and future paints will use it.
-            lu = cached.get("last_updated")
-            if lu is None:
-                lu = int(time.time())
-                print("Cache: slot has no last_updated, seeding as now")
-            self._last_success_ts = lu
-            self._refresh_stale_indicator()
+            self._seed_stale_from_cache(cached)
         return painted_anything
 
+    def _seed_stale_from_cache(self, cached):
+        # Seed the stale-tracking timer from the cache's last_updated so
+        # the indicator reflects true age of the painted data, across
+        # app restarts. If the slot is weeks old, the user sees an
+        # orange/red dot the moment the app opens.
+        #
+        # Fallback: slots written by older builds (pre last_updated
+        # support) don't have a timestamp. Treat those as "fresh right
+        # now" so the dot doesn't appear immediately on cached data we
+        # can't date — the next successful refresh will stamp a real
+        # last_updated and future paints will use it.
+        lu = cached.get("last_updated")
+        if lu is None:
+            lu = int(time.time())
+            print("Cache: slot has no last_updated, seeding as now")
+        self._last_success_ts = lu
+        self._refresh_stale_indicator()
+
+    def _render_fingerprint(self):
+        """Everything a display snapshot's strings depend on besides the
+        wallet data: denomination, rows shown and the number format
+        (captured by formatting a sample value)."""
+        _, s = self._active_slot_and_suffix()
+        denom = self.prefs.get_string("balance_denomination" + s, "sats")
+        return "{}|{}|{}".format(denom, self._payments_to_show(),
+                                 NumberFormat.format_number(1234.5, 1))
+
+    def _save_display_snapshot(self):
+        """Store what a cold start should paint for the running wallet's
+        slot (see wallet_cache.save_snapshot). Called whenever the balance,
+        payments or QR on screen settle on new values."""
+        w = self.wallet
+        if not w or w.creds_fingerprint is None or w.last_known_balance is None:
+            return
+        balance = w.last_known_balance
+        number_text, unit_text = self._balance_texts(balance, self._current_denomination())
+        n = self._payments_to_show()
+        rows = []
+        for p in w.payment_list:
+            if len(rows) >= n:
+                break
+            rows.append(str(p))
+        wallet_cache.save_snapshot(w.slot_key, {
+            "creds_fp": w.creds_fingerprint,
+            "qr_fp": w.qr_fingerprint,
+            "render_fp": self._render_fingerprint(),
+            "balance": balance,
+            "balance_number": number_text,
+            "balance_unit": unit_text,
+            "payments_text": "\n".join(rows),
+            "static_receive_code": self.receive_qr_data,
+        })
+
     # Colour palette for the stale indicator. Applied to the lightning_bolt
     # label's text color and as a recolor-overlay on the chain_link image —
     # the wallet-type icon doubles as the freshness signal so users don't
@@ -1798,6 +1902,18 @@ class DisplayWallet(Activity):
     def _stale_timer_tick(self, timer):
         self._refresh_stale_indicator()
         self._maybe_auto_scroll_payments_to_top()
+        self._log_payments_view_stats()
+
+    def _log_payments_view_stats(self):
+        """Once per stale-timer tick (every minute), report how often the
+        payments list was actually re-laid-out vs skipped as unchanged."""
+        view = getattr(self, 'payments_view', None)
+        if view is None:
+            return
+        stats = view.take_stats()
+        if stats["relayouts"] or stats["skipped"]:
+            print("DisplayWallet: payments view last minute: {} re-layouts, {} rows re-texted, {} redraws skipped".format(
+                stats["relayouts"], stats["texts_set"], stats["skipped"]))
 
     def went_online(self):
         if self.wallet and self.wallet.is_running():
@@ -1867,7 +1983,7 @@ class DisplayWallet(Activity):
         # `PAYMENTS_TO_SHOW = 21` default. LNBits / NWC use this as the
         # `limit=` parameter on their list_transactions backend call;
         # onchain fetches all transactions from Blockbook regardless,
-        # so the cap there is enforced at display time via head_str
+        # so the cap there is enforced at display time via PaymentsView
         # rather than at fetch time.
         self.wallet.PAYMENTS_TO_SHOW = self._payments_to_show()
         # Stamp the (per-wallet-type, per-slot) cache identity onto the wallet
@@ -1887,7 +2003,7 @@ class DisplayWallet(Activity):
         if not painted_from_cache and not (hasattr(self, '_last_balance') and self._last_balance):
             self.balance_label.set_text(lv.SYMBOL.REFRESH)
             self.balance_unit_label.set_text("")
-            self.payments_label.set_text(f"\nConnecting to {wallet_type} backend.\n\nIf this takes too long, it might be down or something's wrong with the settings.")
+            self.payments_view.show_message(f"\nConnecting to {wallet_type} backend.\n\nIf this takes too long, it might be down or something's wrong with the settings.")
         # by now, self.wallet can be assumed
         self.wallet.start(self.balance_updated_cb, self.redraw_payments_cb, self.redraw_static_receive_code_cb, self.error_cb)
         # Hook the per-poll success signal so the stale indicator resets
@@ -1915,7 +2031,7 @@ class DisplayWallet(Activity):
             self._paint_from_cache(wallet_type, slot)
         # Don't overwrite cached data with offline message
         if not (hasattr(self, '_last_balance') and self._last_balance):
-            self.payments_label.set_text(f"WiFi is not connected, can't talk to wallet...")
+            self.payments_view.show_message(f"WiFi is not connected, can't talk to wallet...")
 
     def show_welcome_screen(self):
         """Hide wallet widgets, show welcome container."""
@@ -2095,7 +2211,7 @@ class DisplayWallet(Activity):
         Note: the FETCH count won't drop instantly when the user lowers
         the cap — the existing cached payment_list still has the
         previously-fetched entries until the next poll replaces it. The
-        head_str slice below ensures only the new count is shown in the
+        row limit below ensures only the new count is shown in the
         meantime."""
         _, s = self._active_slot_and_suffix()
         key = "payments_to_show" + s
@@ -2116,13 +2232,12 @@ class DisplayWallet(Activity):
             editor.commit()
         if self.wallet:
             self.wallet.PAYMENTS_TO_SHOW = n
-            # Instant on-screen refresh — slice the existing payment_list
-            # to the new limit. UniqueSortedList.head_str(n) handles the
-            # truncation; falls back gracefully when payment_list is None
+            # Instant on-screen refresh — show only the first n rows of
+            # the existing payment_list; skipped when payment_list is None
             # or empty (e.g. wallet hasn't completed first fetch yet).
             pl = getattr(self.wallet, "payment_list", None)
-            if pl and len(pl) > 0 and hasattr(pl, "head_str"):
-                self.payments_label.set_text(pl.head_str(n))
+            if pl and len(pl) > 0:
+                self.payments_view.show_payments(pl, n)
 
     def _on_static_receive_code_changed(self, new_value):
         """Called when the user edits any "Optional ... Address" override
@@ -2224,7 +2339,7 @@ class DisplayWallet(Activity):
             self.display_balance(self._last_balance)
 
     def update_payments_label_font(self):
-        self.payments_label.set_style_text_font(self.payments_label_fonts[self.payments_label_current_font], lv.PART.MAIN)
+        self.payments_view.set_font(self.payments_label_fonts[self.payments_label_current_font])
 
     def payments_label_clicked(self, event):
         if self._is_screen_locked():
@@ -2232,14 +2347,32 @@ class DisplayWallet(Activity):
         self.payments_label_current_font = (self.payments_label_current_font + 1) % len(self.payments_label_fonts)
         self.update_payments_label_font()
 
-    def display_balance(self, balance):
-         self._last_balance = balance
+    def _current_denomination(self):
+         """Read the active slot's balance denomination and sync
+         Payment.use_symbol with it (payment rows follow the balance's
+         ₿-symbol mode)."""
          # Slot-aware denom read: slot 1 uses `balance_denomination`,
          # slot 2 uses `balance_denomination_2` (multi-wallet).
          _, s = self._active_slot_and_suffix()
          denom = self.prefs.get_string("balance_denomination" + s, "sats")
          Payment.use_symbol = (denom == "\u20bf symbol")
+         return denom
+
+    def display_balance(self, balance):
+         self._last_balance = balance
+         number_text, unit_text = self._balance_texts(balance, self._current_denomination())
+         self._set_balance_texts(number_text, unit_text)
+
+    def _set_balance_texts(self, number_text, unit_text):
          self.balance_label.align(lv.ALIGN.TOP_LEFT, 2, 0)
+         self.balance_label.set_text(number_text)
+         self.balance_unit_label.set_text(unit_text)
+         # Re-align the unit label every time we update because the number
+         # label's content-fitted width changes with each new value \u2014 the
+         # unit needs to follow.
+         self.balance_unit_label.align_to(self.balance_label, lv.ALIGN.OUT_RIGHT_BOTTOM, -2, 0)
+
+    def _balance_texts(self, balance, denom):
          # Split the balance into a big number + a smaller unit suffix.
          # See onCreate for the layout reasoning. Each branch sets
          # `number_text` (rendered in the big font) and `unit_text`
@@ -2274,12 +2407,7 @@ class DisplayWallet(Activity):
              # pre-split single-string behaviour (everything in the big font).
              number_text = str(balance)
              unit_text = ""
-         self.balance_label.set_text(number_text)
-         self.balance_unit_label.set_text(unit_text)
-         # Re-align the unit label every time we update because the number
-         # label's content-fitted width changes with each new value \u2014 the
-         # unit needs to follow.
-         self.balance_unit_label.align_to(self.balance_label, lv.ALIGN.OUT_RIGHT_BOTTOM, -2, 0)
+         return number_text, unit_text
 
     def balance_updated_cb(self, sats_added=0):
         print(f"balance_updated_cb(sats_added={sats_added})")
@@ -2312,11 +2440,11 @@ class DisplayWallet(Activity):
                 # its first fetch, so we rely on the fetch_payments triggered
                 # inside handle_new_balance to repaint.
                 if not (hasattr(self, '_last_balance') and self._last_balance):
-                    self.payments_label.set_text("Connected.\nNo payments yet.")
+                    self.payments_view.show_message("Connected.\nNo payments yet.")
             else:
-                self.payments_label.set_text(str(self.wallet.payment_list))
+                self._show_wallet_payments()
         else:
-            self.payments_label.set_text("Connected.")
+            self.payments_view.show_message("Connected.")
 
         # Paint the final balance synchronously before handing off to the
         # animator. Two edge cases were leaving the screen blank until the
@@ -2351,18 +2479,29 @@ class DisplayWallet(Activity):
                 end_value=balance,
                 display_change=self.display_balance
             )
+        self._save_display_snapshot()
+
+    def _show_wallet_payments(self):
+        """Show the wallet's payments, capped at the slot's
+        payments_to_show like the cold-start snapshot, so the live list
+        never creates more row labels than the setting allows."""
+        return self.payments_view.show_payments(self.wallet.payment_list,
+                                                self._payments_to_show())
 
     def redraw_payments_cb(self):
         # Called from the wallet's polling task. MicroPython asyncio is
         # single-threaded and cooperative, so this runs on the same event
         # loop as LVGL — direct widget writes are safe between awaits.
-        self.payments_label.set_text(str(self.wallet.payment_list))
+        changed = self._show_wallet_payments()
         # Scroll the transactions area back to the top so any new tx is
         # immediately visible — even if the user had previously scrolled
         # down to inspect older entries. `True` = animated; gives a brief
-        # slide-up cue that the list changed. No-op when already at top.
-        if hasattr(self, 'payments_container'):
+        # slide-up cue that the list changed. No-op when already at top,
+        # and skipped when the redraw found nothing new to show.
+        if changed and hasattr(self, 'payments_container'):
             self.payments_container.scroll_to_y(0, True)
+        if changed:
+            self._save_display_snapshot()
         # Successful payments refresh — bump last-success timestamp.
         self._note_successful_update()
 
@@ -2405,6 +2544,7 @@ class DisplayWallet(Activity):
         # Un-hide the QR widget (it's hidden during wallet-switch resets in
         # onResume so the previous wallet's QR doesn't linger on screen).
         self.receive_qr.remove_flag(lv.obj.FLAG.HIDDEN)
+        self._save_display_snapshot()
 
     def error_cb(self, error):
         if self.wallet and self.wallet.is_running():
@@ -2412,7 +2552,7 @@ class DisplayWallet(Activity):
             if hasattr(self, '_last_balance') and self._last_balance:
                 print(f"WARNING: {error} (keeping cached data on screen)")
             else:
-                self.payments_label.set_text(str(error))
+                self.payments_view.show_message(str(error))
         # An error means time-since-last-success keeps growing. Recompute
         # the tier opportunistically so the dot updates without waiting
         # for the next timer tick. The timer still runs in the background
@@ -2540,19 +2680,19 @@ class DisplayWallet(Activity):
         if hasattr(self, '_last_balance'):
             self.display_balance(self._last_balance)
         if self.wallet and self.wallet.payment_list and len(self.wallet.payment_list) > 0:
-            self.payments_label.set_text(str(self.wallet.payment_list))
+            self._show_wallet_payments()
 
     def _on_denomination_changed(self, new_value):
         """Called when balance denomination setting changes."""
         if hasattr(self, '_last_balance'):
             self.display_balance(self._last_balance)
         if self.wallet and self.wallet.payment_list and len(self.wallet.payment_list) > 0:
-            self.payments_label.set_text(str(self.wallet.payment_list))
+            self._show_wallet_payments()
 
     def main_ui_set_defaults(self):
         self.balance_label.set_text("Welcome!")
         self.balance_unit_label.set_text("")
-        self.payments_label.set_text(lv.SYMBOL.REFRESH)
+        self.payments_view.show_message(lv.SYMBOL.REFRESH)
 
     def qr_clicked_cb(self, event):
         print("QR clicked")
@@ -211,12 +211,11 @@ class LNBitsWallet(Wallet):
             if len(payments_reply) == 0:
                 self.handle_new_payment(Payment(1751987292, 0, "Time to Start Stacking!"))
             else:
-                new_payment_list = UniqueSortedList()
+                new_payments = []
                 for transaction in payments_reply:
                     print(f"Got transaction: {transaction}")
-                    paymentObj = self.parseLNBitsPayment(transaction)
-                    new_payment_list.add(paymentObj)
-                self.handle_new_payments(new_payment_list)
+                    new_payments.append(self.parseLNBitsPayment(transaction))
+                self.handle_new_payments(UniqueSortedList.from_iterable(new_payments))
 
     async def fetch_static_receive_code(self):
         url = self.lnbits_url + "/lnurlp/api/v1/links?all_wallets=false"
@@ -1,7 +1,10 @@
 import ssl
 import json
+import random
 import time
 
+import asyncio
+
 import logging
 
 from mpos import Service, TaskManager
@@ -30,6 +33,9 @@ KIND_NIP17_CHAT = 14
 KIND_NIP17_FILE = 15
 KIND_NIP17_GIFT_WRAP = 1059
 KIND_NIP17_GIFT_WRAP_EPHEMERAL = 21059
+GIFT_WRAP_KINDS = (KIND_NIP17_GIFT_WRAP, KIND_NIP17_GIFT_WRAP_EPHEMERAL)
+# NIP-59 randomizes a gift wrap's created_at up to two days into the past.
+GIFT_WRAP_BACKDATE_SECONDS = 2 * 24 * 3600
 
 NIP17_KINDS = (
     KIND_NIP17_SEAL,
@@ -39,6 +45,11 @@ NIP17_KINDS = (
     KIND_NIP17_GIFT_WRAP_EPHEMERAL,
 )
 
+# NIP-47 wallet responses and notifications.
+KIND_NWC_RESPONSE = 23195
+KIND_NWC_NOTIFICATION = 23196
+NWC_KINDS = (KIND_NWC_RESPONSE, KIND_NWC_NOTIFICATION)
+
 EVENT_KIND_NAMES = {
     0: "SET_METADATA",
     1: "TEXT_NOTE",
@@ -91,6 +102,14 @@ def format_tags(tags):
     return ""
 
 
+def _referenced_event_id(event):
+    """The id in an event's first "e" tag, or None."""
+    for tag in getattr(event, "tags", None) or ():
+        if len(tag) >= 2 and tag[0] == "e":
+            return tag[1]
+    return None
+
+
 class NostrSubscription:
     """A generic Nostr subscription managed by NostrManager."""
 
@@ -98,20 +117,402 @@ class NostrSubscription:
         self.name = name
         self.filters = filters
         self.callback = callback
+        # (sub_id, serialized REQ frame) built from `filters`.
+        self._req = None
+        self._reset_resume()
+
+    def _reset_resume(self):
+        # Per Filter: created_at of the newest event it matched, and the
+        # `since` the REQ asks for after a watchdog reconnect (None: the
+        # Filter's own). The caller's Filter objects are never changed.
+        count = len(self.filters.data)
+        self._newest = [None] * count
+        self._resume_since = [None] * count
+
+    def set_filters(self, filters):
+        self.filters = filters
+        self._req = None
+        self._reset_resume()
+
+    def note_event(self, event):
+        """Record `event`, delivered to the callback, against each Filter
+        it matches."""
+        newest = self._newest
+        for i, f in enumerate(self.filters.data):
+            if (newest[i] is None or event.created_at > newest[i]) and f.matches(event):
+                newest[i] = event.created_at
+
+    def resume(self, now):
+        """Move each Filter's `since` in the REQ up to the newest event it
+        matched, so a relay that gets the REQ again after a reconnect sends
+        only what was missed. Filters that can match gift wraps keep the
+        NIP-59 backdating window. Returns True if the REQ changed."""
+        changed = False
+        for i, f in enumerate(self.filters.data):
+            newest = self._newest[i]
+            if newest is None:
+                continue
+            # A relay's clock may run ahead; never ask for the future.
+            since = min(newest, now)
+            if f.kinds is None or any(kind in GIFT_WRAP_KINDS for kind in f.kinds):
+                since -= GIFT_WRAP_BACKDATE_SECONDS
+            current = self._resume_since[i]
+            if current is None:
+                current = f.since
+            if current is None or current < since:
+                self._resume_since[i] = since
+                changed = True
+        if changed:
+            self._req = None
+        return changed
+
+    def req_json(self, sub_id):
+        """The REQ frame for this subscription under `sub_id`, serialized
+        once and reused for every relay it is (re)sent to."""
+        if self._req is None or self._req[0] != sub_id:
+            req = [ClientMessageType.REQUEST, sub_id]
+            for f, since in zip(self.filters.data, self._resume_since):
+                obj = f.to_json_object()
+                if since is not None:
+                    obj["since"] = since
+                req.append(obj)
+            self._req = (sub_id, json.dumps(req))
+        return self._req[1]
+
+
+class EventRing:
+    """Fixed-capacity buffer of the newest events. Once full, append
+    overwrites the oldest slot in place — no allocation, no copy. len(),
+    iteration (oldest first), indexing and clear() behave like the list
+    NostrManager.events used to be; newest_first() walks it backwards."""
+
+    def __init__(self, capacity):
+        self._items = [None] * capacity
+        self._start = 0  # slot of the oldest event
+        self._len = 0
+
+    def append(self, item):
+        capacity = len(self._items)
+        if self._len < capacity:
+            self._items[(self._start + self._len) % capacity] = item
+            self._len += 1
+        else:
+            self._items[self._start] = item
+            self._start = (self._start + 1) % capacity
+
+    def clear(self):
+        for i in range(len(self._items)):
+            self._items[i] = None
+        self._start = 0
+        self._len = 0
+
+    def newest_first(self):
+        capacity = len(self._items)
+        for i in range(self._len - 1, -1, -1):
+            yield self._items[(self._start + i) % capacity]
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        capacity = len(self._items)
+        for i in range(self._len):
+            yield self._items[(self._start + i) % capacity]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("event index out of range")
+        return self._items[(self._start + index) % len(self._items)]
+
+
+class EventQueue:
+    """FIFO of queued items. popleft() advances a head index instead of
+    shifting the list like list.pop(0), so draining a burst of n items
+    costs O(n) rather than O(n^2); the consumed prefix is cut off once it
+    makes up half the list."""
+
+    def __init__(self):
+        self._items = []
+        self._head = 0
+
+    def append(self, item):
+        self._items.append(item)
+
+    def popleft(self):
+        if self._head >= len(self._items):
+            raise IndexError("pop from an empty queue")
+        item = self._items[self._head]
+        self._items[self._head] = None
+        self._head += 1
+        if self._head == len(self._items):
+            self._items = []
+            self._head = 0
+        elif self._head >= 16 and self._head * 2 >= len(self._items):
+            del self._items[:self._head]
+            self._head = 0
+        return item
+
+    def clear(self):
+        self._items = []
+        self._head = 0
+
+    def __len__(self):
+        return len(self._items) - self._head
+
+
+class RecentIds:
+    """Bounded set of recently seen ids: once `capacity` ids are held,
+    adding one forgets the oldest."""
+
+    def __init__(self, capacity):
+        self._ring = [None] * capacity
+        self._pos = 0
+        self._ids = set()
+
+    def add(self, item_id):
+        """Remember `item_id`. Returns False if it was already known."""
+        if item_id in self._ids:
+            return False
+        oldest = self._ring[self._pos]
+        if oldest is not None:
+            self._ids.discard(oldest)
+        self._ring[self._pos] = item_id
+        self._pos = (self._pos + 1) % len(self._ring)
+        self._ids.add(item_id)
+        return True
+
+    def __contains__(self, item_id):
+        return item_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+
+class SubscriptionIndex:
+    """Which subscriptions could match an event. Each Filter is filed
+    under its kinds — or, if it has none, its authors, or failing that
+    its "#p" refs; a Filter with none of those is checked against every
+    event. Candidates still go through filters.match(), the index only
+    skips subscriptions that cannot match. Build a new one whenever the
+    subscription list or a subscription's filters change."""
+
+    def __init__(self, subscriptions):
+        self._subs = list(subscriptions)
+        self._by_kind = {}
+        self._by_author = {}
+        self._by_pubkey_ref = {}
+        self._always = []
+        for pos, sub in enumerate(self._subs):
+            for f in sub.filters.data:
+                kinds = getattr(f, "kinds", None)
+                authors = getattr(f, "authors", None)
+                pubkey_refs = getattr(f, "pubkey_refs", None)
+                if kinds is not None:
+                    self._file(self._by_kind, kinds, pos)
+                elif authors is not None:
+                    self._file(self._by_author, authors, pos)
+                elif pubkey_refs is not None:
+                    self._file(self._by_pubkey_ref, pubkey_refs, pos)
+                elif not self._always or self._always[-1] != pos:
+                    self._always.append(pos)
+
+    @staticmethod
+    def _file(index, keys, pos):
+        # Positions go in ascending, so each bucket stays sorted and a
+        # subscription listing a key twice is filed once.
+        for key in keys:
+            bucket = index.get(key)
+            if bucket is None:
+                index[key] = [pos]
+            elif bucket[-1] != pos:
+                bucket.append(pos)
+
+    def candidates(self, event):
+        """The subscriptions that could match `event`, in subscription order."""
+        found = []
+        hits = self._by_kind.get(event.kind)
+        if hits:
+            found.append(hits)
+        if self._by_author:
+            hits = self._by_author.get(event.public_key)
+            if hits:
+                found.append(hits)
+        if self._by_pubkey_ref:
+            for tag in event.tags:
+                if len(tag) > 1 and tag[0] == "p":
+                    hits = self._by_pubkey_ref.get(tag[1])
+                    if hits:
+                        found.append(hits)
+        if self._always:
+            found.append(self._always)
+        if not found:
+            return ()
+        if len(found) == 1:
+            positions = found[0]
+        else:
+            positions = sorted(set(pos for hits in found for pos in hits))
+        return [self._subs[pos] for pos in positions]
+
+    def __len__(self):
+        return len(self._subs)
+
+
+class SharedSecretCache:
+    """Memoizes a PrivateKey's NIP-04 shared secret per counterparty.
+
+    encrypt_message / decrypt_message derive their AES key with
+    compute_shared_secret(pubkey_hex), a secp256k1 point multiplication
+    that dominates a message's cost on the ESP32 — and NWC talks to the
+    same wallet pubkey every time. install() replaces the key's bound
+    compute_shared_secret with one that consults the cache, so every user
+    of the key (NWC requests and replies, NostrEvent._try_decrypt for
+    kind-4 DMs) skips the multiplication for a known counterparty."""
+
+    # Counterparties remembered per key; DMs can come from anyone.
+    MAX_ENTRIES = 32
+
+    def __init__(self):
+        self._secrets = {}
+        self.hits = 0
+        self.misses = 0
+
+    def install(self, private_key):
+        compute = private_key.compute_shared_secret
+
+        def compute_cached(public_key_hex):
+            secret = self._secrets.get(public_key_hex)
+            if secret is not None:
+                self.hits += 1
+                return secret
+            self.misses += 1
+            secret = compute(public_key_hex)
+            if len(self._secrets) >= self.MAX_ENTRIES:
+                self._secrets.clear()
+            self._secrets[public_key_hex] = secret
+            return secret
+
+        private_key.compute_shared_secret = compute_cached
+        return private_key
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._secrets)}
+
+
+class NWCRequest:
+    """An NWC request awaiting its reply (see NostrManager._nwc_in_flight)."""
+
+    def __init__(self, event, method, deadline, since=None, relay_url=None):
+        self.event = event
+        self.method = method
+        # `from` a list_transactions was sent with (None: full page).
+        self.since = since
+        # The relay the request was routed to; None once it went to all.
+        self.relay_url = relay_url
+        self.sent_ms = time.ticks_ms()
+        self.deadline = deadline
+        self.attempts = 1
+
+
+class RelayHealth:
+    """Reply latency, timeouts and connection history of one relay, used
+    to route NWC requests to the relay likely to answer fastest."""
+
+    # Latency assumed for a relay that hasn't answered yet: a new relay
+    # gets tried, but one that has proven faster is still preferred.
+    DEFAULT_LATENCY_MS = 1000
+    # Score penalties per request unanswered since the relay's last reply
+    # and per connection error.
+    TIMEOUT_PENALTY_MS = 5000
+    ERROR_PENALTY_MS = 1000
+    # Seconds after which a connection error counts half as much, so a
+    # relay that had a bad spell is tried again once it has recovered.
+    ERROR_HALF_LIFE_SECONDS = 300
+
+    def __init__(self):
+        self.latency_ms = None  # moving average of reply round trips
+        self.replies = 0
+        self.timeouts = 0       # requests unanswered since the last reply
+        self.errors = 0         # recent connection errors, decaying
+        self.connects = 0
+        self.connected_since = None
+        # The relay's cumulative error_counter at the last sample, and when
+        # `errors` was last halved.
+        self.error_counter_seen = 0
+        self._errors_decayed_at = None
+
+    def record_reply(self, latency_ms):
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms = (3 * self.latency_ms + latency_ms) // 4
+        self.replies += 1
+        self.timeouts = 0
+
+    def record_errors(self, error_counter, now):
+        """Add the errors the relay counted since the last sample to
+        `errors`, after halving it once per ERROR_HALF_LIFE_SECONDS."""
+        if self._errors_decayed_at is None:
+            self._errors_decayed_at = now
+        half_lives = int((now - self._errors_decayed_at) // self.ERROR_HALF_LIFE_SECONDS)
+        if half_lives > 0:
+            self.errors >>= half_lives
+            self._errors_decayed_at += half_lives * self.ERROR_HALF_LIFE_SECONDS
+        # A counter that went down belongs to a new Relay object.
+        if error_counter < self.error_counter_seen:
+            self.error_counter_seen = 0
+        self.errors += error_counter - self.error_counter_seen
+        self.error_counter_seen = error_counter
+
+    def score(self):
+        """Expected cost in ms of routing a request here; lower is better."""
+        latency = self.DEFAULT_LATENCY_MS if self.latency_ms is None else self.latency_ms
+        return (latency + self.timeouts * self.TIMEOUT_PENALTY_MS
+                + self.errors * self.ERROR_PENALTY_MS)
+
+
+# NostrEvent._decrypted before the first look at decrypted_content.
+_NOT_DECRYPTED = object()
 
 
 class NostrEvent:
+    """A received event as handlers and the event list see it. A DM is
+    decrypted on the first read of decrypted_content (most are stored and
+    never shown), and str() is formatted once and reused."""
+
+    __slots__ = (
+        "event", "created_at", "content", "public_key", "kind", "tags",
+        "private_key", "_decrypted", "_str",
+    )
+
     def __init__(self, event_obj, private_key=None):
         self.event = event_obj
         self.created_at = event_obj.created_at
         self.content = event_obj.content
         self.public_key = event_obj.public_key
         self.kind = event_obj.kind
-        self.tags = event_obj.tags if hasattr(event_obj, 'tags') else []
+        self.tags = getattr(event_obj, 'tags', [])
         self.private_key = private_key
-        self.decrypted_content = None
-        if self.kind == 4 and self.private_key:
-            self._try_decrypt()
+        self._decrypted = _NOT_DECRYPTED
+        self._str = None
+
+    @property
+    def decrypted_content(self):
+        """The DM plaintext, or None if this isn't a DM, there is no key or
+        decryption failed."""
+        if self._decrypted is _NOT_DECRYPTED:
+            self._decrypted = None
+            if self.kind == 4 and self.private_key:
+                self._try_decrypt()
+        return self._decrypted
+
+    @decrypted_content.setter
+    def decrypted_content(self, value):
+        self._decrypted = value
+        self._str = None
 
     def _try_decrypt(self):
         try:
@@ -120,7 +521,7 @@ class NostrEvent:
                     self.content,
                     self.public_key
                 )
-                self.decrypted_content = decrypted
+                self._decrypted = decrypted
                 if __debug__:
                     logger.debug("Successfully decrypted DM: %s", decrypted)
         except Exception as e:
@@ -142,6 +543,11 @@ class NostrEvent:
         return self.content
 
     def __str__(self):
+        if self._str is None:
+            self._str = self._format()
+        return self._str
+
+    def _format(self):
         if self.kind == 42:
             return self._format_channel_message()
         kind_name = self.get_kind_name()
@@ -224,6 +630,63 @@ class NostrManager:
     EVENTS_TO_SHOW = 50
     NWC_POLL_SECONDS = 120
     RELAY_SILENT_RECONNECT_THRESHOLD = 3
+    # Consecutive watchdog reconnects back off exponentially: after the
+    # n-th, the next waits at least BASE * 2**(n-1) s (capped at MAX),
+    # scaled by a random 50-100% so devices behind the same flaky relay
+    # don't reconnect in lockstep. An NWC reply resets the count.
+    RECONNECT_BACKOFF_BASE_SECONDS = 2
+    RECONNECT_BACKOFF_MAX_SECONDS = 600
+    # Once a wallet has set a sync cursor (set_nwc_list_from), only every
+    # NWC_FULL_SYNC_EVERY-th list_transactions asks for the full page; the
+    # others ask only for transactions since the cursor. The full page
+    # catches anything an incremental fetch can't see (a payment that
+    # settled with an older created_at, a notification lost while offline).
+    NWC_FULL_SYNC_EVERY = 10
+    # NWC requests awaiting a reply sit in an in-flight table keyed by the
+    # request event id, which NIP-47 responses carry in an "e" tag. One
+    # unanswered after NWC_REQUEST_TIMEOUT_SECONDS is published again (the
+    # same signed event, so a reply to either copy matches) up to
+    # NWC_REQUEST_RETRIES times, then given up on.
+    NWC_REQUEST_TIMEOUT_SECONDS = 20
+    NWC_REQUEST_RETRIES = 2
+    # Answered request ids, remembered so the copy of a reply delivered by
+    # a second relay is dropped before decrypting; and requests given up
+    # on, remembered so a late reply is still processed as their answer.
+    # A reply to a request forgotten since (evicted here, or the tables
+    # reset) is untracked: its transactions are only merged.
+    NWC_CLOSED_REQUESTS_TRACKED = 8
+    # Event ids remembered to drop the copies of an event that every
+    # subscribed relay delivers. A few minutes of traffic at most.
+    SEEN_EVENTS_TRACKED = 256
+    # NIP-17 gift wraps waiting to be unwrapped (two NIP-44 decryptions
+    # each) by the background task, one per event loop slice. Under a
+    # flood the oldest are dropped.
+    GIFT_WRAP_QUEUE_MAX = 16
+    # Upper bounds (ms) of the NWC round-trip latency histogram; slower
+    # replies land in a final overflow bucket.
+    NWC_LATENCY_BUCKETS_MS = (250, 500, 1000, 2000, 5000, 10000)
+    # Longest a poll goes without a list_transactions of its own. Polls in
+    # between only ask for the balance (see _send_nwc_poll); 0 lists on
+    # every poll.
+    NWC_LIST_MAX_STALE_SECONDS = 600
+    # Time budget for one pass over the relay message pool. The loop keeps
+    # processing queued events until the pool is empty or this many ms have
+    # elapsed, then yields to LVGL and the relay tasks; leftovers are picked
+    # up on the next tick. Previously only one event was taken per 100 ms
+    # tick, so a 40-event backlog after a reconnect took 4+ s to drain.
+    DRAIN_BUDGET_MS = 50
+    # Longest the main loop sleeps when nothing arrives. Message arrival,
+    # relay reconfiguration and stop() wake it immediately, and the next
+    # NWC poll and in-flight request deadlines bound the sleep (see
+    # _next_wakeup_timeout); this cap only covers noticing a relay that
+    # dropped and came back by itself.
+    IDLE_WAKE_SECONDS = 30
+    # While a relay is down the loop checks this often whether it has
+    # reconnected by itself, to re-send subscriptions to it.
+    RELAY_CHECK_SECONDS = 5
+    # Fallback tick when the relay message pool can't be hooked for
+    # arrival signals (older nostr lib without MessagePool.add_message).
+    POLL_WAKE_SECONDS = 0.1
 
     @classmethod
     def get_instance(cls):
@@ -236,6 +699,13 @@ class NostrManager:
         self._main_task = None
         self.connected = False
         self._polls_since_last_event = 0
+        # Watchdog reconnects since the last NWC reply, and the earliest
+        # time.time() the next one may run (see _reconnect_backoff).
+        self._reconnect_attempts = 0
+        self._reconnect_not_before = 0
+        # True once a poll found the relays silent for too long; the
+        # reconnect itself waits for _reconnect_not_before.
+        self._reconnect_pending = False
         self._last_nwc_poll = 0
         self._relays_configured = False
         # How many transactions list_transactions requests. Kept in sync
@@ -244,21 +714,50 @@ class NostrManager:
         # without that link, NWC would always fetch the class default while
         # LNBits (limit=) and on-chain (pageSize=) honour the user setting.
         self._nwc_list_limit = 21
+        # Incremental sync state: the `from` cursor (None = full pages
+        # only) and list requests sent since the last full one.
+        self._nwc_list_from = None
+        self._nwc_lists_since_full = 0
+        # request event id -> NWCRequest awaiting its reply, the ids of
+        # recently answered requests, and request event id -> NWCRequest
+        # of the requests most recently given up on.
+        self._nwc_in_flight = {}
+        self._nwc_answered = RecentIds(self.NWC_CLOSED_REQUESTS_TRACKED)
+        self._nwc_expired = {}
+        self._nwc_latency = [0] * (len(self.NWC_LATENCY_BUCKETS_MS) + 1)
+        self._nwc_request_stats = {
+            "sent": 0,
+            "answered": 0,
+            "retries": 0,
+            "timeouts": 0,    # requests given up on after every retry
+            "duplicates": 0,  # replies to already answered requests, dropped
+            "late": 0,        # replies to requests given up on, processed
+        }
+        # When the last list_transactions went out (poll or wallet fetch).
+        self._last_nwc_list_request = 0
 
         # Nostr app state
-        self.events = []
+        # The newest EVENTS_TO_SHOW events, oldest first.
+        self.events = EventRing(self.EVENTS_TO_SHOW)
         self._nostr_private_key = None
+        self._dm_secrets = SharedSecretCache()
         self._default_relays = []
         self._current_nsec = None
         self._configured_relays = []
         self._relay_list_pending = False
         self._relay_list_published_for = None
         self._subscriptions = []
+        # SubscriptionIndex over _subscriptions; None until the next event
+        # after the list or a filter changed.
+        self._sub_index = None
         self._subscription_ids = {}
         self._nostr_configured = False
 
         # NWC state
         self._nwc_private_key = None
+        # NIP-04 shared secrets of the NWC and identity keys; replaced
+        # whenever the key is.
+        self._nwc_secrets = SharedSecretCache()
         self._nwc_wallet_pubkey = None
         self._nwc_relays = []
         self._nwc_sub_id = None
@@ -275,7 +774,53 @@ class NostrManager:
         # and the websocket reconnects a few seconds later, after the initial
         # subscription broadcast has already been dropped.
         self._relay_connected_state = {}
+        # url -> RelayHealth, kept across reconnects.
+        self._relay_health = {}
         self._nwc_filters = None
+        # (sub_id, serialized NWC REQ frame); see _nwc_subscription_req.
+        self._nwc_req = None
+        self._nwc_client_pubkey_hex = None
+
+        # Event messages taken off relay_manager.message_pool but not yet
+        # processed (the drain budget ran out). NWC replies get their own
+        # queue so they jump ahead of generic subscription traffic.
+        self._pending_nwc_events = EventQueue()
+        self._pending_events = EventQueue()
+        # Main-loop wakeup: set when a relay message lands in the pool, when
+        # relays are reconfigured and on stop(), so the loop sleeps instead
+        # of polling ten times a second.
+        self._wakeup = asyncio.Event()
+        self._hooked_pool = None
+        self._awake_since = None
+        self._wake_stats = {
+            "wakeups": 0,
+            "signalled": 0,  # woken by message arrival / reconfiguration
+            "timed_out": 0,  # woken by the poll deadline or IDLE_WAKE_SECONDS
+            "idle_ms": 0,    # time spent waiting for a wakeup
+            "awake_ms": 0,   # time spent processing between waits
+        }
+        self._drain_stats = {
+            "ticks": 0,             # drain passes that handled >= 1 event
+            "events": 0,            # events handled in total
+            "last_tick_events": 0,  # events handled by the latest pass
+            "max_tick_events": 0,
+            "queue_depth": 0,       # events still queued after the latest pass
+            "max_queue_depth": 0,   # deepest backlog seen at the start of a pass
+            "duplicates": 0,        # copies of already seen events, dropped
+        }
+        # Ids of recently processed events (see _process_event).
+        self._seen_events = RecentIds(self.SEEN_EVENTS_TRACKED)
+        # (gift-wrap event, relay url) waiting for _unwrap_gift_wraps, and
+        # the task running it (None when idle).
+        self._pending_gift_wraps = EventQueue()
+        self._gift_wrap_task = None
+        self._gift_wrap_stats = {
+            "queued": 0,
+            "unwrapped": 0,
+            "failed": 0,      # not for us, malformed, or no NIP-17 support
+            "dropped": 0,     # oldest pushed out of a full queue
+            "max_queue_depth": 0,
+        }
 
         # Event callbacks: kind -> [callbacks]
         self._event_handlers = {}
@@ -287,6 +832,7 @@ class NostrManager:
         # NWC-specific callbacks (set by NWCWallet)
         self._nwc_balance_cb = None
         self._nwc_payments_cb = None
+        self._nwc_more_payments_cb = None
         self._nwc_notification_cb = None
 
         # Generic event update callback (called for every event)
@@ -329,6 +875,7 @@ class NostrManager:
         restarted when the device comes back online.
         """
         self.keep_running = False
+        self._wake()
         if (
             self._main_task is not None
             and self._main_task is not True
@@ -354,6 +901,15 @@ class NostrManager:
         self.connected = False
         self.relay_manager = None
         self._relay_connected_state = {}
+        self._pending_nwc_events.clear()
+        self._pending_events.clear()
+        self._pending_gift_wraps.clear()
+        self._reconnect_pending = False
+        # Replies can't arrive without relays; a restart sends afresh.
+        self._nwc_in_flight = {}
+        self._nwc_expired = {}
+        self._hooked_pool = None
+        self._awake_since = None
         # Subscriptions, identity and NWC config are intentionally kept so
         # start() can restore them on the next online event.
         self._cleanup_done = True
@@ -373,6 +929,72 @@ class NostrManager:
     def is_connected(self):
         return self.connected
 
+    def get_drain_stats(self):
+        """Return a copy of the message-pool drain counters (events per
+        tick, queue depth, duplicate copies dropped) so the backlog can be
+        inspected."""
+        return dict(self._drain_stats)
+
+    def get_gift_wrap_stats(self):
+        """Return a copy of the NIP-17 unwrap counters plus the current
+        `queue_depth`."""
+        stats = dict(self._gift_wrap_stats)
+        stats["queue_depth"] = len(self._pending_gift_wraps)
+        return stats
+
+    def get_nwc_request_stats(self):
+        """Return a copy of the NWC request counters plus `in_flight` and
+        `latency_ms`, the round-trip histogram as [(upper bound ms, count)],
+        the last bound None for the overflow bucket."""
+        stats = dict(self._nwc_request_stats)
+        stats["in_flight"] = len(self._nwc_in_flight)
+        bounds = list(self.NWC_LATENCY_BUCKETS_MS) + [None]
+        stats["latency_ms"] = list(zip(bounds, self._nwc_latency))
+        return stats
+
+    def get_relay_health(self):
+        """Return {url: {...}} with each known relay's routing score (see
+        RelayHealth.score), reply latency and counters."""
+        now = time.time()
+        report = {}
+        for url, health in self._relay_health.items():
+            relay = self.relay_manager.relays.get(url) if self.relay_manager is not None else None
+            report[url] = {
+                "connected": bool(relay is not None and relay.connected),
+                "score": health.score(),
+                "latency_ms": health.latency_ms,
+                "replies": health.replies,
+                "timeouts": health.timeouts,
+                "errors": health.errors,
+                "connects": health.connects,
+                "uptime_s": (now - health.connected_since
+                             if health.connected_since is not None else None),
+            }
+        return report
+
+    def _relay_health_for(self, url):
+        health = self._relay_health.get(url)
+        if health is None:
+            health = RelayHealth()
+            self._relay_health[url] = health
+        return health
+
+    def get_shared_secret_stats(self):
+        """Hits, misses and size of the NWC and DM shared-secret caches."""
+        return {"nwc": self._nwc_secrets.stats(), "dm": self._dm_secrets.stats()}
+
+    def get_wakeup_stats(self):
+        """Return a copy of the main-loop wakeup counters plus `idle_ratio`,
+        the fraction of loop time spent asleep waiting for a wakeup."""
+        stats = dict(self._wake_stats)
+        total = stats["idle_ms"] + stats["awake_ms"]
+        stats["idle_ratio"] = stats["idle_ms"] / total if total else 0.0
+        return stats
+
+    def _wake(self):
+        """Wake the main loop early (new message, config change, stop)."""
+        self._wakeup.set()
+
     # --- Event handler registration ---
 
     def register_event_handler(self, kind, callback):
@@ -403,10 +1025,17 @@ class NostrManager:
                 cb for cb in self._post_event_handlers[kind] if cb != callback
             ]
 
-    def set_nwc_callbacks(self, balance_cb=None, payments_cb=None, notification_cb=None):
+    def set_nwc_callbacks(self, balance_cb=None, payments_cb=None, notification_cb=None,
+                          more_payments_cb=None):
+        """payments_cb(transactions) gets the replies to full-page
+        list_transactions requests. more_payments_cb(transactions) gets
+        the incremental ones (see set_nwc_list_from) and replies to a
+        request no longer tracked, which must only be merged; without it
+        those are dropped."""
         self._nwc_balance_cb = balance_cb
         self._nwc_payments_cb = payments_cb
         self._nwc_notification_cb = notification_cb
+        self._nwc_more_payments_cb = more_payments_cb
 
     def set_nwc_list_limit(self, n):
         """Set how many transactions list_transactions requests. Clamped
@@ -417,6 +1046,13 @@ class NostrManager:
         except (TypeError, ValueError):
             pass
 
+    def set_nwc_list_from(self, created_at):
+        """Make later list_transactions ask only for transactions created
+        at or after `created_at` (NIP-47 `from` is inclusive), except for
+        the periodic full page. None goes back to full pages only. Replies
+        to the incremental requests go to more_payments_cb."""
+        self._nwc_list_from = created_at
+
     def set_events_updated_callback(self, cb):
         self._events_updated_cb = cb
 
@@ -445,12 +1081,15 @@ class NostrManager:
             self._ensure_main_task()
             return
 
-        self._nostr_private_key = _parse_nsec(nsec)
+        # A new key gets a new cache: the old secrets belong to the old key.
+        self._dm_secrets = SharedSecretCache()
+        self._nostr_private_key = self._dm_secrets.install(_parse_nsec(nsec))
         self._current_nsec = nsec
         self._default_relays = list(normalised)
         self._configured_relays = list(normalised)
         if not same_config:
             self._relays_dirty = True
+            self._wake()
         self._relay_list_pending = True
         self._nostr_configured = True
         self._ensure_main_task()
@@ -624,6 +1263,11 @@ class NostrManager:
         """Build, sign and publish an encrypted direct message."""
         if self.relay_manager is None:
             raise RuntimeError("Relay manager is not ready yet")
+        dm = self._sign_dm(private_key, recipient_hex, content, kind, reference_event_id)
+        self.relay_manager.publish_event(dm)
+        return dm.id
+
+    def _sign_dm(self, private_key, recipient_hex, content, kind=4, reference_event_id=None):
         dm = EncryptedDirectMessage(
             recipient_pubkey=recipient_hex,
             cleartext_content=content,
@@ -631,8 +1275,7 @@ class NostrManager:
             reference_event_id=reference_event_id,
         )
         private_key.sign_event(dm)
-        self.relay_manager.publish_event(dm)
-        return dm.id
+        return dm
 
     def publish_dm(self, recipient_pubkey_or_npub, content, reference_event_id=None):
         """Sign and publish a NIP-04 encrypted direct message (kind 4)."""
@@ -711,6 +1354,7 @@ class NostrManager:
     def close_subscription(self, name):
         """Remove a named subscription and close it on relays."""
         self._subscriptions = [s for s in self._subscriptions if s.name != name]
+        self._sub_index = None
         self._subscription_ids.pop(name, None)
         if self.relay_manager is not None:
             try:
@@ -753,7 +1397,8 @@ class NostrManager:
             # Re-publish only when the subscription identity changes, not when
             # only the time window or limit moves.
             identity_changed = not _filters_identity_equal(existing.filters, filters)
-            existing.filters = filters
+            existing.set_filters(filters)
+            self._sub_index = None
             if identity_changed and self.connected and self.relay_manager is not None:
                 sub_id = self._subscription_ids.get(name)
                 if sub_id is None:
@@ -764,6 +1409,7 @@ class NostrManager:
 
         sub = NostrSubscription(name, filters, callback)
         self._subscriptions.append(sub)
+        self._sub_index = None
         if self.connected and self.relay_manager is not None:
             sub_id = _make_subscription_id("mpos_sub_")
             self._subscription_ids[name] = sub_id
@@ -771,11 +1417,9 @@ class NostrManager:
 
     def _publish_subscription(self, sub, sub_id):
         self.relay_manager.add_subscription(sub_id, sub.filters)
-        req = [ClientMessageType.REQUEST, sub_id]
-        req.extend(sub.filters.to_json_array())
-        self.relay_manager.publish_message(json.dumps(req))
-        logger.info("NostrManager: subscribed to '%s' with filters %s",
-            sub.name, sub.filters.to_json_array())
+        req_json = sub.req_json(sub_id)
+        self.relay_manager.publish_message(req_json)
+        logger.info("NostrManager: subscribed to '%s': %s", sub.name, req_json)
 
     def _send_subscriptions_to_relays(self, urls):
         """Re-send all active subscriptions to a specific set of relays.
@@ -791,29 +1435,34 @@ class NostrManager:
                 sub_id = _make_subscription_id("mpos_sub_")
                 self._subscription_ids[sub.name] = sub_id
             self.relay_manager.add_subscription(sub_id, sub.filters)
-            req = [ClientMessageType.REQUEST, sub_id]
-            req.extend(sub.filters.to_json_array())
-            req_json = json.dumps(req)
+            req_json = sub.req_json(sub_id)
             for url in urls:
                 relay = self.relay_manager.relays.get(url)
                 if relay is not None and relay.connected:
                     relay.publish(req_json)
         if self._nwc_configured and self._nwc_sub_id:
-            if self._nwc_filters is None:
-                self._nwc_filters = Filters([Filter(
-                    kinds=[23195, 23196],
-                    authors=[self._nwc_wallet_pubkey],
-                    pubkey_refs=[self._nwc_private_key.public_key.hex()]
-                )])
+            req_json = self._nwc_subscription_req()
             self.relay_manager.add_subscription(self._nwc_sub_id, self._nwc_filters)
-            req = [ClientMessageType.REQUEST, self._nwc_sub_id]
-            req.extend(self._nwc_filters.to_json_array())
-            req_json = json.dumps(req)
             for url in urls:
                 relay = self.relay_manager.relays.get(url)
                 if relay is not None and relay.connected:
                     relay.publish(req_json)
 
+    def _nwc_subscription_req(self):
+        """The NWC REQ frame (and self._nwc_filters), built once per
+        configure_nwc and subscription id and reused on every relay
+        (re)connect."""
+        if self._nwc_req is None or self._nwc_req[0] != self._nwc_sub_id:
+            self._nwc_filters = Filters([Filter(
+                kinds=list(NWC_KINDS),
+                authors=[self._nwc_wallet_pubkey],
+                pubkey_refs=[self._nwc_client_pubkey_hex]
+            )])
+            req = [ClientMessageType.REQUEST, self._nwc_sub_id]
+            req.extend(self._nwc_filters.to_json_array())
+            self._nwc_req = (self._nwc_sub_id, json.dumps(req))
+        return self._nwc_req[1]
+
     def configure_nwc(self, nwc_url):
         """Configure and start NWC subscriptions."""
         if self._nwc_nwc_url == nwc_url:
@@ -828,11 +1477,20 @@ class NostrManager:
         relays, wallet_pubkey, secret, lud16 = self._parse_nwc_url(nwc_url)
         self._nwc_relays = relays
         self._nwc_wallet_pubkey = wallet_pubkey
-        self._nwc_private_key = PrivateKey(bytes.fromhex(secret))
+        self._nwc_secrets = SharedSecretCache()
+        self._nwc_private_key = self._nwc_secrets.install(PrivateKey(bytes.fromhex(secret)))
+        # Derived once here: public_key.hex() is an EC point multiplication.
+        self._nwc_client_pubkey_hex = self._nwc_private_key.public_key.hex()
+        self._nwc_filters = None
+        self._nwc_req = None
         self._nwc_lud16 = lud16
         self._nwc_nwc_url = nwc_url
+        # Requests to the previous wallet will never be answered now.
+        self._nwc_in_flight = {}
+        self._nwc_expired = {}
         self._nwc_configured = True
         self._relays_dirty = True
+        self._wake()
         self._ensure_main_task()
 
     def _parse_nwc_url(self, nwc_url):
@@ -912,6 +1570,7 @@ class NostrManager:
                 logger.info("NostrManager: time synced, continuing initialization")
 
         self.relay_manager = RelayManager()
+        self._hook_message_pool()
 
         # Add all configured relays
         for relay in self._default_relays:
@@ -980,15 +1639,9 @@ class NostrManager:
         # Set up NWC subscription
         if self._nwc_configured:
             self._nwc_sub_id = _make_subscription_id("micropython_nwc_")
-            self._nwc_filters = Filters([Filter(
-                kinds=[23195, 23196],
-                authors=[self._nwc_wallet_pubkey],
-                pubkey_refs=[self._nwc_private_key.public_key.hex()]
-            )])
+            req_json = self._nwc_subscription_req()
             self.relay_manager.add_subscription(self._nwc_sub_id, self._nwc_filters)
-            req = [ClientMessageType.REQUEST, self._nwc_sub_id]
-            req.extend(self._nwc_filters.to_json_array())
-            self.relay_manager.publish_message(json.dumps(req))
+            self.relay_manager.publish_message(req_json)
             logger.info("NostrManager: subscribed to NWC responses")
             if self._nwc_lud16 and "@" in self._nwc_lud16:
                 # Don't use permissive ensure_lightning_prefix, only allow LUD-16
@@ -1008,7 +1661,7 @@ class NostrManager:
 
         # Main processing loop
         while self.keep_running:
-            await TaskManager.sleep(0.1)
+            await self._wait_for_wakeup(self._next_wakeup_timeout())
 
             if not self.keep_running:
                 break
@@ -1025,72 +1678,194 @@ class NostrManager:
             # re-send subscriptions. On ESP32 the websocket often reconnects
             # after the first SSL error, and subscriptions sent earlier while
             # disconnected are dropped by the relay.
+            now = time.time()
             if self.relay_manager is not None:
                 for url, relay in self.relay_manager.relays.items():
                     was = self._relay_connected_state.get(url, False)
                     if relay.connected and not was:
                         self._send_subscriptions_to_relays([url])
                     self._relay_connected_state[url] = relay.connected
+                    self._track_relay_health(url, relay, now)
 
-            now = time.time()
+            await self._nwc_poll_and_watchdog(now)
+            if not self.keep_running:
+                break
 
-            # --- Periodic NWC polling ---
-            if self._nwc_configured and now - self._last_nwc_poll >= self.NWC_POLL_SECONDS:
-                self._last_nwc_poll = now
+            if self._nwc_in_flight:
+                self._check_nwc_deadlines(now)
 
-                if self._polls_since_last_event >= self.RELAY_SILENT_RECONNECT_THRESHOLD:
-                    await self._reconnect_relay()
-                    if not self.keep_running:
-                        break
+            # --- Process incoming events ---
+            try:
+                self._drain_message_pool()
+            except Exception as e:
+                logger.error("NostrManager: message poll error: %s", e)
+                import sys
+                sys.print_exception(e)
+                await TaskManager.sleep(1)
 
-                self._polls_since_last_event += 1
+    async def _nwc_poll_and_watchdog(self, now):
+        """Send the periodic NWC poll when it is due, reconnecting first if
+        the relays have stayed silent for RELAY_SILENT_RECONNECT_THRESHOLD
+        polls. A reconnect inside the backoff window is held back until
+        _reconnect_not_before, which bounds the main loop's sleep."""
+        poll_due = self._nwc_configured and now - self._last_nwc_poll >= self.NWC_POLL_SECONDS
+        if poll_due and self._polls_since_last_event >= self.RELAY_SILENT_RECONNECT_THRESHOLD:
+            self._reconnect_pending = True
+
+        if self._reconnect_pending and now >= self._reconnect_not_before:
+            self._reconnect_pending = False
+            await self._reconnect_relay()
+            if not self.keep_running:
+                return
 
-                try:
-                    self.nwc_fetch_balance()
-                except Exception as e:
-                    logger.warning("NostrManager: fetch_balance error: %s", e)
+        if poll_due:
+            self._last_nwc_poll = now
+            self._polls_since_last_event += 1
+            self._send_nwc_poll(now)
 
-                try:
-                    self.nwc_fetch_payments()
-                except Exception as e:
-                    logger.warning("NostrManager: fetch_payments error: %s", e)
+    def _hook_message_pool(self):
+        """Make the relay message pool signal the main loop on arrival.
 
-            # --- Process incoming events ---
+        Wraps the pool's add_message (called by every relay for every
+        incoming frame) so it also sets the wakeup event. Returns False
+        when the pool has no add_message, in which case the loop falls
+        back to POLL_WAKE_SECONDS polling.
+        """
+        pool = self.relay_manager.message_pool
+        if pool is self._hooked_pool:
+            return True
+        add_message = getattr(pool, "add_message", None)
+        if add_message is None:
+            self._hooked_pool = None
+            return False
+
+        def _add_message_and_wake(*args, **kwargs):
+            add_message(*args, **kwargs)
+            self._wakeup.set()
+
+        pool.add_message = _add_message_and_wake
+        self._hooked_pool = pool
+        return True
+
+    def _next_wakeup_timeout(self):
+        """Seconds the main loop may sleep before it has work to do."""
+        if self._pending_nwc_events or self._pending_events:
+            return 0
+        if self._hooked_pool is None:
+            return self.POLL_WAKE_SECONDS
+        now = time.time()
+        wake_at = now + self.IDLE_WAKE_SECONDS
+        if self.relay_manager is not None:
+            for relay in self.relay_manager.relays.values():
+                if not relay.connected:
+                    wake_at = now + self.RELAY_CHECK_SECONDS
+                    break
+        if self._nwc_configured:
+            wake_at = min(wake_at, self._last_nwc_poll + self.NWC_POLL_SECONDS)
+        for request in self._nwc_in_flight.values():
+            wake_at = min(wake_at, request.deadline)
+        if self._reconnect_pending:
+            wake_at = min(wake_at, self._reconnect_not_before)
+        return max(0, wake_at - now)
+
+    async def _wait_for_wakeup(self, timeout):
+        """Sleep until the wakeup event is set or `timeout` seconds pass."""
+        stats = self._wake_stats
+        start = time.ticks_ms()
+        if self._awake_since is not None:
+            stats["awake_ms"] += time.ticks_diff(start, self._awake_since)
+        if timeout <= 0:
+            # Backlog left over: just yield to LVGL and the relay tasks.
+            await TaskManager.sleep(0)
+            signalled = True
+        else:
             try:
-                if self.relay_manager.message_pool.has_events():
-                    event_msg = self.relay_manager.message_pool.get_event()
-                    event = event_msg.event
-                    logger.info("NostrManager: received event kind=%s from %s via %s",
-                        event.kind, event.public_key[:16], event_msg.url)
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+                signalled = True
+            except asyncio.TimeoutError:
+                signalled = False
+        # Clear before processing: anything arriving from here on sets the
+        # event again and the next wait returns immediately.
+        self._wakeup.clear()
+        self._awake_since = time.ticks_ms()
+        stats["idle_ms"] += time.ticks_diff(self._awake_since, start)
+        stats["wakeups"] += 1
+        if signalled:
+            stats["signalled"] += 1
+        else:
+            stats["timed_out"] += 1
 
-                    try:
-                        self._process_event(event, relay_url=event_msg.url)
-                    except Exception as e:
-                        logger.error("NostrManager: error processing event: %s", e)
-                        import sys
-                        sys.print_exception(e)
-
-                if self.relay_manager.message_pool.has_notices():
-                    notice = self.relay_manager.message_pool.get_notice()
-                    logger.warning("NostrManager: relay notice: %s", notice)
-                    if notice and hasattr(notice, 'content') and self._error_cb:
-                        self._error_cb("Relay: {}".format(notice.content))
-
-                if self.relay_manager.message_pool.has_ok_messages():
-                    ok = self.relay_manager.message_pool.get_ok_message()
-                    if __debug__:
-                        logger.debug(
-                            "NostrManager: OK from %s event=%s status=%s message=%s",
-                            ok.url,
-                            ok.event_id[:16],
-                            ok.status,
-                            ok.message,
-                        )
+    def _drain_message_pool(self):
+        """Process queued relay messages until the pool is empty or
+        DRAIN_BUDGET_MS has elapsed. Returns the number of events handled.
+
+        Everything the relays delivered so far is moved into the local
+        pending queues first (cheap), so NWC replies can be processed ahead
+        of generic subscription traffic that arrived earlier.
+        """
+        pool = self.relay_manager.message_pool
+        while pool.has_events():
+            event_msg = pool.get_event()
+            if event_msg.event.kind in NWC_KINDS:
+                self._pending_nwc_events.append(event_msg)
+            else:
+                self._pending_events.append(event_msg)
+
+        stats = self._drain_stats
+        depth = len(self._pending_nwc_events) + len(self._pending_events)
+        if depth > stats["max_queue_depth"]:
+            stats["max_queue_depth"] = depth
+
+        handled = 0
+        start = time.ticks_ms()
+        while self._pending_nwc_events or self._pending_events:
+            # Always handle at least one event per pass, even if a single
+            # decrypt blew the budget, so the backlog keeps moving.
+            if handled and time.ticks_diff(time.ticks_ms(), start) >= self.DRAIN_BUDGET_MS:
+                break
+            if self._pending_nwc_events:
+                event_msg = self._pending_nwc_events.popleft()
+            else:
+                event_msg = self._pending_events.popleft()
+            handled += 1
+            event = event_msg.event
+            logger.info("NostrManager: received event kind=%s from %s via %s",
+                event.kind, event.public_key[:16], event_msg.url)
+            try:
+                self._process_event(event, relay_url=event_msg.url)
             except Exception as e:
-                logger.error("NostrManager: message poll error: %s", e)
+                logger.error("NostrManager: error processing event: %s", e)
                 import sys
                 sys.print_exception(e)
-                await TaskManager.sleep(1)
+
+        if handled:
+            stats["ticks"] += 1
+            stats["events"] += handled
+            stats["last_tick_events"] = handled
+            if handled > stats["max_tick_events"]:
+                stats["max_tick_events"] = handled
+        stats["queue_depth"] = len(self._pending_nwc_events) + len(self._pending_events)
+        if stats["queue_depth"] and __debug__:
+            logger.debug("NostrManager: drained %s event(s), %s still queued",
+                handled, stats["queue_depth"])
+
+        while pool.has_notices():
+            notice = pool.get_notice()
+            logger.warning("NostrManager: relay notice: %s", notice)
+            if notice and hasattr(notice, 'content') and self._error_cb:
+                self._error_cb("Relay: {}".format(notice.content))
+
+        while pool.has_ok_messages():
+            ok = pool.get_ok_message()
+            if __debug__:
+                logger.debug(
+                    "NostrManager: OK from %s event=%s status=%s message=%s",
+                    ok.url,
+                    ok.event_id[:16],
+                    ok.status,
+                    ok.message,
+                )
+        return handled
 
     def _decrypt_nip17_gift_wrap(self, event):
         """Unwrap a kind 1059/21059 gift-wrap into a kind 14 rumor event."""
@@ -1119,9 +1894,16 @@ class NostrManager:
     def _process_event(self, event, relay_url=None):
         """Route a single event to all relevant handlers."""
 
+        # With several relays subscribed, each one delivers its own copy.
+        # Only the first gets decrypted and dispatched.
+        event_id = getattr(event, "id", None)
+        if event_id is not None and not self._seen_events.add(event_id):
+            self._drain_stats["duplicates"] += 1
+            return
+
         # NWC events are private and handled separately.
-        if event.kind in (23195, 23196) and self._nwc_configured:
-            self._process_nwc_event(event)
+        if event.kind in NWC_KINDS and self._nwc_configured:
+            self._process_nwc_event(event, relay_url)
             return
 
         if event.kind in NIP17_KINDS or event.kind in (KIND_RELAY_LIST, KIND_DM_RELAY_LIST):
@@ -1131,32 +1913,79 @@ class NostrManager:
             )
 
         if event.kind in (KIND_NIP17_GIFT_WRAP, KIND_NIP17_GIFT_WRAP_EPHEMERAL):
+            # Unwrapping takes two NIP-44 decryptions; leave it to the
+            # background task so NWC replies and the UI aren't held up.
+            self._queue_gift_wrap(event, relay_url)
+            return
+
+        self._dispatch_event(event, relay_url)
+
+    def _queue_gift_wrap(self, event, relay_url):
+        queue = self._pending_gift_wraps
+        stats = self._gift_wrap_stats
+        if len(queue) >= self.GIFT_WRAP_QUEUE_MAX:
+            dropped, _ = queue.popleft()
+            stats["dropped"] += 1
+            logger.warning("NostrManager: gift-wrap queue full, dropped %s",
+                getattr(dropped, "id", "?"))
+        queue.append((event, relay_url))
+        stats["queued"] += 1
+        if len(queue) > stats["max_queue_depth"]:
+            stats["max_queue_depth"] = len(queue)
+        if self._gift_wrap_task is None:
+            self._gift_wrap_task = TaskManager.create_task(self._unwrap_gift_wraps())
+
+    async def _unwrap_gift_wraps(self):
+        """Unwrap queued gift wraps one per event loop slice, yielding to
+        the main loop, LVGL and the relay tasks in between."""
+        try:
+            while self._pending_gift_wraps:
+                self._unwrap_next_gift_wrap()
+                await TaskManager.sleep(0)
+        finally:
+            self._gift_wrap_task = None
+
+    def _unwrap_next_gift_wrap(self):
+        """Unwrap the oldest queued gift wrap and dispatch its rumor."""
+        event, relay_url = self._pending_gift_wraps.popleft()
+        try:
             decrypted_event = self._decrypt_nip17_gift_wrap(event)
             if decrypted_event is None:
+                self._gift_wrap_stats["failed"] += 1
                 logger.warning(
                     "NostrManager: failed to unwrap NIP-17 message from %s via %s",
                     event.public_key[:16], relay_url
                 )
                 return
+            self._gift_wrap_stats["unwrapped"] += 1
             # Preserve the original gift-wrap id so the same message deduplicates.
             # Event.id is a computed property; assign an instance attribute to
             # shadow it for downstream code that reads event.id.
             decrypted_event.id = event.id
-            event = decrypted_event
             logger.info(
                 "NostrManager: unwrapped NIP-17 message from %s: %s",
-                event.public_key[:16], event.content
+                decrypted_event.public_key[:16], decrypted_event.content
             )
+            self._dispatch_event(decrypted_event, relay_url)
+        except Exception as e:
+            logger.error("NostrManager: error processing gift wrap: %s", e)
+
+    def _dispatch_event(self, event, relay_url=None):
+        """Hand a (deduplicated, unwrapped) event to handlers,
+        subscriptions and the events list."""
 
-        # Build the shared wrapper once; decrypt DMs if a private key is set.
+        # Build the shared wrapper once; a DM is decrypted when something
+        # first reads its content.
         nostr_event = NostrEvent(event, self._nostr_private_key)
 
-        # Log plaintext for DMs / NIP-17 chat messages so we can see what arrived.
+        # Log DMs / NIP-17 chat messages so we can see what arrived. The
+        # plaintext only at DEBUG: reading it forces decryption.
         if event.kind in (4, KIND_NIP17_CHAT):
-            logger.info(
-                "NostrManager: plaintext message from %s via %s: %s",
-                event.public_key[:16], relay_url, nostr_event.get_display_content()
-            )
+            logger.info("NostrManager: message (kind %d) from %s via %s",
+                        event.kind, event.public_key[:16], relay_url)
+            if __debug__ and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("NostrManager: plaintext: %s",
+                             nostr_event.get_display_content())
 
         # Route by kind to registered callbacks
         if event.kind in self._event_handlers:
@@ -1168,13 +1997,15 @@ class NostrManager:
 
         # Store in events list for NostrApp
         self.events.append(nostr_event)
-        if len(self.events) > self.EVENTS_TO_SHOW:
-            self.events = self.events[-self.EVENTS_TO_SHOW:]
 
-        # Per-subscription callbacks
-        for sub in self._subscriptions:
+        # Per-subscription callbacks, only for subscriptions whose kinds,
+        # authors or "#p" refs allow this event at all.
+        if self._sub_index is None:
+            self._sub_index = SubscriptionIndex(self._subscriptions)
+        for sub in self._sub_index.candidates(event):
             try:
                 if sub.callback and sub.filters.match(event):
+                    sub.note_event(event)
                     sub.callback(nostr_event)
             except Exception as e:
                 logger.error("NostrManager: subscription callback error: %s", e)
@@ -1193,8 +2024,22 @@ class NostrManager:
             except Exception as e:
                 logger.error("NostrManager: events_updated callback error: %s", e)
 
-    def _process_nwc_event(self, event):
+    def _process_nwc_event(self, event, relay_url=None):
         """Decrypt and process an NWC response/notification event."""
+        request = None
+        if event.kind == KIND_NWC_RESPONSE:
+            request_id = _referenced_event_id(event)
+            if request_id is not None and request_id in self._nwc_answered:
+                self._nwc_request_stats["duplicates"] += 1
+                return
+            request = self._close_nwc_request(request_id, answered=True, relay_url=relay_url)
+            if request is None:
+                request = self._nwc_expired.pop(request_id, None)
+                if request is not None:
+                    self._nwc_request_stats["late"] += 1
+                # Late or untracked, a second copy is still a duplicate.
+                if request_id is not None:
+                    self._nwc_answered.add(request_id)
         try:
             decrypted = self._nwc_private_key.decrypt_message(
                 event.content,
@@ -1212,6 +2057,8 @@ class NostrManager:
                         if __debug__:
                             logger.debug("NostrManager: NWC watchdog counter reset (balance)")
                     self._polls_since_last_event = 0
+                    self._reconnect_attempts = 0
+                    self._reconnect_pending = False
                     if self._nwc_balance_cb:
                         self._nwc_balance_cb(new_balance)
 
@@ -1221,8 +2068,18 @@ class NostrManager:
                         if __debug__:
                             logger.debug("NostrManager: NWC watchdog counter reset (transactions)")
                     self._polls_since_last_event = 0
-                    if self._nwc_payments_cb:
-                        self._nwc_payments_cb(result["transactions"])
+                    self._reconnect_attempts = 0
+                    self._reconnect_pending = False
+                    # Only the reply to a known full-page request may
+                    # replace the list. An incremental reply, or one whose
+                    # request is no longer tracked (the table was reset or
+                    # overflowed), could hold just the newest few rows.
+                    transactions = result["transactions"]
+                    if request is not None and request.since is None:
+                        if self._nwc_payments_cb:
+                            self._nwc_payments_cb(transactions)
+                    elif self._nwc_more_payments_cb:
+                        self._nwc_more_payments_cb(transactions)
 
             notification = response.get("notification")
             if notification:
@@ -1234,49 +2091,160 @@ class NostrManager:
             import sys
             sys.print_exception(e)
 
+    def _close_nwc_request(self, request_id, answered, relay_url=None):
+        """Take `request_id` out of the in-flight table and remember it as
+        answered, or as expired so a late reply still finds it with its
+        `since`; the oldest expired request is forgotten once
+        NWC_CLOSED_REQUESTS_TRACKED are held. Records the
+        round trip when `answered`, also against the health of `relay_url`
+        (the relay that delivered the reply). Returns the NWCRequest, or
+        None if it wasn't in flight."""
+        request = self._nwc_in_flight.pop(request_id, None)
+        if request is None:
+            return None
+        if not answered:
+            if len(self._nwc_expired) >= self.NWC_CLOSED_REQUESTS_TRACKED:
+                oldest = min(self._nwc_expired,
+                             key=lambda rid: self._nwc_expired[rid].deadline)
+                del self._nwc_expired[oldest]
+            self._nwc_expired[request_id] = request
+            return request
+        self._nwc_answered.add(request_id)
+        self._nwc_request_stats["answered"] += 1
+        latency = time.ticks_diff(time.ticks_ms(), request.sent_ms)
+        bucket = 0
+        for bound in self.NWC_LATENCY_BUCKETS_MS:
+            if latency <= bound:
+                break
+            bucket += 1
+        self._nwc_latency[bucket] += 1
+        if relay_url is not None:
+            self._relay_health_for(relay_url).record_reply(latency)
+        if __debug__:
+            logger.debug("NostrManager: NWC %s answered in %d ms (attempt %d)",
+                         request.method, latency, request.attempts)
+        return request
+
+    def _check_nwc_deadlines(self, now):
+        """Re-publish NWC requests past their deadline, or give up on them
+        once retries run out. A request lost on every attempt means the
+        relays aren't delivering, so the next poll reconnects instead of
+        waiting out RELAY_SILENT_RECONNECT_THRESHOLD silent polls."""
+        for request_id, request in list(self._nwc_in_flight.items()):
+            if now < request.deadline:
+                continue
+            if request.attempts <= self.NWC_REQUEST_RETRIES and self.relay_manager is not None:
+                request.attempts += 1
+                request.deadline = now + self.NWC_REQUEST_TIMEOUT_SECONDS
+                self._nwc_request_stats["retries"] += 1
+                logger.info("NostrManager: NWC %s unanswered, retry %d",
+                            request.method, request.attempts - 1)
+                # The relay it was routed to let it down; retries fan out
+                # to every relay.
+                if request.relay_url is not None:
+                    self._relay_health_for(request.relay_url).timeouts += 1
+                    request.relay_url = None
+                try:
+                    self.relay_manager.publish_event(request.event)
+                except Exception as e:
+                    logger.warning("NostrManager: NWC retry error: %s", e)
+                continue
+            self._close_nwc_request(request_id, answered=False)
+            self._nwc_request_stats["timeouts"] += 1
+            for url in self._nwc_relays:
+                self._relay_health_for(url).timeouts += 1
+            logger.warning("NostrManager: NWC %s unanswered after %d attempts",
+                           request.method, request.attempts)
+            if self._polls_since_last_event < self.RELAY_SILENT_RECONNECT_THRESHOLD:
+                self._polls_since_last_event = self.RELAY_SILENT_RECONNECT_THRESHOLD
+
     def _handle_nwc_static_receive_code(self, lud16):
         if self._nwc_notification_cb:
             self._nwc_notification_cb({"static_receive_code": lud16})
 
+    def _unhealthy_relays(self):
+        """Relays that are down or have let an NWC request time out since
+        their last reply."""
+        unhealthy = []
+        for url, relay in self.relay_manager.relays.items():
+            if not relay.connected or self._relay_health_for(url).timeouts > 0:
+                unhealthy.append(url)
+        return unhealthy
+
     async def _reconnect_relay(self):
-        """Watchdog reconnect: close, wait, reopen, re-subscribe."""
-        logger.warning("NostrManager: watchdog reconnecting relay (silent for %s polls)",
-            self._polls_since_last_event)
+        """Watchdog reconnect on the existing RelayManager: cycle the relays
+        that are down or have let an NWC request time out — all of them if
+        none looks healthy. Subscription ids are kept; the main loop
+        re-sends each subscription as its relay comes back."""
+        unhealthy = self._unhealthy_relays()
+        if not unhealthy or len(unhealthy) == len(self.relay_manager.relays):
+            unhealthy = list(self.relay_manager.relays.keys())
+        self._reconnect_attempts += 1
+        self._reconnect_not_before = time.time() + self._reconnect_backoff()
+        await self._reconnect_relays(unhealthy)
+
+    def _reconnect_backoff(self):
+        """Seconds the next watchdog reconnect must wait, given the
+        reconnects since the last NWC reply."""
+        if self._reconnect_attempts <= 0:
+            return 0
+        delay = self.RECONNECT_BACKOFF_BASE_SECONDS * 2 ** (self._reconnect_attempts - 1)
+        delay = min(delay, self.RECONNECT_BACKOFF_MAX_SECONDS)
+        return delay * (0.5 + random.random() / 2)
+
+    def _resume_subscriptions(self):
+        """Resume every subscription from the newest events it has
+        delivered (see NostrSubscription.resume) instead of replaying its
+        whole window after a reconnect."""
+        now = int(time.time())
+        for sub in self._subscriptions:
+            sub.resume(now)
+
+    async def _reconnect_relays(self, urls):
+        """Replace just the relays in `urls` with fresh connections; the
+        main loop re-sends subscriptions once each one is connected."""
+        logger.warning("NostrManager: watchdog reconnecting %s (silent for %s polls, attempt %s)",
+            urls, self._polls_since_last_event, self._reconnect_attempts)
+        self._resume_subscriptions()
+        stale = {}
+        for url in urls:
+            relay = self.relay_manager.relays.pop(url, None)
+            if relay is not None:
+                stale[url] = relay
         try:
-            await self.relay_manager.close_connections()
+            await self._on_relays(stale, self.relay_manager.close_connections)
         except Exception as e:
-                    logger.warning("NostrManager: close during reconnect failed: %s", e)
-
-        await TaskManager.sleep(2)
-
-        old_relay_urls = list(self.relay_manager.relays.keys()) if hasattr(self.relay_manager, 'relays') else []
-        self.relay_manager = RelayManager()
-        self._relay_connected_state = {}
-        for url in old_relay_urls:
+            logger.warning("NostrManager: close_connections during reconnect failed: %s", e)
+        fresh = {}
+        for url in urls:
             self.relay_manager.add_relay(url)
-
+            fresh[url] = self.relay_manager.relays[url]
+            self._relay_connected_state[url] = False
+            health = self._relay_health_for(url)
+            health.connected_since = None
+            health.timeouts = 0
+            health.error_counter_seen = 0
         try:
-            await self.relay_manager.open_connections({"cert_reqs": ssl.CERT_NONE})
+            await self._on_relays(fresh, self.relay_manager.open_connections,
+                                  {"cert_reqs": ssl.CERT_NONE})
         except Exception as e:
             logger.warning("NostrManager: open_connections during reconnect failed: %s", e)
-
-        for _ in range(50):
-            await TaskManager.sleep(0.1)
-            if not self.keep_running:
-                return
-            if self.relay_manager.connected_relays() > 0:
-                break
-
-        connected = [url for url, relay in self.relay_manager.relays.items() if relay.connected]
-        self._subscription_ids = {}
-        if connected:
-            self._send_subscriptions_to_relays(connected)
-        self._relay_connected_state = {
-            url: relay.connected for url, relay in self.relay_manager.relays.items()
-        }
-
         self._polls_since_last_event = 0
 
+    async def _on_relays(self, relays, manager_call, *args):
+        """Await `manager_call`, a RelayManager method that works on every
+        relay it holds (close_connections, open_connections), for just
+        `relays` ({url: Relay}). The manager's relay table is narrowed to
+        them for the call, so the healthy relays are neither closed nor
+        reopened, then put back."""
+        manager = self.relay_manager
+        table = manager.relays
+        manager.relays = relays
+        try:
+            await manager_call(*args)
+        finally:
+            manager.relays = table
+
     async def _sync_relays(self):
         """Hot-add relays configured after the manager started.
 
@@ -1316,14 +2284,9 @@ class NostrManager:
             self._publish_subscription(sub, sub_id)
 
         if self._nwc_configured and self._nwc_sub_id:
-            self._nwc_filters = Filters([Filter(
-                kinds=[23195, 23196],
-                authors=[self._nwc_wallet_pubkey],
-                pubkey_refs=[self._nwc_private_key.public_key.hex()]
-            )])
+            req_json = self._nwc_subscription_req()
             self.relay_manager.add_subscription(self._nwc_sub_id, self._nwc_filters)
-            self.relay_manager.publish_message(json.dumps(
-                [ClientMessageType.REQUEST, self._nwc_sub_id] + self._nwc_filters.to_json_array()))
+            self.relay_manager.publish_message(req_json)
 
         self._relay_connected_state.update({
             url: relay.connected for url, relay in self.relay_manager.relays.items()
@@ -1337,30 +2300,106 @@ class NostrManager:
 
     # --- NWC request methods ---
 
-    def nwc_fetch_balance(self):
-        if not self._nwc_configured:
+    def _send_nwc_poll(self, now):
+        """One periodic poll: always get_balance, list_transactions only
+        when the last list is NWC_LIST_MAX_STALE_SECONDS old and none is
+        still in flight. The list can only have changed if the balance
+        did — and then the wallet's handle_new_balance fetches it straight
+        away — or a notification arrived, which carries the payment
+        itself."""
+        try:
+            self.nwc_fetch_balance()
+        except Exception as e:
+            logger.warning("NostrManager: fetch_balance error: %s", e)
+
+        max_stale = self.NWC_LIST_MAX_STALE_SECONDS
+        if max_stale > 0 and now - self._last_nwc_list_request < max_stale:
+            if __debug__:
+                logger.debug("NostrManager: balance-only NWC poll")
             return
-        balance_request = {"method": "get_balance", "params": {}}
-        self._publish_signed_dm(
+        if self.nwc_list_in_flight():
+            if __debug__:
+                logger.debug("NostrManager: NWC list still in flight, balance-only poll")
+            return
+        try:
+            self.nwc_fetch_payments()
+        except Exception as e:
+            logger.warning("NostrManager: fetch_payments error: %s", e)
+
+    def _send_nwc_request(self, method, params, since=None):
+        """Sign and publish an NWC request and track it in flight until its
+        reply arrives (see _check_nwc_deadlines)."""
+        if self.relay_manager is None:
+            raise RuntimeError("Relay manager is not ready yet")
+        dm = self._sign_dm(
             self._nwc_private_key,
             self._nwc_wallet_pubkey,
-            json.dumps(balance_request),
+            json.dumps({"method": method, "params": params}),
             kind=23194,
         )
+        relay_url = self._best_nwc_relay()
+        if relay_url is not None:
+            self.relay_manager.relays[relay_url].publish(dm.to_message())
+        else:
+            self.relay_manager.publish_event(dm)
+        self._nwc_in_flight[dm.id] = NWCRequest(
+            dm, method, time.time() + self.NWC_REQUEST_TIMEOUT_SECONDS, since, relay_url)
+        self._nwc_request_stats["sent"] += 1
+        return dm.id
+
+    def _best_nwc_relay(self):
+        """The connected NWC relay with the best RelayHealth score, or None
+        (publish to every relay) when none of them is connected."""
+        best_url = None
+        best_score = None
+        for url in self._nwc_relays:
+            relay = self.relay_manager.relays.get(url)
+            if relay is None or not relay.connected:
+                continue
+            score = self._relay_health_for(url).score()
+            if best_score is None or score < best_score:
+                best_url = url
+                best_score = score
+        return best_url
+
+    def _track_relay_health(self, url, relay, now):
+        health = self._relay_health_for(url)
+        if relay.connected:
+            if health.connected_since is None:
+                health.connected_since = now
+                health.connects += 1
+        else:
+            health.connected_since = None
+        health.record_errors(getattr(relay, "error_counter", 0), now)
+
+    def nwc_fetch_balance(self):
+        if not self._nwc_configured:
+            return
+        self._send_nwc_request("get_balance", {})
+
+    def nwc_list_in_flight(self):
+        """True while a list_transactions request awaits its reply. Its
+        answer is as fresh as a new request's would be: requests are given
+        up on well within one NWC poll interval."""
+        for request in self._nwc_in_flight.values():
+            if request.method == "list_transactions":
+                return True
+        return False
 
     def nwc_fetch_payments(self):
         if not self._nwc_configured:
             return
-        list_transactions = {
-            "method": "list_transactions",
-            "params": {"limit": self._nwc_list_limit}
-        }
-        self._publish_signed_dm(
-            self._nwc_private_key,
-            self._nwc_wallet_pubkey,
-            json.dumps(list_transactions),
-            kind=23194,
-        )
+        params = {"limit": self._nwc_list_limit}
+        since = None
+        if (self._nwc_list_from is not None
+                and self._nwc_lists_since_full < self.NWC_FULL_SYNC_EVERY - 1):
+            since = self._nwc_list_from
+            params["from"] = since
+            self._nwc_lists_since_full += 1
+        else:
+            self._nwc_lists_since_full = 0
+        self._send_nwc_request("list_transactions", params, since)
+        self._last_nwc_list_request = time.time()
 
 
 class NostrClientService(Service):
@@ -14,6 +14,7 @@ from nostr_service import NostrManager
 from wallet import Wallet, ensure_lightning_prefix
 from payment import Payment
 from unique_sorted_list import UniqueSortedList
+import wallet_cache
 
 
 class NWCWallet(Wallet):
@@ -51,6 +52,11 @@ class NWCWallet(Wallet):
     def __init__(self, nwc_url):
         super().__init__()
         self._payments_to_show_value = 21
+        # Newest created_at fetched into payment_list by list_transactions
+        # (notifications don't count: one arriving after a gap says nothing
+        # about the transactions in the gap). Persisted per slot, so polls
+        # only ask for newer transactions across restarts too.
+        self._sync_cursor = None
         self.nwc_url = nwc_url
         if not nwc_url:
             raise ValueError("NWC URL is not set.")
@@ -78,8 +84,10 @@ class NWCWallet(Wallet):
         mgr.set_nwc_callbacks(
             balance_cb=self._mgr_balance_cb,
             payments_cb=self._mgr_payments_cb,
+            more_payments_cb=self._mgr_more_payments_cb,
             notification_cb=self._mgr_notification_cb,
         )
+        self._resume_sync(mgr)
 
         try:
             mgr.configure_nwc(self.nwc_url)
@@ -92,8 +100,59 @@ class NWCWallet(Wallet):
         self.handle_new_balance(new_balance)
         self.notify_poll_success()
 
+    def _resume_sync(self, mgr):
+        """Pick up incremental sync where the last session left it: the
+        cursor only means something together with the payments it was
+        fetched into, so seed payment_list from the cache with it. Without
+        a cached cursor, polls fetch full pages until the first reply."""
+        if (self._sync_cursor is None and len(self.payment_list) == 0
+                and self.slot_key and self.creds_fingerprint is not None):
+            cached = wallet_cache.load_slot(self.slot_key, self.creds_fingerprint, None)
+            if cached["payments"] is not None and cached["sync_cursor"] is not None:
+                self.payment_list = cached["payments"].to_list()
+                self._sync_cursor = cached["sync_cursor"]
+        # Same older-copy caveat as set_nwc_list_limit above.
+        try:
+            mgr.set_nwc_list_from(self._sync_cursor)
+        except AttributeError:
+            print("NWCWallet: NostrManager lacks set_nwc_list_from "
+                  "(older copy loaded) — fetching full transaction pages")
+
+    def _advance_sync_cursor(self, newest):
+        if not self.keep_running or newest is None:
+            return
+        if self._sync_cursor is not None and newest <= self._sync_cursor:
+            return
+        self._sync_cursor = newest
+        self._save_cache(sync_cursor=newest)
+        try:
+            NostrManager.get_instance().set_nwc_list_from(newest)
+        except AttributeError:
+            pass
+
     def _mgr_payments_cb(self, transactions):
-        new_payment_list = UniqueSortedList()
+        """A full list_transactions page, which replaces payment_list."""
+        new_payments, newest = self._parse_transactions(transactions)
+        new_payment_list = UniqueSortedList.from_iterable(new_payments)
+        if len(new_payment_list) > 0:
+            self.handle_new_payments(new_payment_list)
+        self._advance_sync_cursor(newest)
+        self.notify_poll_success()
+
+    def _mgr_more_payments_cb(self, transactions):
+        """An incremental list_transactions reply, or one whose request the
+        manager no longer knows: merged into payment_list, never replacing
+        it."""
+        new_payments, newest = self._parse_transactions(transactions)
+        if new_payments:
+            self.handle_more_payments(new_payments)
+        self._advance_sync_cursor(newest)
+        self.notify_poll_success()
+
+    def _parse_transactions(self, transactions):
+        """Return ([Payment], newest created_at or None) for a reply."""
+        new_payments = []
+        newest = None
         for transaction in transactions:
             amount = round(transaction["amount"] / 1000)
             # NIP-47 list_transactions amounts are unsigned msats with a
@@ -103,11 +162,10 @@ class NWCWallet(Wallet):
                 amount = -amount
             comment = self.getCommentFromTransaction(transaction)
             epoch_time = transaction["created_at"]
-            payment_obj = Payment(epoch_time, amount, comment)
-            new_payment_list.add(payment_obj)
-        if len(new_payment_list) > 0:
-            self.handle_new_payments(new_payment_list)
-        self.notify_poll_success()
+            if newest is None or epoch_time > newest:
+                newest = epoch_time
+            new_payments.append(Payment(epoch_time, amount, comment))
+        return new_payments, newest
 
     def _mgr_notification_cb(self, notification):
         if "static_receive_code" in notification:
@@ -147,7 +205,16 @@ class NWCWallet(Wallet):
         NostrManager.get_instance().nwc_fetch_balance()
 
     async def fetch_payments(self):
-        NostrManager.get_instance().nwc_fetch_payments()
+        mgr = NostrManager.get_instance()
+        # The first poll sends list_transactions together with the
+        # get_balance whose reply triggers this fetch; that list answers
+        # it already. Same older-copy caveat as set_nwc_list_limit above.
+        try:
+            if mgr.nwc_list_in_flight():
+                return
+        except AttributeError:
+            pass
+        mgr.nwc_fetch_payments()
 
     def getCommentFromTransaction(self, transaction):
         comment = ""
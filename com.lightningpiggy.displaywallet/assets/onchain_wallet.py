@@ -306,7 +306,7 @@ class OnchainWallet(Wallet):
         `isOwn: true`, so we don't need to track derived addresses ourselves.
         Returns (payments, any_unconfirmed).
         """
-        payments = UniqueSortedList()
+        payments = []
         any_unconfirmed = False
 
         for tx in transactions or []:
@@ -340,12 +340,12 @@ class OnchainWallet(Wallet):
                 # All inputs + outputs ours — classic self-transfer, fee-only loss.
                 fee = _try_int(tx.get("fees", "0"))
                 comment = "{} self-transfer".format(date_str).strip()
-                payments.add(Payment(epoch_time, -fee, comment))
+                payments.append(Payment(epoch_time, -fee, comment))
             else:
                 comment = "{} {}".format(date_str, status_str).strip()
-                payments.add(Payment(epoch_time, net, comment))
+                payments.append(Payment(epoch_time, net, comment))
 
-        return payments, any_unconfirmed
+        return UniqueSortedList.from_iterable(payments), any_unconfirmed
 
     def _pick_unused_receive_address(self, tokens):
         """Return the lowest-index unused external receive address, or None.
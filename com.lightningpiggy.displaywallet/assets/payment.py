@@ -27,54 +27,103 @@ def _format_sats(amount):
 
 
 class Payment:
+    """One transaction, treated as an immutable value: the fields are fixed
+    at construction and read back through properties over the precomputed
+    sort key, so comparisons and hashing never build a fresh tuple.
+
+    The display string isn't kept per instance (up to 50 of them on an
+    ESP32 heap); PaymentsView reuses a row's text while render_stamp() is
+    unchanged instead."""
+
+    # MicroPython accepts but ignores __slots__; on CPython it drops the
+    # per-instance __dict__. Either way the key is the only attribute.
+    __slots__ = ("_key",)
+
     use_symbol = False  # When True, use ₿ prefix instead of "sats" suffix
 
+    # Bumped by invalidate_rendered(); part of render_stamp().
+    _render_generation = 0
+
     def __init__(self, epoch_time, amount_sats, comment):
-        self.epoch_time = epoch_time
-        self.amount_sats = amount_sats
-        self.comment = comment
+        self._key = (epoch_time, amount_sats, comment)
+
+    @property
+    def epoch_time(self):
+        return self._key[0]
+
+    @property
+    def amount_sats(self):
+        return self._key[1]
+
+    @property
+    def comment(self):
+        return self._key[2]
+
+    @classmethod
+    def invalidate_rendered(cls):
+        """Mark every rendered display string stale, e.g. after the user may
+        have changed the thousands-separator preference. `use_symbol`
+        changes are picked up without calling this."""
+        cls._render_generation += 1
+
+    @classmethod
+    def render_stamp(cls):
+        """An int that changes whenever every payment's display string may
+        have changed (use_symbol toggle or invalidate_rendered())."""
+        return Payment._render_generation * 2 + (1 if Payment.use_symbol else 0)
 
     def __str__(self):
-        amount_str = _format_sats(self.amount_sats)
+        amount_sats = self._key[1]
+        comment = self._key[2]
+        amount_str = _format_sats(amount_sats)
         if Payment.use_symbol:
-            if not self.comment:
+            if not comment:
                 verb = "spent"
-                if self.amount_sats > 0:
+                if amount_sats > 0:
                     verb = "received!"
                 return f"₿{amount_str} {verb}"
-            return f"₿{amount_str}: {self.comment}"
+            return f"₿{amount_str}: {comment}"
         else:
             sattext = "sats"
-            if self.amount_sats == 1:
+            if amount_sats == 1:
                 sattext = "sat"
-            if not self.comment:
+            if not comment:
                 verb = "spent"
-                if self.amount_sats > 0:
+                if amount_sats > 0:
                     verb = "received!"
                 return f"{amount_str} {sattext} {verb}"
-            return f"{amount_str} {sattext}: {self.comment}"
+            return f"{amount_str} {sattext}: {comment}"
+
+    def sort_key(self):
+        """The tuple payments are ordered and deduplicated by. Two payments
+        are equal exactly when their sort keys are equal, so the key doubles
+        as a hashable identity (UniqueSortedList indexes on it)."""
+        return self._key
+
+    def __hash__(self):
+        return hash(self._key)
 
     def __eq__(self, other):
         if not isinstance(other, Payment):
             return False
-        return self.epoch_time == other.epoch_time and self.amount_sats == other.amount_sats and self.comment == other.comment
+        return self._key == other._key
 
     def __lt__(self, other):
         if not isinstance(other, Payment):
             return NotImplemented
-        return (self.epoch_time, self.amount_sats, self.comment) < (other.epoch_time, other.amount_sats, other.comment)
+        return self._key < other._key
 
     def __le__(self, other):
         if not isinstance(other, Payment):
             return NotImplemented
-        return (self.epoch_time, self.amount_sats, self.comment) <= (other.epoch_time, other.amount_sats, other.comment)
+        return self._key <= other._key
 
     def __gt__(self, other):
         if not isinstance(other, Payment):
             return NotImplemented
-        return (self.epoch_time, self.amount_sats, self.comment) > (other.epoch_time, other.amount_sats, other.comment)
+        return self._key > other._key
 
     def __ge__(self, other):
         if not isinstance(other, Payment):
             return NotImplemented
-        return (self.epoch_time, self.amount_sats, self.comment) >= (other.epoch_time, other.amount_sats, other.comment)
+        return self._key >= other._key
@@ -0,0 +1,201 @@
+# PaymentsView — the on-screen transaction list, one lv.label per row.
+#
+# The list used to be a single label fed `str(payment_list)`: every redraw
+# re-formatted and re-joined every payment, and LVGL re-wrapped and
+# re-laid-out the whole block even when a push notification only prepended
+# one row. Here each payment gets its own row label, keyed by
+# Payment.sort_key(). A redraw reconciles the wanted rows against what is
+# already on screen: rows whose payment is still shown are kept (and only
+# re-texted if their string changed, e.g. after a denomination toggle),
+# new payments take a label from a pool of hidden spares, and dropped
+# payments hide their label and return it to the pool. A single new
+# payment therefore costs one set_text plus one child move.
+#
+# Redraws of a list whose UniqueSortedList.version, row limit and
+# Payment.render_stamp() all match what is already on screen are skipped
+# outright — balance and payment callbacks often repaint the same list
+# back to back. Otherwise a kept row reuses its text without calling
+# str(payment) as long as render_stamp() hasn't moved: payments are
+# immutable, so the key and the stamp determine the string.
+#
+# Status messages ("Connecting…", errors, "No payments yet") still go to
+# the original payments label, shown in place of the rows.
+
+import lvgl as lv
+
+from payment import Payment
+
+
+class PaymentsView:
+
+    def __init__(self, container, message_label):
+        self.container = container
+        self.message_label = message_label
+        # Stack the message label and the rows vertically; hidden children
+        # take no space in a flex layout.
+        container.set_flex_flow(lv.FLEX_FLOW.COLUMN)
+        container.set_style_pad_row(0, lv.PART.MAIN)
+        self._font = None
+        # Visible rows in display order, as parallel lists.
+        self._row_labels = []
+        self._row_keys = []
+        self._row_texts = []
+        # Hidden labels ready for reuse.
+        self._spare_labels = []
+        self._showing_message = True
+        # (list version, limit, render stamp) the rows currently show, or
+        # None when that isn't known.
+        self._rendered = None
+        # Payment.render_stamp() the row texts were formatted under.
+        self._texts_stamp = None
+        # Counters for diagnostics: rows re-texted, rows created, redraws
+        # that changed something on screen, redraws skipped as unchanged.
+        self.texts_set = 0
+        self.labels_created = 0
+        self.relayouts = 0
+        self.skipped = 0
+
+    def set_font(self, font):
+        self._font = font
+        self.message_label.set_style_text_font(font, lv.PART.MAIN)
+        for label in self._row_labels:
+            label.set_style_text_font(font, lv.PART.MAIN)
+        for label in self._spare_labels:
+            label.set_style_text_font(font, lv.PART.MAIN)
+
+    def show_message(self, text):
+        """Show a status text instead of the payment rows. The rows keep
+        their content, so switching back to the same list is cheap."""
+        self.message_label.set_text(text)
+        self._rendered = None
+        if not self._showing_message:
+            self.message_label.remove_flag(lv.obj.FLAG.HIDDEN)
+            for label in self._row_labels:
+                label.add_flag(lv.obj.FLAG.HIDDEN)
+            self._showing_message = True
+
+    def show_payments(self, payments, limit=None):
+        """Make the rows match the first `limit` entries of `payments`
+        (all of them when limit is None), touching only what changed.
+        Returns True if anything on screen changed."""
+        stamp = None
+        render_stamp = Payment.render_stamp()
+        version = getattr(payments, "version", None)
+        if version is not None:
+            stamp = (version, limit, render_stamp)
+            if stamp == self._rendered:
+                self.skipped += 1
+                return False
+        texts_before = self.texts_set
+        reuse_texts = render_stamp == self._texts_stamp
+        moved = False
+        wanted = []
+        for payment in payments:
+            if limit is not None and len(wanted) >= limit:
+                break
+            wanted.append(payment)
+
+        old_index = {}
+        for i, key in enumerate(self._row_keys):
+            old_index[key] = i
+        kept = [False] * len(self._row_keys)
+        new_labels = []
+        new_keys = []
+        new_texts = []
+        pending = []
+        for payment in wanted:
+            key = payment.sort_key()
+            i = old_index.get(key)
+            if i is not None and not kept[i]:
+                kept[i] = True
+                label = self._row_labels[i]
+                old_text = self._row_texts[i]
+            else:
+                label = None
+                old_text = None
+            new_labels.append(label)
+            new_keys.append(key)
+            if label is not None and reuse_texts:
+                text = old_text
+            else:
+                text = str(payment)
+            new_texts.append(text)
+            if label is None:
+                pending.append(len(new_labels) - 1)
+            elif text != old_text:
+                label.set_text(text)
+                self.texts_set += 1
+
+        # Release the rows that are no longer wanted before handing out
+        # labels, so a changed payment reuses the label it replaced.
+        for i, label in enumerate(self._row_labels):
+            if not kept[i]:
+                label.add_flag(lv.obj.FLAG.HIDDEN)
+                self._spare_labels.append(label)
+        for pos in pending:
+            label = self._take_label()
+            label.set_text(new_texts[pos])
+            self.texts_set += 1
+            new_labels[pos] = label
+
+        # Put the rows in order right after the message label. Children
+        # already at the right index (the common case: everything below a
+        # newly prepended row just shifts along) are left alone.
+        for pos, label in enumerate(new_labels):
+            if label.get_index() != pos + 1:
+                label.move_to_index(pos + 1)
+                moved = True
+
+        if self._showing_message:
+            self.message_label.add_flag(lv.obj.FLAG.HIDDEN)
+            self._showing_message = False
+            moved = True
+        # New rows come out of the pool hidden; kept rows may have been
+        # hidden by show_message.
+        for label in new_labels:
+            if label.has_flag(lv.obj.FLAG.HIDDEN):
+                label.remove_flag(lv.obj.FLAG.HIDDEN)
+                moved = True
+
+        released = len(self._row_labels) - (len(new_labels) - len(pending))
+        self._row_labels = new_labels
+        self._row_keys = new_keys
+        self._row_texts = new_texts
+        self._texts_stamp = render_stamp
+        self._rendered = stamp
+        changed = moved or released > 0 or self.texts_set != texts_before
+        if changed:
+            self.relayouts += 1
+        return changed
+
+    def take_stats(self):
+        """Return and reset the diagnostic counters."""
+        stats = {
+            "relayouts": self.relayouts,
+            "skipped": self.skipped,
+            "texts_set": self.texts_set,
+            "labels_created": self.labels_created,
+        }
+        self.relayouts = 0
+        self.skipped = 0
+        self.texts_set = 0
+        self.labels_created = 0
+        return stats
+
+    def row_count(self):
+        return len(self._row_labels)
+
+    def _take_label(self):
+        if self._spare_labels:
+            return self._spare_labels.pop()
+        label = lv.label(self.container)
+        label.set_width(lv.pct(100))
+        label.set_long_mode(lv.label.LONG_MODE.WRAP)
+        if self._font is not None:
+            label.set_style_text_font(self._font, lv.PART.MAIN)
+        # Not clickable: taps and drags fall through to the container,
+        # which cycles the font and scrolls the list.
+        label.remove_flag(lv.obj.FLAG.CLICKABLE)
+        label.add_flag(lv.obj.FLAG.HIDDEN)
+        self.labels_created += 1
+        return label
@@ -1,6 +1,9 @@
 # keeps a list of items
-# The .add() method ensures the list remains unique (via __eq__)
-# and sorted (via __lt__) by inserting new items in the correct position.
+# The .add() method ensures the list remains unique and sorted (descending)
+# by inserting new items in the correct position. Items must provide a
+# sort_key() (see Payment.sort_key): ordering and uniqueness are decided on
+# that key, so an insert is a hash lookup plus a binary search instead of
+# two linear scans of Payment comparisons.
 class UniqueSortedList:
 
     # Hard cap on retained items. The display never shows more than the
@@ -12,22 +15,121 @@ class UniqueSortedList:
     # oldest entries.
     MAX_ITEMS = 50
 
+    # Source of `version` stamps, shared by all instances so two different
+    # lists never carry the same stamp.
+    _last_version = 0
+
     def __init__(self):
+        # Re-stamped by every mutation that changes the contents. Lets the
+        # display tell "same list, nothing to redraw" apart from a real
+        # update without comparing items.
+        self.version = self._next_version()
         self._items = []
+        # Sort key of each entry in _items, in the same (descending) order,
+        # so the insertion point can be binary-searched. MicroPython has no
+        # bisect module, hence the hand-rolled search in add().
+        self._keys = []
+        # Hash index over _keys for O(1) duplicate detection.
+        self._key_set = set()
 
     def add(self, item):
-        # Check if item already exists (using __eq__)
-        if item not in self._items:
-            # Insert item in sorted position for descending order (using __gt__)
-            for i, existing_item in enumerate(self._items):
-                if item > existing_item:
-                    self._items.insert(i, item)
-                    break
+        key = item.sort_key()
+        if key in self._key_set:
+            return
+        # Find the first position whose key is smaller than the new one —
+        # the same spot the old linear "first existing item that is smaller"
+        # scan picked.
+        keys = self._keys
+        lo = 0
+        hi = len(keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key > keys[mid]:
+                hi = mid
+            else:
+                lo = mid + 1
+        if lo >= self.MAX_ITEMS:
+            # Older than everything a full list keeps: it would be trimmed
+            # straight away, so the contents (and version) stay as they are.
+            return
+        self._items.insert(lo, item)
+        keys.insert(lo, key)
+        self._key_set.add(key)
+        if len(self._items) > self.MAX_ITEMS:
+            self._trim()
+        self.version = self._next_version()
+
+    @classmethod
+    def _next_version(cls):
+        UniqueSortedList._last_version += 1
+        return UniqueSortedList._last_version
+
+    @classmethod
+    def from_iterable(cls, items):
+        """Build a list from many items in one go (see extend)."""
+        new_list = cls()
+        new_list.extend(items)
+        return new_list
+
+    def extend(self, items):
+        """Add many items at once: sort the batch once, then fold it into
+        the list in a single merge pass that drops duplicates and stops at
+        MAX_ITEMS. Used by the backends, which get a whole page of
+        transactions per poll — calling add() per transaction would insert
+        (and shift) one item at a time."""
+        batch = [(item.sort_key(), item) for item in items]
+        if not batch:
+            return
+        batch.sort(key=lambda entry: entry[0], reverse=True)
+        self._merge_sorted([entry[0] for entry in batch],
+                           [entry[1] for entry in batch])
+
+    def merge(self, other):
+        """Fold another UniqueSortedList (e.g. the handful of transactions a
+        push notification or an incremental sync returned) into this one.
+        Both sides are already sorted, so no re-sort is needed."""
+        self._merge_sorted(other._keys, other._items)
+
+    def _merge_sorted(self, keys, items):
+        """Merge a descending run of (keys, items) with this list, keeping
+        the first occurrence of each key and at most MAX_ITEMS entries."""
+        own_keys = self._keys
+        own_items = self._items
+        n_own = len(own_keys)
+        n_new = len(keys)
+        cap = self.MAX_ITEMS
+        out_keys = []
+        out_items = []
+        seen = set()
+        i = 0
+        j = 0
+        while len(out_keys) < cap and (i < n_own or j < n_new):
+            if j >= n_new or (i < n_own and own_keys[i] >= keys[j]):
+                key = own_keys[i]
+                item = own_items[i]
+                i += 1
             else:
-                # If item is smaller than all existing items, append it
-                self._items.append(item)
-            if len(self._items) > self.MAX_ITEMS:
-                self._items = self._items[:self.MAX_ITEMS]
+                key = keys[j]
+                item = items[j]
+                j += 1
+            if key in seen:
+                continue
+            seen.add(key)
+            out_keys.append(key)
+            out_items.append(item)
+        if out_keys == own_keys:
+            return
+        self._keys = out_keys
+        self._items = out_items
+        self._key_set = seen
+        self.version = self._next_version()
+
+    def _trim(self):
+        """Drop the oldest entries past MAX_ITEMS, in place."""
+        for key in self._keys[self.MAX_ITEMS:]:
+            self._key_set.discard(key)
+        del self._items[self.MAX_ITEMS:]
+        del self._keys[self.MAX_ITEMS:]
 
     def __iter__(self):
         # Return iterator for the internal list
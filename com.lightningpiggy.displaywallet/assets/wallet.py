@@ -168,6 +168,20 @@ class Wallet:
             if self.payments_updated_cb:
                 self.payments_updated_cb()
 
+    def handle_more_payments(self, more_payments):
+        """Fold a partial list (e.g. an incremental sync's newest
+        transactions) into payment_list instead of replacing it."""
+        if not self.keep_running:
+            return
+        print("handle_more_payments")
+        version = self.payment_list.version
+        self.payment_list.extend(more_payments)
+        if self.payment_list.version != version:
+            print("new payments merged")
+            self._save_cache(payments=self.payment_list)
+            if self.payments_updated_cb:
+                self.payments_updated_cb()
+
     def handle_new_static_receive_code(self, new_static_receive_code):
         print("handle_new_static_receive_code")
         if not self.keep_running or not new_static_receive_code:
@@ -1,21 +1,46 @@
 """Per-(wallet-type, wallet-slot) on-disk cache of balance, payments and
 static-receive-code.
 
-Cache layout (cache.json):
+Cache layout — a tiny index plus one file per slot, so a write or a load
+only touches the slot in question:
+
+    cache.json (index):
+    {
+      "version": 4,
+      "slots": {"<slot_key>": "cache_<slot_key>.json", ...}
+    }
+
+    cache_<slot_key>.json:                  # e.g. cache_lnbits_1.json
     {
-      "version": 2,
-      "slots": {
-        "<slot_key>": {                     # e.g. "lnbits_1", "nwc_2", "onchain_1"
-          "creds_fp": "<hash>",     # fingerprint guarding balance + payments
-          "qr_fp":    "<hash>",     # fingerprint guarding static_receive_code
-          "balance":              3113,              # optional
-          "payments":              [ {epoch_time, amount_sats, comment}, ... ],
-          "static_receive_code":   "lightning:..."
+      "version": 4,
+      "slot": {
+        "creds_fp": "<hash>",       # fingerprint guarding balance + payments
+        "qr_fp":    "<hash>",       # fingerprint guarding static_receive_code
+        "balance":              3113,              # optional
+        "payments": {                              # columnar, newest first
+          "epoch_time":  [1767713767, ...],
+          "amount_sats": [21, ...],
+          "comment_ix":  [0, ...],  # index into "comments"
+          "comments":    ["", "Thanks!", ...]     # each distinct comment once
         },
-        ...
+        "static_receive_code":   "lightning:...",
+        "sync_cursor":           1767713767,       # optional, see below
+        "last_updated":          1767713767
       }
     }
 
+    snapshot_<slot_key>.json:               # see save_snapshot
+    {"version": 4, "snapshot": {...}}
+
+Payments are stored as parallel columns rather than a list of
+{epoch_time, amount_sats, comment} objects, so the three key names appear
+once per slot instead of once per payment and repeated comments (empty
+ones, recurring zap messages) are stored once.
+
+`sync_cursor` is the newest transaction timestamp a backend has fetched
+into `payments` (NWC's incremental list_transactions asks only for what is
+newer). It is guarded by creds_fp like the payments it describes.
+
 The `slot_key` combines wallet *type* with the user-facing wallet *slot*
 (1 or 2 in the multi-wallet feature) so each (type, slot) pair retains its
 own balance + payments + QR across reboots and slot-switches. Switching
@@ -28,17 +53,30 @@ NWC-string invalidates everything (creds_fp mismatch). Load-side: each
 field comes back only if its fingerprint matches; otherwise it's None and
 the caller shows a spinner / fetches fresh.
 
-v1 caches (no `version` key, flat {balance, payments, static_receive_code})
-are silently discarded on first load; the next successful fetch writes v2.
+v2 caches (every slot inline in cache.json under "slots", payments as a
+list of objects) are migrated to v4 at import. v1 caches (no `version` key, flat {balance,
+payments, static_receive_code}) are silently discarded on first load.
+
+The index is read at import; a slot file is parsed the first time that
+slot is needed and then kept in an in-RAM mirror, so `load_slot` and
+`save_slot` never re-read a file. Writes are write-behind: `save_slot`
+updates the mirror, marks the slot dirty and schedules a flush
+FLUSH_DELAY_SECONDS later, so the balance + payments + receive-code writes
+of one poll land in a single commit of that slot's file. Call `flush()` to
+persist right away (the display does on pause/destroy).
+
+Display snapshots get their own small file per slot rather than riding in
+the slot file: the first paint reads a few hundred bytes instead of the
+whole payment history, and a repaint rewrites only that slot's snapshot.
 """
 import hashlib
 import time
 
-from mpos import SharedPreferences
+from mpos import SharedPreferences, TaskManager
 from payment import Payment
 from unique_sorted_list import UniqueSortedList
 
-_CACHE_VERSION = 2
+_CACHE_VERSION = 4
 
 # Minimum seconds between cache writes that ONLY refresh `last_updated`
 # (no balance / payments / receive-code change). Wallet.notify_poll_success
@@ -56,7 +94,27 @@ TIMESTAMP_ONLY_WRITE_INTERVAL = 900
 # write after boot goes through — exactly right.
 _last_write_time = {}
 
-_cache = SharedPreferences("com.lightningpiggy.displaywallet", filename="cache.json")
+# Seconds to wait after a save_slot before committing cache.json, so that
+# the back-to-back writes of one poll (handle_new_balance immediately
+# followed by handle_new_payments, etc.) are coalesced into one flash write.
+FLUSH_DELAY_SECONDS = 2
+
+# slot_keys changed by save_slot but not yet committed to disk.
+_dirty = set()
+
+# True while a delayed flush is scheduled (see _schedule_flush).
+_flush_scheduled = False
+
+_APP_ID = "com.lightningpiggy.displaywallet"
+
+# The index file (cache.json). Also where v2 kept every slot inline.
+_cache = SharedPreferences(_APP_ID, filename="cache.json")
+
+# slot_key -> SharedPreferences of that slot's file, created on first use.
+_slot_files = {}
+
+# slot_key -> SharedPreferences of that slot's snapshot file, likewise.
+_snapshot_files = {}
 
 
 def _fingerprint(*parts):
@@ -125,15 +183,219 @@ def compute_fingerprints(wallet_type, prefs, slot=1):
     return None, None
 
 
-def _load_slots():
-    """Return the slots dict from disk, discarding v1 caches silently."""
-    if _cache.get_int("version", 0) != _CACHE_VERSION:
-        return {}
-    return _cache.get_dict("slots") or {}
+def _slot_filename(slot_key):
+    return "cache_{}.json".format(slot_key)
+
+
+def _slot_file(slot_key):
+    prefs = _slot_files.get(slot_key)
+    if prefs is None:
+        prefs = SharedPreferences(_APP_ID, filename=_slot_filename(slot_key))
+        _slot_files[slot_key] = prefs
+    return prefs
+
+
+def _read_slot(slot_key):
+    """Parse one slot's file from disk; None if missing or outdated."""
+    prefs = _slot_file(slot_key)
+    if prefs.get_int("version", 0) != _CACHE_VERSION:
+        return None
+    return prefs.get_dict("slot")
+
+
+def _write_slot(slot_key, slot):
+    editor = _slot_file(slot_key).edit()
+    editor.put_int("version", _CACHE_VERSION)
+    editor.put_dict("slot", slot)
+    editor.commit()
+
+
+def _write_index():
+    editor = _cache.edit()
+    editor.put_int("version", _CACHE_VERSION)
+    editor.put_dict("slots", _index)
+    editor.commit()
+
+
+def _snapshot_file(slot_key):
+    prefs = _snapshot_files.get(slot_key)
+    if prefs is None:
+        prefs = SharedPreferences(_APP_ID, filename="snapshot_{}.json".format(slot_key))
+        _snapshot_files[slot_key] = prefs
+    return prefs
+
+
+def _write_snapshot(slot_key, snapshot):
+    editor = _snapshot_file(slot_key).edit()
+    editor.put_int("version", _CACHE_VERSION)
+    editor.put_dict("snapshot", snapshot)
+    editor.commit()
+
+
+def _encode_payments(payments):
+    """Payments (newest first) -> the columnar dict stored in a slot."""
+    epoch_times = []
+    amounts = []
+    comment_ix = []
+    comments = []
+    comment_pos = {}
+    for p in payments:
+        epoch_times.append(p.epoch_time)
+        amounts.append(p.amount_sats)
+        ix = comment_pos.get(p.comment)
+        if ix is None:
+            ix = len(comments)
+            comments.append(p.comment)
+            comment_pos[p.comment] = ix
+        comment_ix.append(ix)
+    return {"epoch_time": epoch_times, "amount_sats": amounts,
+            "comment_ix": comment_ix, "comments": comments}
+
+
+def _decode_payments(columns):
+    """The columnar dict stored in a slot -> list of Payments. Rows that
+    don't decode are skipped, as are all rows of a malformed dict."""
+    payments = []
+    try:
+        epoch_times = columns["epoch_time"]
+        amounts = columns["amount_sats"]
+        comment_ix = columns["comment_ix"]
+        comments = columns["comments"]
+    except (KeyError, TypeError):
+        return payments
+    for i in range(min(len(epoch_times), len(amounts), len(comment_ix))):
+        try:
+            payments.append(Payment(epoch_times[i], amounts[i], comments[comment_ix[i]]))
+        except (IndexError, TypeError):
+            pass
+    return payments
+
+
+class CachedPayments:
+    """Read-only, lazily hydrated view of a slot's cached payment columns,
+    as returned by load_slot. Painting the cached list only needs the first
+    "Transactions Shown" rows, so iterating builds Payment objects one at a
+    time (a caller that stops after n rows builds n), and the full
+    UniqueSortedList is only built by to_list() when a wallet needs to diff
+    against the cached payments."""
+
+    def __init__(self, columns):
+        self._columns = columns
+        self._list = None
+        # Same stamp semantics as UniqueSortedList.version: this view never
+        # changes, so one stamp for its lifetime.
+        self.version = UniqueSortedList._next_version()
+        try:
+            self._len = min(len(columns["epoch_time"]), len(columns["amount_sats"]),
+                            len(columns["comment_ix"]))
+        except (KeyError, TypeError):
+            self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        if self._list is not None:
+            yield from self._list
+            return
+        if not self._len:
+            return
+        columns = self._columns
+        epoch_times = columns["epoch_time"]
+        amounts = columns["amount_sats"]
+        comment_ix = columns["comment_ix"]
+        comments = columns.get("comments", ())
+        for i in range(self._len):
+            try:
+                yield Payment(epoch_times[i], amounts[i], comments[comment_ix[i]])
+            except (IndexError, TypeError):
+                pass
+
+    def head(self, n):
+        """The first (newest) `n` payments as a plain list."""
+        out = []
+        for p in self:
+            if len(out) >= n:
+                break
+            out.append(p)
+        return out
+
+    def to_list(self):
+        """All cached payments as a UniqueSortedList (built once)."""
+        if self._list is None:
+            self._list = UniqueSortedList.from_iterable(_decode_payments(self._columns))
+        return self._list
+
+
+def _upgrade_v2_slot(slot):
+    """Rewrite a v2 slot's list-of-objects payments as columns, in place."""
+    rows = slot.get("payments")
+    if not isinstance(rows, list):
+        return
+    payments = []
+    for p in rows:
+        try:
+            payments.append(Payment(p["epoch_time"], p["amount_sats"], p["comment"]))
+        except Exception:
+            pass
+    slot["payments"] = _encode_payments(payments)
+
+
+def _migrate_v2(v2_slots):
+    """Split a v2 cache.json (all slots inline) into per-slot files and
+    rewrite cache.json as the index. The parsed slots are kept in the
+    mirror since they're in RAM already."""
+    for slot_key, slot in v2_slots.items():
+        _upgrade_v2_slot(slot)
+        _write_slot(slot_key, slot)
+        _index[slot_key] = _slot_filename(slot_key)
+        _slots[slot_key] = slot
+    _write_index()
+    print("Cache: migrated {} slot(s) from v2 cache.json".format(len(v2_slots)))
+
+
+def _read_index():
+    """Parse the index from disk. v2 caches are migrated on the spot, v1
+    (and unknown) caches are discarded silently."""
+    version = _cache.get_int("version", 0)
+    if version == _CACHE_VERSION:
+        return _cache.get_dict("slots") or {}
+    if version == 2:
+        _migrate_v2(_cache.get_dict("slots") or {})
+        return _index
+    return {}
+
+
+# slot_key -> file name of every slot that has been written to disk.
+_index = {}
+# slot_key -> pre-rendered display snapshot (see save_snapshot), read from
+# its snapshot file on first use; {} once a slot is known to have none.
+_snapshots = {}
+# slot_keys whose snapshot changed but is not yet committed to disk.
+_dirty_snapshots = set()
+# slot_key -> parsed slot (plus any not-yet-flushed writes). The source of
+# truth for reads while the app runs; filled lazily, one slot at a time.
+_slots = {}
+# True when a slot was added to _index since the index was last written.
+_index_dirty = False
+
+_index = _read_index()
+
+
+def _slot(slot_key):
+    """Return the in-RAM slot dict for `slot_key` (live, not a copy),
+    parsing its file on first access; None if the slot was never saved."""
+    slot = _slots.get(slot_key)
+    if slot is None and slot_key in _index:
+        slot = _read_slot(slot_key)
+        if slot is not None:
+            _slots[slot_key] = slot
+    return slot
 
 
 def save_slot(slot_key, creds_fp=None, qr_fp=None,
-              balance=None, payments=None, static_receive_code=None):
+              balance=None, payments=None, static_receive_code=None,
+              sync_cursor=None):
     """Write one or more fields into the slot for `slot_key`.
 
     Only the fields you pass are updated. Fingerprints are stamped on the
@@ -149,24 +411,31 @@ def save_slot(slot_key, creds_fp=None, qr_fp=None,
     per TIMESTAMP_ONLY_WRITE_INTERVAL per slot — see the constant's comment
     for the flash-wear rationale. Data writes always go through.
     """
+    global _index_dirty
     data_write = (balance is not None or payments is not None
-                  or static_receive_code is not None)
+                  or static_receive_code is not None or sync_cursor is not None)
     now = time.time()
     if not data_write:
         if now - _last_write_time.get(slot_key, 0) < TIMESTAMP_ONLY_WRITE_INTERVAL:
             return
     _last_write_time[slot_key] = now
-    slots = _load_slots()
-    slot = slots.get(slot_key, {})
+    slot = _slot(slot_key)
+    if slot is None:
+        slot = {}
+        _slots[slot_key] = slot
+    if slot_key not in _index:
+        _index[slot_key] = _slot_filename(slot_key)
+        _index_dirty = True
     if balance is not None:
         slot["balance"] = int(balance)
         if creds_fp is not None:
             slot["creds_fp"] = creds_fp
     if payments is not None:
-        slot["payments"] = [
-            {"epoch_time": p.epoch_time, "amount_sats": p.amount_sats, "comment": p.comment}
-            for p in payments
-        ]
+        slot["payments"] = _encode_payments(payments)
+        if creds_fp is not None:
+            slot["creds_fp"] = creds_fp
+    if sync_cursor is not None:
+        slot["sync_cursor"] = int(sync_cursor)
         if creds_fp is not None:
             slot["creds_fp"] = creds_fp
     if static_receive_code is not None:
@@ -174,12 +443,91 @@ def save_slot(slot_key, creds_fp=None, qr_fp=None,
         if qr_fp is not None:
             slot["qr_fp"] = qr_fp
     slot["last_updated"] = int(time.time())
-    slots[slot_key] = slot
-    editor = _cache.edit()
-    editor.put_int("version", _CACHE_VERSION)
-    editor.put_dict("slots", slots)
-    editor.commit()
-    print("Cache: saved slot '{}'".format(slot_key))
+    _dirty.add(slot_key)
+    _schedule_flush()
+
+
+def save_snapshot(slot_key, snapshot):
+    """Remember what the display last showed for `slot_key`, ready to paint
+    without parsing the slot or formatting anything:
+
+        {"creds_fp": ..., "qr_fp": ...,   # same guards as the slot fields
+         "render_fp": "<str>",            # denomination / row count / number
+                                          # format the strings were made with
+         "balance": int,                  # raw, for the display's bookkeeping
+         "balance_number": "21,000", "balance_unit": " sats",
+         "payments_text": "<rows joined by newlines>",
+         "static_receive_code": "lightning:..."|None}
+
+    Written to the slot's snapshot file with the next flush, and only if it
+    differs from the stored one."""
+    if _snapshot(slot_key) == snapshot:
+        return
+    _snapshots[slot_key] = snapshot
+    _dirty_snapshots.add(slot_key)
+    _schedule_flush()
+
+
+def _snapshot(slot_key):
+    """Return the stored snapshot for `slot_key` ({} if none), parsing its
+    file on first access."""
+    snapshot = _snapshots.get(slot_key)
+    if snapshot is None:
+        prefs = _snapshot_file(slot_key)
+        if prefs.get_int("version", 0) == _CACHE_VERSION:
+            snapshot = prefs.get_dict("snapshot") or {}
+        else:
+            snapshot = {}
+        _snapshots[slot_key] = snapshot
+    return snapshot
+
+
+def load_snapshot(slot_key, expected_creds_fp, expected_qr_fp, render_fp):
+    """Return the snapshot for `slot_key` if it was rendered from the same
+    credentials and with the same `render_fp`, else None. Its
+    static_receive_code is None unless qr_fp matches too."""
+    snapshot = _snapshot(slot_key)
+    if (not snapshot or expected_creds_fp is None
+            or snapshot.get("creds_fp") != expected_creds_fp
+            or snapshot.get("render_fp") != render_fp):
+        return None
+    result = dict(snapshot)
+    if expected_qr_fp is None or snapshot.get("qr_fp") != expected_qr_fp:
+        result["static_receive_code"] = None
+    return result
+
+
+def _schedule_flush():
+    global _flush_scheduled
+    if _flush_scheduled:
+        return
+    _flush_scheduled = True
+    TaskManager.create_task(_flush_later())
+
+
+async def _flush_later():
+    await TaskManager.sleep(FLUSH_DELAY_SECONDS)
+    flush()
+
+
+def flush():
+    """Commit every dirty slot and snapshot to its file, and the index if a
+    new slot appeared. No-op when nothing is dirty."""
+    global _flush_scheduled, _index_dirty
+    _flush_scheduled = False
+    if not _dirty and not _index_dirty and not _dirty_snapshots:
+        return
+    for slot_key in _dirty:
+        _write_slot(slot_key, _slots[slot_key])
+    for slot_key in _dirty_snapshots:
+        _write_snapshot(slot_key, _snapshots[slot_key])
+    _dirty_snapshots.clear()
+    if _index_dirty:
+        _write_index()
+        _index_dirty = False
+    if _dirty:
+        print("Cache: saved slot(s) {}".format(", ".join(sorted(_dirty))))
+        _dirty.clear()
 
 
 def load_slot(slot_key, expected_creds_fp, expected_qr_fp):
@@ -188,15 +536,16 @@ def load_slot(slot_key, expected_creds_fp, expected_qr_fp):
 
     Shape:
         {"balance": int|None,
-         "payments": UniqueSortedList|None,
+         "payments": CachedPayments|None,  # lazy; .to_list() for a
+                                           # UniqueSortedList
          "static_receive_code": str|None,
+         "sync_cursor": int|None,   # newest transaction time fetched
          "last_updated": int|None}  # unix timestamp of the most recent
                                      # successful write to this slot
     """
-    slots = _load_slots()
-    slot = slots.get(slot_key)
+    slot = _slot(slot_key)
     result = {"balance": None, "payments": None, "static_receive_code": None,
-              "last_updated": None}
+              "sync_cursor": None, "last_updated": None}
     if not slot:
         return result
     creds_ok = (slot.get("creds_fp") == expected_creds_fp
@@ -211,14 +560,14 @@ def load_slot(slot_key, expected_creds_fp, expected_qr_fp):
                 pass
         raw_payments = slot.get("payments")
         if raw_payments:
-            payment_list = UniqueSortedList()
-            for p in raw_payments:
-                try:
-                    payment_list.add(Payment(p["epoch_time"], p["amount_sats"], p["comment"]))
-                except Exception:
-                    pass
-            if len(payment_list) > 0:
-                result["payments"] = payment_list
+            cached_payments = CachedPayments(raw_payments)
+            if len(cached_payments) > 0:
+                result["payments"] = cached_payments
+        if "sync_cursor" in slot:
+            try:
+                result["sync_cursor"] = int(slot["sync_cursor"])
+            except (TypeError, ValueError):
+                pass
     if qr_ok:
         src = slot.get("static_receive_code")
         if src:
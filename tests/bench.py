@@ -0,0 +1,434 @@
+"""
+Micro-benchmarks for the payment list, the wallet cache and NostrManager.
+Each class times the current code against a copy of what it replaced, on
+the same input, and prints the numbers.
+
+Not part of the regular suite (unittest.sh only auto-runs test_*.py);
+run it explicitly and read the printed numbers:
+    Desktop: bash tests/unittest.sh tests/bench.py
+    Device:  bash tests/unittest.sh tests/bench.py --ondevice
+"""
+
+import gc
+import json
+import random
+import sys
+import time
+import unittest
+
+from payment import Payment
+from unique_sorted_list import UniqueSortedList
+import wallet_cache
+
+# See test_inspection_fixes.py: the MPOS nostr app's boot service may have
+# loaded its own nostr_service copy — purge so LP's copy is imported.
+for _m in ("nostr_service",):
+    if _m in sys.modules:
+        del sys.modules[_m]
+
+try:
+    from nostr.key import PrivateKey
+    from nostr_service import (
+        EventRing, Filter, Filters, NostrEvent, NostrManager,
+        NostrSubscription, SharedSecretCache, SubscriptionIndex,
+    )
+    _HAVE_NOSTR = True
+except ImportError:
+    # nostr lib not frozen into this build.
+    _HAVE_NOSTR = False
+
+
+def _time_us(fn, repeat=1):
+    start = time.ticks_us()
+    for _ in range(repeat):
+        fn()
+    return time.ticks_diff(time.ticks_us(), start) / repeat
+
+
+def _ratio(old, new):
+    return old / new if new else 0
+
+
+# --- Payment / UniqueSortedList ---
+
+N_PAYMENTS = 50
+
+
+class _PlainPayment:
+    """The pre-slots Payment: per-instance __dict__, a fresh tuple from
+    every sort_key() call."""
+
+    def __init__(self, epoch_time, amount_sats, comment):
+        self.epoch_time = epoch_time
+        self.amount_sats = amount_sats
+        self.comment = comment
+
+    def sort_key(self):
+        return (self.epoch_time, self.amount_sats, self.comment)
+
+    def __gt__(self, other):
+        return self.sort_key() > other.sort_key()
+
+
+class _LinearUniqueSortedList:
+    """The pre-bisect UniqueSortedList.add: an `item not in list` scan, a
+    second scan for the insertion point, a new list sliced when over
+    MAX_ITEMS."""
+
+    MAX_ITEMS = UniqueSortedList.MAX_ITEMS
+
+    def __init__(self):
+        self._items = []
+
+    def add(self, item):
+        if item not in self._items:
+            for i, existing_item in enumerate(self._items):
+                if item > existing_item:
+                    self._items.insert(i, item)
+                    break
+            else:
+                self._items.append(item)
+            if len(self._items) > self.MAX_ITEMS:
+                self._items = self._items[:self.MAX_ITEMS]
+
+    def __iter__(self):
+        return iter(self._items)
+
+
+def _build_payments(cls, n=N_PAYMENTS):
+    return [cls(1767713767 + i * 60, 1000 + i * 37, "zap #{}".format(i))
+            for i in range(n)]
+
+
+def _shuffled_payments(n, seed=21):
+    random.seed(seed)
+    payments = [Payment(1767713767 + i * 60, 100 + i, "p{}".format(i))
+                for i in range(n)]
+    # Fisher-Yates — MicroPython's random has no shuffle().
+    for i in range(n - 1, 0, -1):
+        j = random.getrandbits(16) % (i + 1)
+        payments[i], payments[j] = payments[j], payments[i]
+    return payments
+
+
+def _heap_used():
+    """Bytes allocated on the heap, or None where the port can't tell."""
+    gc.collect()
+    if hasattr(gc, "mem_alloc"):
+        return gc.mem_alloc()
+    try:
+        import tracemalloc
+    except ImportError:
+        return None
+    if not tracemalloc.is_tracing():
+        return None
+    return tracemalloc.get_traced_memory()[0]
+
+
+def _heap_of_list(cls):
+    """Heap held by a UniqueSortedList of N_PAYMENTS `cls` payments."""
+    tracer = None
+    if not hasattr(gc, "mem_alloc"):
+        try:
+            import tracemalloc as tracer
+            tracer.start()
+        except ImportError:
+            tracer = None
+    before = _heap_used()
+    payments = UniqueSortedList.from_iterable(_build_payments(cls))
+    after = _heap_used()
+    if tracer is not None:
+        tracer.stop()
+    if before is None or after is None or payments is None:
+        return None
+    return after - before
+
+
+class BenchPayment(unittest.TestCase):
+    """Payment vs _PlainPayment. UniqueSortedList keeps every sort key in
+    its index, so the plain object's list holds a second tuple per
+    payment; Payment's index shares the one the instance holds."""
+
+    def test_memory_50_payments(self):
+        old_bytes = _heap_of_list(_PlainPayment)
+        new_bytes = _heap_of_list(Payment)
+        if old_bytes is None or new_bytes is None:
+            self.skipTest("heap accounting not available on this port")
+        print("payment list x{}: plain {:>6} bytes  shared key {:>6} bytes".format(
+            N_PAYMENTS, old_bytes, new_bytes))
+
+    def test_compare_50_payments(self):
+        old = _build_payments(_PlainPayment)
+        new = _build_payments(Payment)
+
+        def scan(items):
+            for a in items:
+                for b in items:
+                    a > b
+
+        old_us = _time_us(lambda: scan(old), 3)
+        new_us = _time_us(lambda: scan(new), 3)
+        print("compare {}x{}: plain {:>8.0f} us  cached key {:>8.0f} us  ({:.1f}x)".format(
+            N_PAYMENTS, N_PAYMENTS, old_us, new_us, _ratio(old_us, new_us)))
+
+
+class BenchUniqueSortedListAdd(unittest.TestCase):
+    """UniqueSortedList.add (binary search + hash index) vs the linear
+    scans it replaced."""
+
+    def _build(self, cls, payments):
+        lst = cls()
+        for p in payments:
+            lst.add(p)
+        return lst
+
+    def _bench(self, n, repeat):
+        payments = _shuffled_payments(n)
+        # Feed every payment twice: the second pass is all duplicates,
+        # which is what a poll that returns an unchanged page looks like.
+        payments = payments + payments
+        old_us = _time_us(lambda: self._build(_LinearUniqueSortedList, payments), repeat)
+        new_us = _time_us(lambda: self._build(UniqueSortedList, payments), repeat)
+        print("UniqueSortedList.add x{:>4}: linear {:>9.0f} us  bisect {:>9.0f} us  ({:.1f}x)".format(
+            len(payments), old_us, new_us, _ratio(old_us, new_us)))
+        # Same resulting order either way.
+        self.assertEqual([p.sort_key() for p in self._build(_LinearUniqueSortedList, payments)],
+                         [p.sort_key() for p in self._build(UniqueSortedList, payments)])
+
+    def test_21_items(self):
+        self._bench(21, 20)
+
+    def test_50_items(self):
+        self._bench(50, 10)
+
+    def test_500_items(self):
+        self._bench(500, 2)
+
+
+# --- Wallet cache ---
+
+def _cache_payments(distinct_comments):
+    out = []
+    for i in range(UniqueSortedList.MAX_ITEMS):
+        if distinct_comments:
+            comment = "Zap from friend #{}".format(i)
+        else:
+            comment = ("", "Thanks for the coffee", "")[i % 3]
+        out.append(Payment(1767713767 - i * 3600, 21 * (i + 1) * (-1 if i % 4 == 0 else 1), comment))
+    return out
+
+
+def _load_v2(text):
+    return [Payment(r["epoch_time"], r["amount_sats"], r["comment"])
+            for r in json.loads(text)]
+
+
+def _load_v4(text):
+    return wallet_cache._decode_payments(json.loads(text))
+
+
+class BenchCachedPayments(unittest.TestCase):
+    """On-disk size and load time (json.loads plus Payment construction,
+    what load_slot does per slot) of a full slot: v2 row-per-payment JSON
+    vs the v4 columnar encoding."""
+
+    def _bench(self, label, payments):
+        v2_text = json.dumps([{"epoch_time": p.epoch_time, "amount_sats": p.amount_sats,
+                               "comment": p.comment} for p in payments])
+        v4_text = json.dumps(wallet_cache._encode_payments(payments))
+        self.assertEqual([p.sort_key() for p in _load_v2(v2_text)],
+                         [p.sort_key() for p in _load_v4(v4_text)])
+        v2_us = _time_us(lambda: _load_v2(v2_text), 20)
+        v4_us = _time_us(lambda: _load_v4(v4_text), 20)
+        print("{:<18} size: v2 {:>5} B  v4 {:>5} B ({:.0f}%)   load: v2 {:>7.0f} us  v4 {:>7.0f} us".format(
+            label, len(v2_text), len(v4_text), 100 * len(v4_text) / len(v2_text), v2_us, v4_us))
+
+    def test_distinct_comments(self):
+        self._bench("distinct comments", _cache_payments(True))
+
+    def test_repeated_comments(self):
+        self._bench("repeated comments", _cache_payments(False))
+
+
+# --- NostrManager ---
+
+OWN_PUBKEY = "11" * 32
+
+
+class _RelayEvent:
+    """Stands in for a nostr Event as a relay delivers it."""
+
+    def __init__(self, i, kind=1, public_key="ab" * 32, content=None, tags=None):
+        self.kind = kind
+        self.public_key = public_key
+        self.created_at = 1767713767 + i
+        self.content = "note {}".format(i) if content is None else content
+        self.tags = [] if tags is None else tags
+        self.id = "{:064x}".format(i)
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class BenchSharedSecret(unittest.TestCase):
+    """NIP-04 encrypt + decrypt per NWC message against one wallet, with
+    and without SharedSecretCache (which skips the secp256k1 ECDH once
+    the counterparty's secret is known)."""
+
+    REQUEST = json.dumps({"method": "list_transactions", "params": {"limit": 21}})
+    REPLY = json.dumps({"result_type": "list_transactions", "result": {"transactions": [
+        {"type": "incoming", "amount": 21000, "created_at": 1767713767,
+         "description": "Thanks!", "payment_hash": "ab" * 32}]}})
+
+    def _round_trip_us(self, client, wallet):
+        client_hex = client.public_key.hex()
+        wallet_hex = wallet.public_key.hex()
+        reply = wallet.encrypt_message(self.REPLY, client_hex)
+
+        def one_message():
+            client.encrypt_message(self.REQUEST, wallet_hex)
+            client.decrypt_message(reply, wallet_hex)
+
+        one_message()  # warm up (and fill the cache, if any)
+        return _time_us(one_message, 20)
+
+    def test_nwc_round_trip(self):
+        secret = bytes(range(1, 33))
+        wallet = PrivateKey(bytes(range(33, 65)))
+        plain_us = self._round_trip_us(PrivateKey(secret), wallet)
+        cache = SharedSecretCache()
+        cached_us = self._round_trip_us(cache.install(PrivateKey(secret)), wallet)
+        self.assertEqual(cache.misses, 1)
+        print("NIP-04 encrypt+decrypt per message: uncached {:>8.0f} us  cached {:>8.0f} us  ({:.1f}x)".format(
+            plain_us, cached_us, _ratio(plain_us, cached_us)))
+
+
+def _store_in_list(items, capacity):
+    events = []
+    for item in items:
+        events.append(item)
+        if len(events) > capacity:
+            events = events[-capacity:]
+    return events
+
+
+def _store_in_ring(items, capacity):
+    events = EventRing(capacity)
+    for item in items:
+        events.append(item)
+    return events
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class BenchNostrEvents(unittest.TestCase):
+    """NostrManager.events under sustained traffic: the EventRing vs the
+    list that was re-sliced to EVENTS_TO_SHOW on every event once full."""
+
+    N_EVENTS = 10000
+
+    def test_store_10k(self):
+        items = list(range(self.N_EVENTS))
+        capacity = NostrManager.EVENTS_TO_SHOW
+        list_us = _time_us(lambda: _store_in_list(items, capacity))
+        ring_us = _time_us(lambda: _store_in_ring(items, capacity))
+        self.assertEqual(list(_store_in_ring(items, capacity)), _store_in_list(items, capacity))
+        print("store {} events: sliced list {:>8.0f} us  ring {:>8.0f} us  ({:.1f}x)".format(
+            self.N_EVENTS, list_us, ring_us, _ratio(list_us, ring_us)))
+
+    def test_process_event_10k(self):
+        mgr = NostrManager()
+        events = [_RelayEvent(i) for i in range(self.N_EVENTS)]
+
+        def feed():
+            for event in events:
+                mgr._process_event(event, relay_url="wss://relay.example.com")
+
+        total_us = _time_us(feed)
+        self.assertEqual(len(mgr.events), mgr.EVENTS_TO_SHOW)
+        print("_process_event x{}: {:>8.0f} us total, {:>6.1f} us/event".format(
+            self.N_EVENTS, total_us, total_us / self.N_EVENTS))
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class BenchNostrEvent(unittest.TestCase):
+    """Per-event cost of the NostrEvent wrapper for kinds 1, 4 and 42.
+    "arrive" is what _process_event pays; "eager" adds reading the
+    content, what every DM used to cost on arrival (NIP-04 ECDH + AES)."""
+
+    def test_per_event_cost(self):
+        own = PrivateKey()
+        sender = PrivateKey()
+        sender_hex = sender.public_key.hex()
+        dm = sender.encrypt_message("Thanks for the sats!", own.public_key.hex())
+        events = (
+            _RelayEvent(0, 1, sender_hex, "gm nostr", [["t", "nostr"]]),
+            _RelayEvent(0, 4, sender_hex, dm, [["p", own.public_key.hex()]]),
+            _RelayEvent(0, 42, sender_hex, "hello channel", [["e", "cd" * 32, "", "root"]]),
+        )
+        for event in events:
+            arrive_us = _time_us(lambda: NostrEvent(event, own), 20)
+            eager_us = _time_us(lambda: NostrEvent(event, own).get_display_content(), 20)
+            print("kind {:>2}: arrive {:>8.1f} us  eager {:>8.1f} us".format(
+                event.kind, arrive_us, eager_us))
+
+
+def _dispatch_subscriptions(n):
+    # One DM subscription plus channels (kind 42, one #e each) and
+    # profiles (authors only), like the Nostr app's mix.
+    subs = [NostrSubscription("dms", Filters([Filter(kinds=[4], pubkey_refs=[OWN_PUBKEY])]))]
+    for i in range(1, n):
+        if i % 2:
+            filters = Filters([Filter(kinds=[42], event_refs=["{:064x}".format(i)])])
+        else:
+            filters = Filters([Filter(authors=["{:064x}".format(1000 + i)])])
+        subs.append(NostrSubscription("sub{}".format(i), filters))
+    return subs
+
+
+def _dispatch_events(n):
+    # Mostly notes nobody subscribed to, some DMs and channel traffic.
+    kinds = (1, 1, 1, 7, 4, 42)
+    events = []
+    for i in range(n):
+        kind = kinds[i % len(kinds)]
+        events.append(_RelayEvent(i, kind, "{:064x}".format(i % 50),
+                                  tags=[["p", OWN_PUBKEY]] if kind == 4 else []))
+    return events
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class BenchNostrDispatch(unittest.TestCase):
+    """Subscription dispatch with 1, 10 and 100 subscriptions: every
+    filters.match() per event vs the SubscriptionIndex candidates."""
+
+    N_EVENTS = 2000
+    SUB_COUNTS = (1, 10, 100)
+
+    def _linear(self, subs, events):
+        hits = 0
+        for event in events:
+            for sub in subs:
+                if sub.filters.match(event):
+                    hits += 1
+        return hits
+
+    def _indexed(self, subs, events):
+        index = SubscriptionIndex(subs)
+        hits = 0
+        for event in events:
+            for sub in index.candidates(event):
+                if sub.filters.match(event):
+                    hits += 1
+        return hits
+
+    def test_dispatch_scaling(self):
+        events = _dispatch_events(self.N_EVENTS)
+        for n in self.SUB_COUNTS:
+            subs = _dispatch_subscriptions(n)
+            self.assertEqual(self._indexed(subs, events), self._linear(subs, events))
+            linear_us = _time_us(lambda: self._linear(subs, events))
+            indexed_us = _time_us(lambda: self._indexed(subs, events))
+            print("{:>3} subs, {} events: linear {:>8.0f} us  indexed {:>8.0f} us  ({:.1f}x)".format(
+                n, self.N_EVENTS, linear_us, indexed_us, _ratio(linear_us, indexed_us)))
+
+
+if __name__ == "__main__":
+    unittest.main()
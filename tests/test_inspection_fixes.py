@@ -239,25 +239,25 @@ class TestCacheRateLimit(unittest.TestCase):
         sk = "ratelimit_test_1"
         # Data write — always goes through and arms the limiter.
         wallet_cache.save_slot(sk, creds_fp="fp", balance=123)
-        # Plant a sentinel last_updated on disk so we can detect rewrites.
-        slots = wallet_cache._load_slots()
-        slots[sk]["last_updated"] = 1000
-        editor = wallet_cache._cache.edit()
-        editor.put_dict("slots", slots)
-        editor.commit()
+        wallet_cache.flush()
+        # Plant a sentinel last_updated so we can detect rewrites.
+        wallet_cache._slot(sk)["last_updated"] = 1000
         # Timestamp-only write inside the interval → must be skipped.
         wallet_cache.save_slot(sk)
-        self.assertEqual(wallet_cache._load_slots()[sk]["last_updated"], 1000)
+        self.assertEqual(wallet_cache._slot(sk)["last_updated"], 1000)
+        self.assertNotIn(sk, wallet_cache._dirty)
         # Expire the limiter → the same call must now go through.
         wallet_cache._last_write_time[sk] = 0
         wallet_cache.save_slot(sk)
-        self.assertNotEqual(wallet_cache._load_slots()[sk]["last_updated"], 1000)
+        wallet_cache.flush()
+        self.assertNotEqual(wallet_cache._read_slot(sk)["last_updated"], 1000)
 
     def test_data_writes_never_skipped(self):
         sk = "ratelimit_test_2"
         wallet_cache.save_slot(sk, creds_fp="fp", balance=1)
         wallet_cache.save_slot(sk, creds_fp="fp", balance=2)  # immediate
-        self.assertEqual(wallet_cache._load_slots()[sk]["balance"], 2)
+        wallet_cache.flush()
+        self.assertEqual(wallet_cache._read_slot(sk)["balance"], 2)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,1124 @@
+"""
+Unit tests for NostrManager's main-loop plumbing in nostr_service.py.
+
+No relays are opened: the manager gets a fake relay_manager whose
+message pool is a plain list. Most tests swap `_process_event` for a
+recorder so no decryption or handler dispatch runs.
+
+Usage (from the LightningPiggyApp repo root):
+    Desktop: bash tests/unittest.sh tests/test_nostr_manager.py
+"""
+
+import asyncio
+import json
+import logging
+import sys
+import time
+import unittest
+
+# See test_inspection_fixes.py: the MPOS nostr app's boot service may have
+# loaded its own nostr_service copy — purge so LP's copy is imported.
+for _m in ("nostr_service",):
+    if _m in sys.modules:
+        del sys.modules[_m]
+
+try:
+    import nostr_service
+    from nostr_service import NostrManager
+    _HAVE_NOSTR = True
+except ImportError:
+    # nostr lib not frozen into this build.
+    _HAVE_NOSTR = False
+
+
+class _FakeEvent:
+    def __init__(self, kind, created_at=1767713767, event_id=None):
+        self.kind = kind
+        self.public_key = "ab" * 32
+        self.created_at = created_at
+        self.content = ""
+        self.tags = []
+        self.id = event_id or "{}-{}".format(kind, created_at)
+
+
+class _FakeEventMessage:
+    def __init__(self, event, url="wss://relay.example.com"):
+        self.event = event
+        self.url = url
+
+
+class _FakePool:
+    def __init__(self):
+        self.events = []
+        self.notices = []
+        self.ok_messages = []
+
+    def add_message(self, message, url):
+        self.events.append(_FakeEventMessage(message, url))
+
+    def has_events(self):
+        return len(self.events) > 0
+
+    def get_event(self):
+        return self.events.pop(0)
+
+    def has_notices(self):
+        return len(self.notices) > 0
+
+    def get_notice(self):
+        return self.notices.pop(0)
+
+    def has_ok_messages(self):
+        return len(self.ok_messages) > 0
+
+    def get_ok_message(self):
+        return self.ok_messages.pop(0)
+
+
+class _FakeRelayManager:
+    def __init__(self):
+        self.message_pool = _FakePool()
+        self.relays = {}
+        self.published = []
+
+    def publish_event(self, event):
+        self.published.append(event)
+
+
+def _make_manager():
+    mgr = NostrManager()
+    mgr.relay_manager = _FakeRelayManager()
+    mgr.processed = []
+    mgr._process_event = lambda event, relay_url=None: mgr.processed.append(event)
+    return mgr
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class TestMessagePoolDrain(unittest.TestCase):
+    """One bounded drain pass per tick (DRAIN_BUDGET_MS), NWC first."""
+
+    def test_whole_backlog_drained_in_one_pass(self):
+        mgr = _make_manager()
+        for i in range(40):
+            mgr.relay_manager.message_pool.events.append(
+                _FakeEventMessage(_FakeEvent(1, created_at=i)))
+        handled = mgr._drain_message_pool()
+        self.assertEqual(handled, 40)
+        self.assertEqual(len(mgr.processed), 40)
+        self.assertFalse(mgr.relay_manager.message_pool.has_events())
+
+    def test_arrival_order_kept_within_generic_traffic(self):
+        mgr = _make_manager()
+        for i in range(5):
+            mgr.relay_manager.message_pool.events.append(
+                _FakeEventMessage(_FakeEvent(1, created_at=i)))
+        mgr._drain_message_pool()
+        self.assertEqual([e.created_at for e in mgr.processed], [0, 1, 2, 3, 4])
+
+    def test_nwc_replies_jump_ahead(self):
+        mgr = _make_manager()
+        pool = mgr.relay_manager.message_pool
+        for i in range(3):
+            pool.events.append(_FakeEventMessage(_FakeEvent(1, created_at=i)))
+        pool.events.append(_FakeEventMessage(_FakeEvent(23195)))
+        pool.events.append(_FakeEventMessage(_FakeEvent(23196)))
+        mgr._drain_message_pool()
+        self.assertEqual([e.kind for e in mgr.processed], [23195, 23196, 1, 1, 1])
+
+    def test_budget_leaves_backlog_for_next_tick(self):
+        mgr = _make_manager()
+        mgr.DRAIN_BUDGET_MS = -1  # every pass is already over budget
+        for i in range(3):
+            mgr.relay_manager.message_pool.events.append(
+                _FakeEventMessage(_FakeEvent(1, created_at=i)))
+        # At least one event per pass so the backlog always moves.
+        self.assertEqual(mgr._drain_message_pool(), 1)
+        self.assertEqual(mgr.get_drain_stats()["queue_depth"], 2)
+        self.assertEqual(mgr._drain_message_pool(), 1)
+        self.assertEqual(mgr._drain_message_pool(), 1)
+        self.assertEqual(mgr._drain_message_pool(), 0)
+        self.assertEqual([e.created_at for e in mgr.processed], [0, 1, 2])
+
+    def test_counters(self):
+        mgr = _make_manager()
+        pool = mgr.relay_manager.message_pool
+        for i in range(4):
+            pool.events.append(_FakeEventMessage(_FakeEvent(1, created_at=i)))
+        mgr._drain_message_pool()
+        pool.events.append(_FakeEventMessage(_FakeEvent(1, created_at=9)))
+        mgr._drain_message_pool()
+        stats = mgr.get_drain_stats()
+        self.assertEqual(stats["ticks"], 2)
+        self.assertEqual(stats["events"], 5)
+        self.assertEqual(stats["last_tick_events"], 1)
+        self.assertEqual(stats["max_tick_events"], 4)
+        self.assertEqual(stats["max_queue_depth"], 4)
+        self.assertEqual(stats["queue_depth"], 0)
+
+    def test_event_queue_is_fifo_across_compaction(self):
+        queue = nostr_service.EventQueue()
+        out = []
+        for i in range(100):
+            queue.append(i)
+            if i % 3 == 0:
+                out.append(queue.popleft())
+        while queue:
+            out.append(queue.popleft())
+        self.assertEqual(out, list(range(100)))
+        with self.assertRaises(IndexError):
+            queue.popleft()
+
+    def test_processing_error_does_not_stall_the_drain(self):
+        mgr = _make_manager()
+
+        def _boom(event, relay_url=None):
+            mgr.processed.append(event)
+            raise ValueError("bad event")
+        mgr._process_event = _boom
+        for i in range(3):
+            mgr.relay_manager.message_pool.events.append(
+                _FakeEventMessage(_FakeEvent(1, created_at=i)))
+        self.assertEqual(mgr._drain_message_pool(), 3)
+
+    def test_notices_and_ok_messages_drained(self):
+        mgr = _make_manager()
+        pool = mgr.relay_manager.message_pool
+        pool.notices.extend([None, None])
+        mgr._drain_message_pool()
+        self.assertFalse(pool.has_notices())
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class TestMainLoopWakeup(unittest.TestCase):
+    """Message arrival wakes the loop; idle sleeps end at the next deadline."""
+
+    def test_message_arrival_sets_wakeup(self):
+        mgr = _make_manager()
+        self.assertTrue(mgr._hook_message_pool())
+        self.assertFalse(mgr._wakeup.is_set())
+        mgr.relay_manager.message_pool.add_message(_FakeEvent(1), "wss://r")
+        self.assertTrue(mgr._wakeup.is_set())
+        # The wrapped add_message still queues the message.
+        self.assertTrue(mgr.relay_manager.message_pool.has_events())
+
+    def test_hook_is_idempotent(self):
+        mgr = _make_manager()
+        mgr._hook_message_pool()
+        mgr._hook_message_pool()
+        mgr.relay_manager.message_pool.add_message(_FakeEvent(1), "wss://r")
+        self.assertEqual(len(mgr.relay_manager.message_pool.events), 1)
+
+    def test_unhookable_pool_falls_back_to_polling(self):
+        mgr = _make_manager()
+        mgr.relay_manager.message_pool = object()
+        self.assertFalse(mgr._hook_message_pool())
+        self.assertEqual(mgr._next_wakeup_timeout(), mgr.POLL_WAKE_SECONDS)
+
+    def test_idle_timeout_without_nwc(self):
+        mgr = _make_manager()
+        mgr._hook_message_pool()
+        self.assertAlmostEqual(mgr._next_wakeup_timeout(), mgr.IDLE_WAKE_SECONDS)
+
+    def test_backlog_means_no_sleep(self):
+        mgr = _make_manager()
+        mgr._hook_message_pool()
+        mgr._pending_events.append(_FakeEventMessage(_FakeEvent(1)))
+        self.assertEqual(mgr._next_wakeup_timeout(), 0)
+
+    def test_nwc_poll_deadline_bounds_sleep(self):
+        mgr = _make_manager()
+        mgr._hook_message_pool()
+        mgr.IDLE_WAKE_SECONDS = 60
+        mgr._nwc_configured = True
+        mgr._last_nwc_poll = time.time() - mgr.NWC_POLL_SECONDS + 5
+        timeout = mgr._next_wakeup_timeout()
+        self.assertTrue(0 < timeout <= 5)
+        mgr._last_nwc_poll = time.time() - mgr.NWC_POLL_SECONDS - 5
+        self.assertEqual(mgr._next_wakeup_timeout(), 0)
+
+    def test_in_flight_deadline_bounds_sleep(self):
+        mgr = _make_nwc_manager()
+        mgr._hook_message_pool()
+        mgr._last_nwc_poll = time.time()
+        mgr.nwc_fetch_balance()
+        timeout = mgr._next_wakeup_timeout()
+        self.assertTrue(0 < timeout <= mgr.NWC_REQUEST_TIMEOUT_SECONDS)
+
+    def test_disconnected_relay_checked_more_often(self):
+        mgr = _make_manager()
+        mgr._hook_message_pool()
+        mgr.relay_manager.relays["wss://a"] = _FakeRelay()
+        self.assertAlmostEqual(mgr._next_wakeup_timeout(), mgr.IDLE_WAKE_SECONDS)
+        mgr.relay_manager.relays["wss://a"].connected = False
+        self.assertAlmostEqual(mgr._next_wakeup_timeout(), mgr.RELAY_CHECK_SECONDS)
+
+    def test_wait_returns_early_when_signalled(self):
+        mgr = _make_manager()
+        mgr._wake()
+        start = time.time()
+        asyncio.run(mgr._wait_for_wakeup(30))
+        self.assertTrue(time.time() - start < 5)
+        self.assertFalse(mgr._wakeup.is_set())
+        stats = mgr.get_wakeup_stats()
+        self.assertEqual(stats["wakeups"], 1)
+        self.assertEqual(stats["signalled"], 1)
+
+    def test_wait_times_out(self):
+        mgr = _make_manager()
+        asyncio.run(mgr._wait_for_wakeup(0.05))
+        stats = mgr.get_wakeup_stats()
+        self.assertEqual(stats["timed_out"], 1)
+        self.assertTrue(0.0 <= stats["idle_ratio"] <= 1.0)
+
+
+class _NWCEvent(_FakeEvent):
+    def __init__(self, request_id, result=None):
+        super().__init__(23195)
+        self.tags = [["p", "cd" * 32], ["e", request_id]]
+        self.content = json.dumps({"result": result if result is not None
+                                   else {"transactions": []}})
+
+
+class _FakeDM:
+    def __init__(self, event_id):
+        self.id = event_id
+
+    def to_message(self):
+        return '["EVENT", "{}"]'.format(self.id)
+
+
+class _FakeRelay:
+    def __init__(self, connected=True):
+        self.connected = connected
+        self.error_counter = 0
+        self.published = []
+
+    def publish(self, message):
+        self.published.append(message)
+
+
+class _PlaintextKey:
+    # NWC "decryption" for tests: the content already is the cleartext.
+    def decrypt_message(self, content, public_key):
+        return content
+
+
+def _make_nwc_manager():
+    mgr = _make_manager()
+    mgr._nwc_configured = True
+    mgr._nwc_private_key = _PlaintextKey()
+    mgr.sent = []
+    mgr.list_replies = []
+
+    def sign(private_key, recipient_hex, content, kind=4, reference_event_id=None):
+        mgr.sent.append(json.loads(content)["params"])
+        return _FakeDM("req{}".format(len(mgr.sent)))
+    mgr._sign_dm = sign
+    mgr.set_nwc_callbacks(payments_cb=lambda txs: mgr.list_replies.append("full"),
+                          more_payments_cb=lambda txs: mgr.list_replies.append("more"))
+    return mgr
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class TestIncrementalListTransactions(unittest.TestCase):
+    """The list_transactions `from` cursor and the periodic full page."""
+
+    def test_full_pages_without_cursor(self):
+        mgr = _make_nwc_manager()
+        mgr.nwc_fetch_payments()
+        self.assertEqual(mgr.sent, [{"limit": 21}])
+
+    def test_cursor_with_periodic_full_page(self):
+        mgr = _make_nwc_manager()
+        mgr.set_nwc_list_from(500)
+        for _ in range(mgr.NWC_FULL_SYNC_EVERY * 2):
+            mgr.nwc_fetch_payments()
+        fulls = [i for i, params in enumerate(mgr.sent) if "from" not in params]
+        self.assertEqual(fulls, [mgr.NWC_FULL_SYNC_EVERY - 1, mgr.NWC_FULL_SYNC_EVERY * 2 - 1])
+        self.assertEqual(mgr.sent[0], {"limit": 21, "from": 500})
+
+    def test_reply_matched_to_its_request(self):
+        mgr = _make_nwc_manager()
+        mgr.nwc_fetch_payments()           # req1: full
+        mgr.set_nwc_list_from(500)
+        mgr.nwc_fetch_payments()           # req2: from=500
+        mgr._process_nwc_event(_NWCEvent("req2"))
+        mgr._process_nwc_event(_NWCEvent("req1"))
+        # A reply to a request we don't know is only ever merged.
+        mgr._process_nwc_event(_NWCEvent("elsewhere"))
+        self.assertEqual(mgr.list_replies, ["more", "full", "more"])
+
+    def test_untracked_reply_dropped_without_merge_callback(self):
+        mgr = _make_nwc_manager()
+        mgr.set_nwc_callbacks(payments_cb=lambda txs: mgr.list_replies.append("full"))
+        mgr._process_nwc_event(_NWCEvent("elsewhere"))
+        self.assertEqual(mgr.list_replies, [])
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class TestNWCInFlight(unittest.TestCase):
+    """Replies close their request; retries, timeouts, late replies, copies."""
+
+    def test_reply_closes_request_and_records_latency(self):
+        mgr = _make_nwc_manager()
+        mgr.nwc_fetch_payments()
+        self.assertEqual(mgr.get_nwc_request_stats()["in_flight"], 1)
+        mgr._process_nwc_event(_NWCEvent("req1"))
+        stats = mgr.get_nwc_request_stats()
+        self.assertEqual((stats["sent"], stats["answered"], stats["in_flight"]), (1, 1, 0))
+        self.assertEqual(sum(count for _, count in stats["latency_ms"]), 1)
+        self.assertIsNone(stats["latency_ms"][-1][0])
+
+    def test_second_copy_of_reply_dropped(self):
+        mgr = _make_nwc_manager()
+        mgr.set_nwc_list_from(7)
+        mgr.nwc_fetch_payments()
+        mgr._process_nwc_event(_NWCEvent("req1"))
+        mgr._process_nwc_event(_NWCEvent("req1"))  # same reply via another relay
+        self.assertEqual(mgr.list_replies, ["more"])
+        self.assertEqual(mgr.get_nwc_request_stats()["duplicates"], 1)
+
+    def test_unanswered_request_retried_then_given_up(self):
+        mgr = _make_nwc_manager()
+        mgr.nwc_fetch_balance()
+        request = mgr._nwc_in_flight["req1"]
+        now = time.time()
+        mgr._check_nwc_deadlines(now)  # not due yet
+        self.assertEqual(len(mgr.relay_manager.published), 1)
+        for _ in range(mgr.NWC_REQUEST_RETRIES):
+            now += mgr.NWC_REQUEST_TIMEOUT_SECONDS
+            mgr._check_nwc_deadlines(now)
+        # Retries publish the very same signed event.
+        self.assertEqual(mgr.relay_manager.published,
+                         [request.event] * (mgr.NWC_REQUEST_RETRIES + 1))
+        mgr._check_nwc_deadlines(now + mgr.NWC_REQUEST_TIMEOUT_SECONDS)
+        stats = mgr.get_nwc_request_stats()
+        self.assertEqual((stats["retries"], stats["timeouts"], stats["in_flight"]),
+                         (mgr.NWC_REQUEST_RETRIES, 1, 0))
+        # The next poll reconnects instead of waiting for more silence.
+        self.assertGreaterEqual(mgr._polls_since_last_event,
+                                mgr.RELAY_SILENT_RECONNECT_THRESHOLD)
+
+    def test_late_reply_after_giving_up_processed_once(self):
+        mgr = _make_nwc_manager()
+        mgr.set_nwc_list_from(7)
+        mgr.nwc_fetch_payments()
+        now = time.time()
+        for _ in range(mgr.NWC_REQUEST_RETRIES + 1):
+            now += mgr.NWC_REQUEST_TIMEOUT_SECONDS
+            mgr._check_nwc_deadlines(now)
+        self.assertEqual(mgr._nwc_in_flight, {})
+        mgr._process_nwc_event(_NWCEvent("req1"))
+        mgr._process_nwc_event(_NWCEvent("req1"))  # same reply via another relay
+        # Still an incremental reply: its `from` is remembered.
+        self.assertEqual(mgr.list_replies, ["more"])
+        stats = mgr.get_nwc_request_stats()
+        self.assertEqual((stats["late"], stats["duplicates"], stats["answered"]), (1, 1, 0))
+
+    def test_expired_requests_are_bounded(self):
+        mgr = _make_nwc_manager()
+        for _ in range(mgr.NWC_CLOSED_REQUESTS_TRACKED + 3):
+            mgr.nwc_fetch_balance()
+        for request_id in list(mgr._nwc_in_flight):
+            mgr._close_nwc_request(request_id, answered=False)
+        self.assertEqual(len(mgr._nwc_expired), mgr.NWC_CLOSED_REQUESTS_TRACKED)
+
+    def test_forgotten_request_reply_only_merged(self):
+        mgr = _make_nwc_manager()
+        mgr.nwc_fetch_payments()                 # req1: full page
+        mgr.set_nwc_list_from(7)
+        for _ in range(mgr.NWC_CLOSED_REQUESTS_TRACKED + 1):
+            mgr.nwc_fetch_payments()             # incremental
+        for request_id in list(mgr._nwc_in_flight):
+            mgr._close_nwc_request(request_id, answered=False)
+        self.assertNotIn("req2", mgr._nwc_expired)
+        # Evicted, then a reset: neither reply may replace the list, and a
+        # second copy of either is dropped.
+        mgr._process_nwc_event(_NWCEvent("req2"))
+        mgr._nwc_expired = {}
+        mgr._process_nwc_event(_NWCEvent("req5"))
+        mgr._process_nwc_event(_NWCEvent("req5"))
+        self.assertEqual(mgr.list_replies, ["more", "more"])
+        self.assertEqual(mgr.get_nwc_request_stats()["duplicates"], 1)
+
+    def test_close_forgets_in_flight_requests(self):
+        mgr = _make_nwc_manager()
+        mgr.nwc_fetch_balance()
+        mgr._cleanup_done = False
+        asyncio.run(mgr._do_close())
+        self.assertEqual(mgr.get_nwc_request_stats()["in_flight"], 0)
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class TestRelayHealth(unittest.TestCase):
+    """Routing NWC requests to the best-scoring relay; health report."""
+
+    def _manager(self, *urls):
+        mgr = _make_nwc_manager()
+        mgr._nwc_relays = list(urls)
+        for url in urls:
+            mgr.relay_manager.relays[url] = _FakeRelay()
+        return mgr
+
+    def test_score_prefers_fast_and_punishes_timeouts(self):
+        fast = nostr_service.RelayHealth()
+        fast.record_reply(200)
+        fresh = nostr_service.RelayHealth()
+        self.assertLess(fast.score(), fresh.score())
+        fast.timeouts = 1
+        self.assertGreater(fast.score(), fresh.score())
+        fast.record_reply(200)  # a reply clears the timeouts
+        self.assertEqual(fast.timeouts, 0)
+
+    def test_request_routed_to_best_connected_relay(self):
+        mgr = self._manager("wss://a", "wss://b", "wss://c")
+        mgr._relay_health_for("wss://a").record_reply(900)
+        mgr._relay_health_for("wss://b").record_reply(100)
+        mgr._relay_health_for("wss://c").record_reply(50)
+        mgr.relay_manager.relays["wss://c"].connected = False
+        mgr.nwc_fetch_balance()
+        self.assertEqual(mgr.relay_manager.relays["wss://b"].published, ['["EVENT", "req1"]'])
+        self.assertEqual(mgr.relay_manager.relays["wss://a"].published, [])
+        self.assertEqual(mgr.relay_manager.published, [])
+
+    def test_no_connected_relay_broadcasts(self):
+        mgr = self._manager("wss://a")
+        mgr.relay_manager.relays["wss://a"].connected = False
+        mgr.nwc_fetch_balance()
+        self.assertEqual(len(mgr.relay_manager.published), 1)
+
+    def test_timeout_penalises_relay_and_fans_out(self):
+        mgr = self._manager("wss://a", "wss://b")
+        mgr.nwc_fetch_balance()
+        routed = mgr._nwc_in_flight["req1"].relay_url
+        mgr._check_nwc_deadlines(time.time() + mgr.NWC_REQUEST_TIMEOUT_SECONDS)
+        self.assertEqual(mgr._relay_health_for(routed).timeouts, 1)
+        self.assertEqual(len(mgr.relay_manager.published), 1)  # fanned out
+        # The reply arrives via the other relay, which gets the credit.
+        other = "wss://b" if routed == "wss://a" else "wss://a"
+        mgr._process_nwc_event(_NWCEvent("req1", {"balance": 1000}), other)
+        self.assertEqual(mgr._relay_health_for(other).replies, 1)
+        self.assertEqual(mgr._unhealthy_relays(), [routed])
+
+    def test_health_report(self):
+        mgr = self._manager("wss://a")
+        relay = mgr.relay_manager.relays["wss://a"]
+        mgr._track_relay_health("wss://a", relay, 100)
+        relay.error_counter = 2
+        mgr._track_relay_health("wss://a", relay, 110)
+        report = mgr.get_relay_health()["wss://a"]
+        self.assertTrue(report["connected"])
+        self.assertEqual((report["connects"], report["errors"]), (1, 2))
+        self.assertEqual(report["score"], nostr_service.RelayHealth.DEFAULT_LATENCY_MS
+                         + 2 * nostr_service.RelayHealth.ERROR_PENALTY_MS)
+
+    def test_errors_decay(self):
+        health = nostr_service.RelayHealth()
+        half_life = health.ERROR_HALF_LIFE_SECONDS
+        health.record_errors(4, 0)
+        health.record_errors(4, 10)  # no new errors: not counted again
+        self.assertEqual(health.errors, 4)
+        health.record_errors(4, 2 * half_life)
+        self.assertEqual(health.errors, 1)
+        health.record_errors(4, 4 * half_life)
+        self.assertEqual(health.score(), health.DEFAULT_LATENCY_MS)
+        # A replaced Relay object starts counting from zero again.
+        health.record_errors(1, 4 * half_life + 1)
+        self.assertEqual(health.errors, 1)
+
+
+class _NoDerivationKey:
+    # configure_nwc derives the client pubkey once; resubscribing must not.
+    @property
+    def public_key(self):
+        raise AssertionError("client pubkey derived again")
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class TestSubscriptionFrames(unittest.TestCase):
+    """REQ frames serialized once and reused across relays and reconnects."""
+
+    def test_req_built_once_per_sub_id_and_filters(self):
+        sub = nostr_service.NostrSubscription(
+            "dms", nostr_service.Filters([nostr_service.Filter(kinds=[4])]))
+        first = sub.req_json("s1")
+        self.assertEqual(json.loads(first), ["REQ", "s1", {"kinds": [4]}])
+        self.assertIs(sub.req_json("s1"), first)
+        self.assertEqual(json.loads(sub.req_json("s2"))[1], "s2")
+        sub.set_filters(nostr_service.Filters([nostr_service.Filter(kinds=[1])]))
+        self.assertEqual(json.loads(sub.req_json("s2"))[2], {"kinds": [1]})
+
+    def test_nwc_req_reused_across_reconnects(self):
+        mgr = _make_manager()
+        mgr._nwc_configured = True
+        mgr._nwc_sub_id = "nwc1"
+        mgr._nwc_wallet_pubkey = "ab" * 32
+        mgr._nwc_client_pubkey_hex = "cd" * 32
+        mgr._nwc_private_key = _NoDerivationKey()
+        mgr.relay_manager.add_subscription = lambda sub_id, filters: None
+        relay = _FakeRelay()
+        mgr.relay_manager.relays["wss://a"] = relay
+        mgr._send_subscriptions_to_relays(["wss://a"])
+        mgr._send_subscriptions_to_relays(["wss://a"])
+        self.assertEqual(len(relay.published), 2)
+        self.assertIs(relay.published[0], relay.published[1])
+        req = json.loads(relay.published[0])
+        self.assertEqual(req[:2], ["REQ", "nwc1"])
+        self.assertEqual(req[2]["#p"], ["cd" * 32])
+        # A new subscription id (fresh connection) rebuilds the frame.
+        mgr._nwc_sub_id = "nwc2"
+        self.assertEqual(json.loads(mgr._nwc_subscription_req())[1], "nwc2")
+
+
+class _CountingKey:
+    def __init__(self):
+        self.derivations = 0
+
+    def compute_shared_secret(self, public_key_hex):
+        self.derivations += 1
+        return ("secret-" + public_key_hex).encode()
+
+    def decrypt_message(self, content, public_key_hex):
+        # Like the nostr lib: derive the AES key, then decrypt.
+        self.compute_shared_secret(public_key_hex)
+        return content
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class TestSharedSecretCache(unittest.TestCase):
+    """NIP-04 shared secrets derived once per counterparty."""
+
+    def test_one_derivation_per_counterparty(self):
+        cache = nostr_service.SharedSecretCache()
+        key = cache.install(_CountingKey())
+        for _ in range(3):
+            key.decrypt_message("x", "ab" * 32)
+        key.decrypt_message("x", "cd" * 32)
+        self.assertEqual(key.derivations, 2)
+        self.assertEqual(key.compute_shared_secret("ab" * 32), b"secret-" + ("ab" * 32).encode())
+        self.assertEqual(cache.stats(), {"hits": 3, "misses": 2, "size": 2})
+
+    def test_bounded(self):
+        cache = nostr_service.SharedSecretCache()
+        key = cache.install(_CountingKey())
+        for i in range(cache.MAX_ENTRIES + 5):
+            key.compute_shared_secret("{:064x}".format(i))
+        self.assertLessEqual(cache.stats()["size"], cache.MAX_ENTRIES)
+
+    def test_nwc_reply_decrypt_uses_cache(self):
+        mgr = _make_nwc_manager()
+        key = mgr._nwc_secrets.install(_CountingKey())
+        mgr._nwc_private_key = key
+        for i in range(3):
+            mgr._process_nwc_event(_NWCEvent("unknown{}".format(i)))
+        self.assertEqual(key.derivations, 1)
+        self.assertEqual(mgr.get_shared_secret_stats()["nwc"]["hits"], 2)
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class TestEventDedup(unittest.TestCase):
+    """Copies of an event delivered by several relays are processed once."""
+
+    def test_recent_ids_bounded_oldest_first(self):
+        ids = nostr_service.RecentIds(3)
+        self.assertTrue(ids.add("a"))
+        self.assertFalse(ids.add("a"))
+        for item in ("b", "c", "d"):
+            ids.add(item)
+        self.assertEqual(len(ids), 3)
+        self.assertNotIn("a", ids)
+        self.assertIn("b", ids)
+
+    def test_copies_from_other_relays_dropped(self):
+        mgr = NostrManager()
+        handled = []
+        mgr._event_handlers[1] = [handled.append]
+        event = _FakeEvent(1, event_id="e1")
+        mgr._process_event(event, relay_url="wss://a")
+        mgr._process_event(event, relay_url="wss://b")
+        mgr._process_event(_FakeEvent(1, event_id="e2"), relay_url="wss://b")
+        self.assertEqual(len(handled), 2)
+        self.assertEqual(len(mgr.events), 2)
+        self.assertEqual(mgr.get_drain_stats()["duplicates"], 1)
+
+    def test_nwc_reply_copy_not_decrypted_twice(self):
+        mgr = _make_nwc_manager()
+        del mgr._process_event  # back to the real dispatch
+        mgr.nwc_fetch_payments()
+        reply = _NWCEvent("req1")
+        key = mgr._nwc_secrets.install(_CountingKey())
+        mgr._nwc_private_key = key
+        mgr._process_event(reply, relay_url="wss://a")
+        mgr._process_event(reply, relay_url="wss://b")
+        self.assertEqual(key.derivations, 1)
+        self.assertEqual(mgr.list_replies, ["full"])
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class TestEventRing(unittest.TestCase):
+    """The events buffer keeps the newest EVENTS_TO_SHOW, like the old list."""
+
+    def test_behaves_like_trimmed_list(self):
+        ring = nostr_service.EventRing(3)
+        trimmed = []
+        for i in range(7):
+            ring.append(i)
+            trimmed.append(i)
+            trimmed = trimmed[-3:]
+            self.assertEqual(list(ring), trimmed)
+            self.assertEqual(len(ring), len(trimmed))
+        self.assertEqual((ring[0], ring[-1]), (4, 6))
+        self.assertEqual(ring[-2:], [5, 6])
+        self.assertEqual(list(ring.newest_first()), [6, 5, 4])
+        with self.assertRaises(IndexError):
+            ring[3]
+
+    def test_clear(self):
+        ring = nostr_service.EventRing(2)
+        ring.append("a")
+        ring.clear()
+        self.assertEqual((len(ring), list(ring)), (0, []))
+        ring.append("b")
+        self.assertEqual(list(ring), ["b"])
+
+    def test_manager_keeps_newest_events(self):
+        mgr = NostrManager()
+        for i in range(mgr.EVENTS_TO_SHOW + 5):
+            mgr._process_event(_FakeEvent(1, created_at=i))
+        self.assertEqual(len(mgr.events), mgr.EVENTS_TO_SHOW)
+        self.assertEqual(mgr.events[0].created_at, 5)
+        self.assertEqual(mgr.events[-1].created_at, mgr.EVENTS_TO_SHOW + 4)
+
+
+class _CountingFilters:
+    # Wraps a Filters object and counts match() calls.
+    def __init__(self, filters):
+        self.data = filters.data
+        self._filters = filters
+        self.matches = 0
+
+    def match(self, event):
+        self.matches += 1
+        return self._filters.match(event)
+
+
+def _filters(**kwargs):
+    return nostr_service.Filters([nostr_service.Filter(**kwargs)])
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class TestSubscriptionDispatch(unittest.TestCase):
+    """Callbacks dispatched through the kind/author/"#p" subscription index."""
+
+    def _event(self, kind, author="ab" * 32, p=None):
+        event = _FakeEvent(kind, event_id="{}-{}-{}".format(kind, author, p))
+        event.public_key = author
+        if p is not None:
+            event.tags = [["p", p]]
+        return event
+
+    def test_candidates_by_kind_author_and_p(self):
+        subs = [
+            nostr_service.NostrSubscription("dms", _filters(kinds=[4], pubkey_refs=["11" * 32])),
+            nostr_service.NostrSubscription("profile", _filters(authors=["cd" * 32])),
+            nostr_service.NostrSubscription("mentions", _filters(pubkey_refs=["11" * 32])),
+            nostr_service.NostrSubscription("channel", _filters(kinds=[42, 4])),
+        ]
+        index = nostr_service.SubscriptionIndex(subs)
+
+        def names(event):
+            return [sub.name for sub in index.candidates(event)]
+
+        self.assertEqual(names(self._event(4)), ["dms", "channel"])
+        self.assertEqual(names(self._event(1)), [])
+        self.assertEqual(names(self._event(1, author="cd" * 32)), ["profile"])
+        self.assertEqual(names(self._event(4, author="cd" * 32, p="11" * 32)),
+                         ["dms", "profile", "mentions", "channel"])
+
+    def test_filter_without_keys_sees_every_event(self):
+        subs = [
+            nostr_service.NostrSubscription("kind1", _filters(kinds=[1])),
+            nostr_service.NostrSubscription("all", nostr_service.Filters([
+                nostr_service.Filter(since=5), nostr_service.Filter(limit=3)])),
+        ]
+        index = nostr_service.SubscriptionIndex(subs)
+        self.assertEqual([s.name for s in index.candidates(self._event(7))], ["all"])
+        self.assertEqual([s.name for s in index.candidates(self._event(1))], ["kind1", "all"])
+
+    def test_unrelated_filters_not_evaluated(self):
+        mgr = NostrManager()
+        seen = []
+        counters = []
+        for kind in range(10):
+            filters = _CountingFilters(_filters(kinds=[kind]))
+            counters.append(filters)
+            mgr.add_subscription("k{}".format(kind), filters, callback=seen.append)
+        mgr._process_event(self._event(3))
+        self.assertEqual(len(seen), 1)
+        self.assertEqual([c.matches for c in counters], [0, 0, 0, 1, 0, 0, 0, 0, 0, 0])
+
+    def test_index_follows_add_change_and_close(self):
+        mgr = NostrManager()
+        seen = []
+        mgr.add_subscription("a", _filters(kinds=[1]), callback=lambda e: seen.append("a"))
+        mgr._process_event(self._event(1, author="01" * 32))
+        mgr.add_subscription("b", _filters(kinds=[1]), callback=lambda e: seen.append("b"))
+        mgr._process_event(self._event(1, author="02" * 32))
+        # Same name, new kinds: the index must follow the new filters.
+        mgr.add_subscription("a", _filters(kinds=[2]))
+        mgr._process_event(self._event(1, author="03" * 32))
+        mgr._process_event(self._event(2, author="04" * 32))
+        mgr.close_subscription("b")
+        mgr._process_event(self._event(1, author="05" * 32))
+        self.assertEqual(seen, ["a", "a", "b", "b", "a"])
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class TestLazyNostrEvent(unittest.TestCase):
+    """DMs decrypted on first read only; str() formatted once."""
+
+    def _dm(self):
+        event = _FakeEvent(4, event_id="dm1")
+        event.content = "hello"
+        return event
+
+    def test_decrypted_on_first_read_only(self):
+        key = _CountingKey()
+        nostr_event = nostr_service.NostrEvent(self._dm(), key)
+        self.assertEqual(key.derivations, 0)
+        self.assertEqual(nostr_event.decrypted_content, "hello")
+        self.assertEqual(nostr_event.get_display_content(), "hello")
+        self.assertEqual(key.derivations, 1)
+
+    def test_no_key_or_not_a_dm(self):
+        self.assertIsNone(nostr_service.NostrEvent(self._dm()).decrypted_content)
+        key = _CountingKey()
+        note = nostr_service.NostrEvent(_FakeEvent(1), key)
+        self.assertIsNone(note.decrypted_content)
+        self.assertEqual(key.derivations, 0)
+
+    def test_failed_decrypt_not_retried(self):
+        class _BrokenKey(_CountingKey):
+            def decrypt_message(self, content, public_key_hex):
+                self.derivations += 1
+                raise ValueError("bad padding")
+        key = _BrokenKey()
+        nostr_event = nostr_service.NostrEvent(self._dm(), key)
+        self.assertEqual(nostr_event.get_display_content(), "hello")
+        self.assertIsNone(nostr_event.decrypted_content)
+        self.assertEqual(key.derivations, 1)
+
+    def test_decrypted_content_can_be_set(self):
+        key = _CountingKey()
+        nostr_event = nostr_service.NostrEvent(self._dm(), key)
+        self.assertIn("hello", str(nostr_event))
+        nostr_event.decrypted_content = "edited"
+        self.assertEqual(nostr_event.get_display_content(), "edited")
+        self.assertIn("edited", str(nostr_event))
+        self.assertEqual(key.derivations, 1)
+
+    def test_str_formatted_once(self):
+        nostr_event = nostr_service.NostrEvent(_FakeEvent(42))
+        first = str(nostr_event)
+        self.assertIn("abababab", first)
+        self.assertIs(str(nostr_event), first)
+
+    def test_unread_dm_not_decrypted_by_manager(self):
+        mgr = NostrManager()
+        key = _CountingKey()
+        mgr._nostr_private_key = key
+        stored = []
+        mgr._event_handlers[4] = [stored.append]
+        # INFO (the device default) logs the arrival, not the plaintext.
+        level = nostr_service.logger.level
+        nostr_service.logger.setLevel(logging.INFO)
+        try:
+            mgr._process_event(self._dm())
+        finally:
+            nostr_service.logger.setLevel(level)
+        self.assertEqual(key.derivations, 0)
+        self.assertEqual(stored[0].get_display_content(), "hello")
+        self.assertEqual(key.derivations, 1)
+
+
+def _unwrap_to_rumor(event):
+    # Stands in for the two NIP-44 layers: the "rumor" is a kind-14 chat
+    # message carrying the wrap's content; None for undecryptable wraps.
+    if event.content == "garbage":
+        return None
+    rumor = _FakeEvent(14)
+    rumor.content = event.content
+    return rumor
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class TestGiftWrapQueue(unittest.TestCase):
+    """NIP-17 gift wraps unwrapped in the background from a bounded queue."""
+
+    def _manager(self):
+        mgr = NostrManager()
+        mgr._decrypt_nip17_gift_wrap = _unwrap_to_rumor
+        mgr.chats = []
+        mgr._event_handlers[14] = [lambda e: mgr.chats.append((e.content, e.event.id))]
+        return mgr
+
+    def _wrap(self, content):
+        event = _FakeEvent(nostr_service.KIND_NIP17_GIFT_WRAP, event_id="wrap-" + content)
+        event.content = content
+        return event
+
+    async def _finish(self, mgr):
+        while mgr._gift_wrap_task is not None:
+            await asyncio.sleep(0)
+
+    def test_unwrapped_after_the_drain_in_order(self):
+        async def run():
+            mgr = self._manager()
+            notes = []
+            mgr._event_handlers[1] = [notes.append]
+            mgr._process_event(self._wrap("a"), relay_url="wss://r")
+            mgr._process_event(self._wrap("b"))
+            mgr._process_event(_FakeEvent(1))
+            # The note went straight through; the wraps wait their turn.
+            self.assertEqual((len(notes), mgr.chats), (1, []))
+            await self._finish(mgr)
+            return mgr
+        mgr = asyncio.run(run())
+        self.assertEqual(mgr.chats, [("a", "wrap-a"), ("b", "wrap-b")])
+        stats = mgr.get_gift_wrap_stats()
+        self.assertEqual((stats["queued"], stats["unwrapped"], stats["queue_depth"]), (2, 2, 0))
+
+    def test_flood_drops_oldest(self):
+        async def run():
+            mgr = self._manager()
+            mgr.GIFT_WRAP_QUEUE_MAX = 3
+            for content in "abcde":
+                mgr._process_event(self._wrap(content))
+            await self._finish(mgr)
+            return mgr
+        mgr = asyncio.run(run())
+        self.assertEqual([c for c, _ in mgr.chats], ["c", "d", "e"])
+        stats = mgr.get_gift_wrap_stats()
+        self.assertEqual((stats["dropped"], stats["max_queue_depth"]), (2, 3))
+
+    def test_failures_and_copies(self):
+        async def run():
+            mgr = self._manager()
+            mgr._process_event(self._wrap("garbage"))
+            mgr._process_event(self._wrap("a"), relay_url="wss://a")
+            mgr._process_event(self._wrap("a"), relay_url="wss://b")
+            await self._finish(mgr)
+            # A wrap arriving after the worker went idle starts a new one.
+            mgr._process_event(self._wrap("b"))
+            await self._finish(mgr)
+            return mgr
+        mgr = asyncio.run(run())
+        self.assertEqual([c for c, _ in mgr.chats], ["a", "b"])
+        stats = mgr.get_gift_wrap_stats()
+        self.assertEqual((stats["queued"], stats["failed"]), (3, 1))
+
+
+class _ReopeningRelayManager(_FakeRelayManager):
+    def __init__(self):
+        super().__init__()
+        self.opened = 0
+        # The relays each close_connections / open_connections call saw.
+        self.closed_relays = []
+        self.opened_urls = []
+
+    def add_relay(self, url):
+        self.relays[url] = _FakeRelay(connected=False)
+
+    async def close_connections(self):
+        self.closed_relays.extend(self.relays.values())
+
+    async def open_connections(self, ssl_options=None):
+        self.opened += 1
+        self.opened_urls.append(sorted(self.relays))
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class TestWatchdogReconnect(unittest.TestCase):
+    """Stale relays reconnected in place, backed off, subscriptions resumed."""
+
+    def _manager(self, *urls):
+        mgr = NostrManager()
+        mgr.relay_manager = _ReopeningRelayManager()
+        for url in urls:
+            mgr.relay_manager.relays[url] = _FakeRelay()
+        return mgr
+
+    def test_backoff_doubles_with_jitter_and_caps(self):
+        mgr = NostrManager()
+        self.assertEqual(mgr._reconnect_backoff(), 0)
+        base = mgr.RECONNECT_BACKOFF_BASE_SECONDS
+        for attempts, delay in ((1, base), (3, base * 4), (50, mgr.RECONNECT_BACKOFF_MAX_SECONDS)):
+            mgr._reconnect_attempts = attempts
+            for _ in range(20):
+                self.assertTrue(delay / 2 <= mgr._reconnect_backoff() <= delay)
+
+    def test_reconnect_within_backoff_waits_for_its_deadline(self):
+        mgr = self._manager("wss://a")
+        mgr._nwc_configured = True
+        mgr.keep_running = True
+        mgr._hooked_pool = mgr.relay_manager.message_pool
+        polls = []
+        mgr._send_nwc_poll = polls.append
+        now = time.time()
+        mgr._polls_since_last_event = mgr.RELAY_SILENT_RECONNECT_THRESHOLD
+        mgr._last_nwc_poll = now - mgr.NWC_POLL_SECONDS
+        asyncio.run(mgr._nwc_poll_and_watchdog(now))
+        self.assertEqual((mgr.relay_manager.opened, len(polls)), (1, 1))
+        # A request lost on every relay asks for another reconnect at once.
+        mgr._polls_since_last_event = mgr.RELAY_SILENT_RECONNECT_THRESHOLD
+        mgr._last_nwc_poll = now - mgr.NWC_POLL_SECONDS
+        asyncio.run(mgr._nwc_poll_and_watchdog(now))
+        self.assertEqual((mgr.relay_manager.opened, len(polls)), (1, 2))
+        self.assertTrue(mgr._reconnect_pending)
+        # The main loop sleeps no longer than the backoff, then reconnects.
+        self.assertLessEqual(mgr._next_wakeup_timeout(), mgr._reconnect_not_before - now)
+        asyncio.run(mgr._nwc_poll_and_watchdog(mgr._reconnect_not_before))
+        self.assertEqual((mgr.relay_manager.opened, len(polls)), (2, 2))
+        self.assertFalse(mgr._reconnect_pending)
+
+    def test_silent_relays_cycled_on_same_manager(self):
+        mgr = self._manager("wss://a", "wss://b")
+        relay_manager = mgr.relay_manager
+        healthy = relay_manager.relays["wss://b"]
+        mgr._subscription_ids = {"dms": "mpos_sub_1"}
+        mgr._relay_health_for("wss://a").timeouts = 1
+        stale = relay_manager.relays["wss://a"]
+        asyncio.run(mgr._reconnect_relay())
+        self.assertIs(mgr.relay_manager, relay_manager)
+        self.assertIs(relay_manager.relays["wss://b"], healthy)
+        self.assertFalse(relay_manager.relays["wss://a"].connected)  # a fresh relay
+        self.assertEqual(mgr._subscription_ids, {"dms": "mpos_sub_1"})
+        # Only the stale relay is closed and only its replacement opened,
+        # both through the manager's own calls.
+        self.assertEqual(relay_manager.closed_relays, [stale])
+        self.assertEqual(relay_manager.opened_urls, [["wss://a"]])
+        self.assertEqual(sorted(relay_manager.relays), ["wss://a", "wss://b"])
+
+    def test_all_silent_cycles_every_relay_and_backs_off(self):
+        mgr = self._manager("wss://a", "wss://b")
+        old = dict(mgr.relay_manager.relays)
+        before = time.time()
+        asyncio.run(mgr._reconnect_relay())
+        for url, relay in old.items():
+            self.assertIsNot(mgr.relay_manager.relays[url], relay)
+        self.assertEqual(mgr._reconnect_attempts, 1)
+        self.assertGreaterEqual(mgr._reconnect_not_before,
+                                before + mgr.RECONNECT_BACKOFF_BASE_SECONDS / 2)
+        # An NWC reply ends the streak.
+        mgr._nwc_configured = True
+        mgr._nwc_private_key = _PlaintextKey()
+        mgr._process_nwc_event(_NWCEvent("req1", {"balance": 1000}))
+        self.assertEqual(mgr._reconnect_attempts, 0)
+
+    def test_subscriptions_resume_from_last_event(self):
+        mgr = self._manager("wss://a")
+        mgr.add_subscription("notes", _filters(kinds=[1]), callback=lambda e: None,
+                             since=50, limit=20)
+        mgr.add_subscription("quiet", _filters(kinds=[7]), callback=lambda e: None, since=50)
+        sub = mgr._subscriptions[0]
+        frame = sub.req_json("s1")
+        for created_at in (300, 200):
+            mgr._process_event(_FakeEvent(1, created_at=created_at))
+        asyncio.run(mgr._reconnect_relays(["wss://a"]))
+        self.assertIsNot(sub.req_json("s1"), frame)
+        self.assertEqual(json.loads(sub.req_json("s1"))[2]["since"], 300)
+        self.assertEqual(json.loads(mgr._subscriptions[1].req_json("s2"))[2]["since"], 50)
+        # The caller's Filter is left as it was.
+        self.assertEqual(sub.filters.data[0].since, 50)
+
+    def test_resume_never_asks_for_the_future(self):
+        mgr = self._manager("wss://a")
+        mgr.add_subscription("notes", _filters(kinds=[1]), callback=lambda e: None)
+        mgr._process_event(_FakeEvent(1, created_at=int(time.time()) + 3600))
+        mgr._resume_subscriptions()
+        since = json.loads(mgr._subscriptions[0].req_json("s1"))[2]["since"]
+        self.assertLessEqual(since, time.time())
+
+    def test_resume_is_per_filter_and_keeps_gift_wrap_window(self):
+        """A relay-list event must not move the gift-wrap filter of the same
+        subscription, and a wrap back-dated by NIP-59 that arrives after
+        the reconnect still falls inside the resumed REQ."""
+        mgr = self._manager("wss://a")
+        now = int(time.time())
+        mgr.add_subscription("nip17-debug", nostr_service.Filters([
+            nostr_service.Filter(kinds=[nostr_service.KIND_RELAY_LIST]),
+            nostr_service.Filter(kinds=[nostr_service.KIND_NIP17_GIFT_WRAP]),
+        ]), callback=lambda e: None)
+        sub = mgr._subscriptions[0]
+        mgr._process_event(_FakeEvent(nostr_service.KIND_RELAY_LIST, created_at=now - 60))
+        sub.note_event(_FakeEvent(nostr_service.KIND_NIP17_GIFT_WRAP, created_at=now - 30))
+        asyncio.run(mgr._reconnect_relays(["wss://a"]))
+        relay_list, gift_wraps = json.loads(sub.req_json("s1"))[2:]
+        self.assertEqual(relay_list["since"], now - 60)
+        self.assertEqual(gift_wraps["since"], now - 30 - nostr_service.GIFT_WRAP_BACKDATE_SECONDS)
+        late_wrap = _FakeEvent(nostr_service.KIND_NIP17_GIFT_WRAP,
+                               created_at=now - 24 * 3600, event_id="late-wrap")
+        self.assertGreaterEqual(late_wrap.created_at, gift_wraps["since"])
+        mgr._process_event(late_wrap)
+        self.assertEqual(mgr.get_gift_wrap_stats()["queued"], 1)
+        # The caller's Filters are left as they were.
+        self.assertEqual([f.since for f in sub.filters.data], [None, None])
+
+
+@unittest.skipUnless(_HAVE_NOSTR, "nostr lib not available")
+class TestConditionalListPoll(unittest.TestCase):
+    """Polls skip list_transactions while the last list is fresh."""
+
+    def _manager(self):
+        mgr = _make_nwc_manager()
+        mgr.balance_polls = 0
+
+        def fetch_balance():
+            mgr.balance_polls += 1
+        mgr.nwc_fetch_balance = fetch_balance
+        return mgr
+
+    def test_first_poll_lists(self):
+        mgr = self._manager()
+        mgr._send_nwc_poll(time.time())
+        self.assertEqual((mgr.balance_polls, len(mgr.sent)), (1, 1))
+
+    def test_fresh_list_skipped(self):
+        mgr = self._manager()
+        mgr.nwc_fetch_payments()  # e.g. the wallet's fetch on a balance change
+        now = time.time()
+        mgr._send_nwc_poll(now)
+        mgr._send_nwc_poll(now + mgr.NWC_POLL_SECONDS)
+        self.assertEqual((mgr.balance_polls, len(mgr.sent)), (2, 1))
+
+    def test_stale_list_refetched(self):
+        mgr = self._manager()
+        mgr.nwc_fetch_payments()
+        mgr._nwc_in_flight.clear()  # answered
+        mgr._send_nwc_poll(time.time() + mgr.NWC_LIST_MAX_STALE_SECONDS)
+        self.assertEqual(len(mgr.sent), 2)
+
+    def test_zero_staleness_lists_every_poll(self):
+        mgr = self._manager()
+        mgr.NWC_LIST_MAX_STALE_SECONDS = 0
+        now = time.time()
+        for _ in range(3):
+            mgr._send_nwc_poll(now)
+            mgr._nwc_in_flight.clear()  # answered
+        self.assertEqual(len(mgr.sent), 3)
+
+    def test_list_in_flight_skipped(self):
+        mgr = self._manager()
+        mgr.NWC_LIST_MAX_STALE_SECONDS = 0
+        now = time.time()
+        mgr._send_nwc_poll(now)
+        self.assertTrue(mgr.nwc_list_in_flight())
+        mgr._send_nwc_poll(now + mgr.NWC_POLL_SECONDS)
+        self.assertEqual((mgr.balance_polls, len(mgr.sent)), (2, 1))
+        mgr._check_nwc_deadlines(now + 1000)  # retries run out
+        mgr._check_nwc_deadlines(now + 2000)
+        mgr._check_nwc_deadlines(now + 3000)
+        self.assertFalse(mgr.nwc_list_in_flight())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,6 +8,9 @@ interpolation (`f"{amount_sats}"`), so the balance row showed "₿8,984"
 but the transaction row showed "₿8984" — inconsistent thousands
 separator on the same screen.
 
+Also covers Payment's value semantics (read-only fields, hashing) and
+the render stamp PaymentsView keys its row texts on.
+
 Usage (from the LightningPiggyApp repo root):
     Desktop: bash tests/unittest.sh tests/test_payment_formatting.py
     Device:  bash tests/unittest.sh tests/test_payment_formatting.py --ondevice
@@ -133,5 +136,56 @@ class TestPaymentNumberFormatPreference(unittest.TestCase):
             Payment.use_symbol = False
 
 
+class TestPaymentValueSemantics(unittest.TestCase):
+    """Payment is an immutable value: fields are read-only, equal payments
+    hash alike, and render_stamp() moves with every setting the display
+    string depends on."""
+
+    def tearDown(self):
+        Payment.use_symbol = False
+
+    def test_fields_are_read_only(self):
+        p = Payment(1775838000, 47, "x")
+        with self.assertRaises(AttributeError):
+            p.amount_sats = 48
+        self.assertEqual((p.epoch_time, p.amount_sats, p.comment), (1775838000, 47, "x"))
+
+    def test_equal_payments_hash_alike(self):
+        a = Payment(1775838000, 47, "x")
+        b = Payment(1775838000, 47, "x")
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+        self.assertEqual(len({a, b, Payment(1775838000, 47, "y")}), 2)
+
+    def test_denomination_change_moves_stamp_and_text(self):
+        Payment.use_symbol = False
+        p = Payment(1775838000, 47, "x")
+        before = (Payment.render_stamp(), str(p))
+        Payment.use_symbol = True
+        self.assertNotEqual(Payment.render_stamp(), before[0])
+        self.assertEqual(str(p), "₿47: x")
+        Payment.use_symbol = False
+        self.assertEqual(str(p), before[1])
+
+    def test_use_symbol_toggle_rerenders(self):
+        p = Payment(1775838000, 47, "")
+        Payment.use_symbol = False
+        self.assertEqual(str(p), "47 sats received!")
+        Payment.use_symbol = True
+        self.assertEqual(str(p), "₿47 received!")
+        Payment.use_symbol = False
+        self.assertEqual(str(p), "47 sats received!")
+
+    def test_render_stamp_follows_settings(self):
+        Payment.use_symbol = False
+        plain = Payment.render_stamp()
+        self.assertEqual(Payment.render_stamp(), plain)
+        Payment.use_symbol = True
+        self.assertNotEqual(Payment.render_stamp(), plain)
+        Payment.use_symbol = False
+        Payment.invalidate_rendered()
+        self.assertNotEqual(Payment.render_stamp(), plain)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,156 @@
+"""
+Unit tests for PaymentsView — the per-row transaction list that replaced
+the single `str(payment_list)` label.
+
+Covers the keyed reconciliation: rows for payments that stay on screen are
+kept and not re-texted, a prepended payment costs one new row, dropped
+rows go back to the spare pool, the row limit is honoured, status
+messages hide the rows without losing them, redraws of an unchanged
+list version are skipped, and kept rows reuse their text instead of
+formatting the payment again.
+
+Needs LVGL (the MicroPythonOS desktop build provides it); skipped where
+`lvgl` can't be imported.
+
+Usage (from the LightningPiggyApp repo root):
+    Desktop: bash tests/unittest.sh tests/test_payments_view.py
+"""
+
+import unittest
+
+try:
+    import lvgl as lv
+    from payments_view import PaymentsView
+    _HAVE_LVGL = True
+except ImportError:
+    _HAVE_LVGL = False
+
+from payment import Payment
+from unique_sorted_list import UniqueSortedList
+
+
+def _payments(*epochs):
+    return UniqueSortedList.from_iterable(
+        Payment(e, 100 + e, "p{}".format(e)) for e in epochs)
+
+
+@unittest.skipUnless(_HAVE_LVGL, "lvgl not available")
+class TestPaymentsView(unittest.TestCase):
+
+    def setUp(self):
+        Payment.use_symbol = False
+        self.screen = lv.obj()
+        self.container = lv.obj(self.screen)
+        self.message = lv.label(self.container)
+        self.view = PaymentsView(self.container, self.message)
+
+    def tearDown(self):
+        self.screen.delete()
+        Payment.use_symbol = False
+
+    def _visible_texts(self):
+        texts = []
+        for i in range(self.container.get_child_count()):
+            child = self.container.get_child(i)
+            if child is not None and not child.has_flag(lv.obj.FLAG.HIDDEN):
+                texts.append(child.get_text())
+        return texts
+
+    def test_rows_follow_list_order(self):
+        pl = _payments(1, 3, 2)
+        self.view.show_payments(pl)
+        self.assertEqual(self._visible_texts(), [str(p) for p in pl])
+        self.assertTrue(self.message.has_flag(lv.obj.FLAG.HIDDEN))
+
+    def test_prepend_sets_one_text(self):
+        self.view.show_payments(_payments(1, 2, 3))
+        before = self.view.texts_set
+        pl = _payments(1, 2, 3, 4)
+        self.view.show_payments(pl)
+        self.assertEqual(self.view.texts_set - before, 1)
+        self.assertEqual(self._visible_texts(), [str(p) for p in pl])
+
+    def test_unchanged_list_sets_nothing(self):
+        self.view.show_payments(_payments(1, 2, 3))
+        before = self.view.texts_set
+        self.view.show_payments(_payments(1, 2, 3))
+        self.assertEqual(self.view.texts_set, before)
+
+    def test_dropped_rows_are_reused(self):
+        self.view.show_payments(_payments(1, 2, 3))
+        created = self.view.labels_created
+        self.view.show_payments(_payments(4, 5, 6))
+        self.assertEqual(self.view.labels_created, created)
+        self.assertEqual(self.view.row_count(), 3)
+
+    def test_limit(self):
+        pl = _payments(1, 2, 3, 4)
+        self.view.show_payments(pl, 2)
+        self.assertEqual(self._visible_texts(), [str(pl.get(0)), str(pl.get(1))])
+
+    def test_symbol_toggle_retexts_rows(self):
+        pl = _payments(1, 2)
+        self.view.show_payments(pl)
+        Payment.use_symbol = True
+        self.view.show_payments(pl)
+        self.assertTrue(all(t.startswith("₿") for t in self._visible_texts()))
+
+    def test_message_hides_rows_and_back(self):
+        pl = _payments(1, 2)
+        self.view.show_payments(pl)
+        self.view.show_message("Connecting")
+        self.assertEqual(self._visible_texts(), ["Connecting"])
+        before = self.view.texts_set
+        self.view.show_payments(pl)
+        self.assertEqual(self.view.texts_set, before)
+        self.assertEqual(self._visible_texts(), [str(p) for p in pl])
+
+    def test_same_version_is_skipped(self):
+        pl = _payments(1, 2)
+        self.assertTrue(self.view.show_payments(pl))
+        self.assertFalse(self.view.show_payments(pl))
+        self.assertEqual(self.view.skipped, 1)
+        pl.add(Payment(3, 103, "p3"))
+        self.assertTrue(self.view.show_payments(pl))
+
+    def test_render_stamp_change_is_not_skipped(self):
+        pl = _payments(1, 2)
+        self.view.show_payments(pl)
+        Payment.use_symbol = True
+        self.assertTrue(self.view.show_payments(pl))
+
+    def test_kept_rows_not_reformatted(self):
+        formatted = []
+
+        class _CountingPayment(Payment):
+            __slots__ = ()
+
+            def __str__(self):
+                formatted.append(self.epoch_time)
+                return Payment.__str__(self)
+
+        def payments(*epochs):
+            return UniqueSortedList.from_iterable(
+                _CountingPayment(e, 100 + e, "p{}".format(e)) for e in epochs)
+
+        self.view.show_payments(payments(1, 2))
+        del formatted[:]
+        self.view.show_payments(payments(1, 2, 3))
+        self.assertEqual(formatted, [3])
+        # A stamp change re-formats every row.
+        Payment.invalidate_rendered()
+        del formatted[:]
+        self.view.show_payments(payments(1, 2, 3))
+        self.assertEqual(sorted(formatted), [1, 2, 3])
+
+    def test_take_stats_resets(self):
+        pl = _payments(1, 2)
+        self.view.show_payments(pl)
+        self.view.show_payments(pl)
+        stats = self.view.take_stats()
+        self.assertEqual((stats["relayouts"], stats["skipped"]), (1, 1))
+        self.assertEqual(self.view.take_stats()["relayouts"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
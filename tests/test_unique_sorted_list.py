@@ -0,0 +1,154 @@
+"""
+Unit tests for UniqueSortedList's keyed insertion: binary search on the
+payments' sort keys for the insertion point, a hash index for duplicate
+detection, and in-place tail trimming at MAX_ITEMS — plus the bulk
+path (from_iterable / extend / merge) the backends build their lists with.
+
+The basic contract (descending order, duplicates ignored, cap keeps the
+newest) is pinned in test_inspection_fixes.py; these tests cover the
+index bookkeeping that the bisect rewrite introduced.
+
+Usage (from the LightningPiggyApp repo root):
+    Desktop: bash tests/unittest.sh tests/test_unique_sorted_list.py
+"""
+
+import unittest
+
+from payment import Payment
+from unique_sorted_list import UniqueSortedList
+
+
+def _keys(usl):
+    return [p.sort_key() for p in usl]
+
+
+class TestKeyedInsert(unittest.TestCase):
+
+    def test_insert_into_middle(self):
+        usl = UniqueSortedList()
+        for epoch in (100, 300, 500, 200, 400):
+            usl.add(Payment(epoch, 1, "x"))
+        self.assertEqual([p.epoch_time for p in usl], [500, 400, 300, 200, 100])
+
+    def test_ties_on_epoch_ordered_by_amount_then_comment(self):
+        usl = UniqueSortedList()
+        usl.add(Payment(100, 5, "b"))
+        usl.add(Payment(100, 7, "a"))
+        usl.add(Payment(100, 5, "c"))
+        self.assertEqual(_keys(usl), [(100, 7, "a"), (100, 5, "c"), (100, 5, "b")])
+
+    def test_duplicate_detected_by_value_not_identity(self):
+        usl = UniqueSortedList()
+        usl.add(Payment(100, 5, "x"))
+        usl.add(Payment(100, 5, "x"))
+        usl.add(Payment(100, 5, "y"))
+        self.assertEqual(len(usl), 2)
+
+    def test_trimmed_items_leave_the_index(self):
+        usl = UniqueSortedList()
+        usl.MAX_ITEMS = 3
+        for epoch in (1, 2, 3, 4):
+            usl.add(Payment(epoch, 1, "x"))
+        self.assertEqual([p.epoch_time for p in usl], [4, 3, 2])
+        # The trimmed payment is not "already present", but re-adding it
+        # changes nothing: it is older than everything the full list keeps.
+        version = usl.version
+        usl.add(Payment(1, 1, "x"))
+        self.assertEqual([p.epoch_time for p in usl], [4, 3, 2])
+        self.assertEqual(len(usl._key_set), 3)
+        self.assertEqual(usl.version, version)
+        # A newer payment still pushes the oldest out.
+        usl.add(Payment(5, 1, "x"))
+        self.assertEqual([p.epoch_time for p in usl], [5, 4, 3])
+        self.assertEqual(len(usl._key_set), 3)
+
+    def test_matches_payment_comparisons(self):
+        # The keyed order must agree with Payment.__gt__ (what the old
+        # linear scan used), so both renderings stay identical.
+        usl = UniqueSortedList()
+        payments = [Payment(e, a, c) for e, a, c in
+                    ((3, 1, "a"), (1, 9, "z"), (3, 1, "b"), (2, -5, ""), (3, 0, "a"))]
+        for p in payments:
+            usl.add(p)
+        items = list(usl)
+        for a, b in zip(items, items[1:]):
+            self.assertTrue(a > b)
+
+
+class TestBulkBuild(unittest.TestCase):
+
+    def _by_add(self, payments):
+        usl = UniqueSortedList()
+        for p in payments:
+            usl.add(p)
+        return usl
+
+    def test_from_iterable_matches_add(self):
+        payments = [Payment(e % 7, e % 3, str(e % 5)) for e in range(40)]
+        self.assertEqual(_keys(UniqueSortedList.from_iterable(payments)),
+                         _keys(self._by_add(payments)))
+
+    def test_from_iterable_accepts_generator_and_empty(self):
+        usl = UniqueSortedList.from_iterable(Payment(e, 1, "x") for e in (2, 1, 3))
+        self.assertEqual([p.epoch_time for p in usl], [3, 2, 1])
+        self.assertEqual(len(UniqueSortedList.from_iterable([])), 0)
+
+    def test_extend_truncates_to_newest(self):
+        usl = UniqueSortedList()
+        usl.MAX_ITEMS = 3
+        usl.extend(Payment(e, 1, "x") for e in (5, 1, 4, 2, 3))
+        self.assertEqual([p.epoch_time for p in usl], [5, 4, 3])
+        self.assertEqual(len(usl._key_set), 3)
+
+    def test_extend_dedups_against_existing(self):
+        usl = UniqueSortedList.from_iterable([Payment(2, 1, "x"), Payment(4, 1, "x")])
+        usl.extend([Payment(4, 1, "x"), Payment(3, 1, "x"), Payment(3, 1, "x")])
+        self.assertEqual([p.epoch_time for p in usl], [4, 3, 2])
+
+    def test_merge_matches_add(self):
+        a = [Payment(e, 1, "x") for e in (10, 8, 6, 4)]
+        b = [Payment(e, 1, "x") for e in (9, 8, 7, 1)]
+        merged = UniqueSortedList.from_iterable(a)
+        merged.merge(UniqueSortedList.from_iterable(b))
+        self.assertEqual(_keys(merged), _keys(self._by_add(a + b)))
+        # The merged list keeps working with single inserts afterwards.
+        merged.add(Payment(5, 1, "x"))
+        merged.add(Payment(7, 1, "x"))
+        self.assertEqual([p.epoch_time for p in merged], [10, 9, 8, 7, 6, 5, 4, 1])
+
+    def test_merge_respects_cap(self):
+        merged = UniqueSortedList()
+        merged.MAX_ITEMS = 2
+        merged.add(Payment(1, 1, "x"))
+        merged.merge(UniqueSortedList.from_iterable([Payment(3, 1, "x"), Payment(2, 1, "x")]))
+        self.assertEqual([p.epoch_time for p in merged], [3, 2])
+
+
+class TestVersionStamp(unittest.TestCase):
+
+    def test_changes_on_insert_only(self):
+        usl = UniqueSortedList()
+        v0 = usl.version
+        usl.add(Payment(1, 1, "x"))
+        v1 = usl.version
+        self.assertNotEqual(v0, v1)
+        usl.add(Payment(1, 1, "x"))  # duplicate
+        self.assertEqual(usl.version, v1)
+
+    def test_extend_and_merge_without_news_keep_version(self):
+        usl = UniqueSortedList.from_iterable([Payment(1, 1, "x"), Payment(2, 1, "x")])
+        v = usl.version
+        usl.extend([Payment(2, 1, "x")])
+        usl.merge(UniqueSortedList.from_iterable([Payment(1, 1, "x")]))
+        self.assertEqual(usl.version, v)
+        usl.merge(UniqueSortedList.from_iterable([Payment(3, 1, "x")]))
+        self.assertNotEqual(usl.version, v)
+
+    def test_distinct_lists_never_share_a_version(self):
+        a = UniqueSortedList.from_iterable([Payment(1, 1, "x")])
+        b = UniqueSortedList.from_iterable([Payment(1, 1, "x")])
+        self.assertNotEqual(a.version, b.version)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,281 @@
+"""
+Unit tests for wallet_cache's slot store: one file per slot behind a
+small cache.json index (with migration from the v2 single-file
+layout), the columnar payment encoding and the lazy
+CachedPayments view load_slot returns, the pre-rendered display snapshots
+kept in a small file per slot, an in-RAM mirror that load_slot reads
+from, save_slot updating the mirror and deferring the file commit to a
+single flush, and disk and memory agreeing after every flush.
+
+Usage (from the LightningPiggyApp repo root):
+    Desktop: bash tests/unittest.sh tests/test_wallet_cache_store.py
+"""
+
+import unittest
+
+from payment import Payment
+from unique_sorted_list import UniqueSortedList
+import wallet_cache
+
+
+class TestWriteBehind(unittest.TestCase):
+
+    def setUp(self):
+        wallet_cache.flush()
+
+    def tearDown(self):
+        wallet_cache.flush()
+
+    def test_save_is_deferred_until_flush(self):
+        sk = "store_test_deferred"
+        wallet_cache.save_slot(sk, creds_fp="fp", balance=42)
+        self.assertIsNone(wallet_cache._read_slot(sk))
+        wallet_cache.flush()
+        self.assertEqual(wallet_cache._read_slot(sk)["balance"], 42)
+
+    def test_pending_write_visible_to_load(self):
+        sk = "store_test_visible"
+        wallet_cache.save_slot(sk, creds_fp="fp", balance=7)
+        self.assertEqual(wallet_cache.load_slot(sk, "fp", None)["balance"], 7)
+
+    def test_writes_coalesce_into_one_slot(self):
+        sk = "store_test_coalesce"
+        payments = UniqueSortedList.from_iterable([Payment(1, 5, "a"), Payment(2, 6, "b")])
+        wallet_cache.save_slot(sk, creds_fp="fp", balance=11)
+        wallet_cache.save_slot(sk, creds_fp="fp", payments=payments)
+        wallet_cache.save_slot(sk, qr_fp="qr", static_receive_code="lnurl1")
+        self.assertEqual(wallet_cache._dirty, {sk})
+        wallet_cache.flush()
+        self.assertEqual(wallet_cache._dirty, set())
+        loaded = wallet_cache.load_slot(sk, "fp", "qr")
+        self.assertEqual(loaded["balance"], 11)
+        self.assertEqual([p.sort_key() for p in loaded["payments"]],
+                         [p.sort_key() for p in payments])
+        self.assertEqual(loaded["static_receive_code"], "lnurl1")
+
+    def test_flush_without_pending_is_noop(self):
+        wallet_cache.flush()
+        wallet_cache.flush()
+        self.assertEqual(wallet_cache._dirty, set())
+
+
+class TestMirrorConsistency(unittest.TestCase):
+
+    def setUp(self):
+        wallet_cache.flush()
+
+    def tearDown(self):
+        wallet_cache.flush()
+
+    def _reload_from_disk(self):
+        # What the next app start would see.
+        wallet_cache._slots.clear()
+
+    def test_disk_matches_memory_after_flush(self):
+        payments = UniqueSortedList.from_iterable([Payment(10, 1, "x"), Payment(11, -2, "")])
+        wallet_cache.save_slot("mirror_a", creds_fp="fa", balance=1, payments=payments)
+        wallet_cache.save_slot("mirror_b", qr_fp="qb", static_receive_code="b@example.com")
+        wallet_cache.flush()
+        wallet_cache.save_slot("mirror_a", creds_fp="fa", balance=2)
+        wallet_cache.flush()
+        for sk in ("mirror_a", "mirror_b"):
+            self.assertEqual(wallet_cache._read_slot(sk), wallet_cache._slot(sk))
+
+    def test_load_same_before_and_after_reload(self):
+        payments = UniqueSortedList.from_iterable([Payment(20, 3, "y")])
+        wallet_cache.save_slot("mirror_c", creds_fp="fc", balance=5, payments=payments)
+        wallet_cache.save_slot("mirror_c", qr_fp="qc", static_receive_code="lnurl-c")
+        wallet_cache.flush()
+        from_memory = wallet_cache.load_slot("mirror_c", "fc", "qc")
+        self._reload_from_disk()
+        from_disk = wallet_cache.load_slot("mirror_c", "fc", "qc")
+        for field in ("balance", "static_receive_code", "last_updated"):
+            self.assertEqual(from_memory[field], from_disk[field])
+        self.assertEqual([p.sort_key() for p in from_memory["payments"]],
+                         [p.sort_key() for p in from_disk["payments"]])
+
+    def test_load_does_not_reread_disk(self):
+        wallet_cache.save_slot("mirror_d", creds_fp="fd", balance=9)
+        wallet_cache.flush()
+        # A change made behind the module's back is not picked up: reads
+        # come from the mirror.
+        editor = wallet_cache._slot_file("mirror_d").edit()
+        editor.put_dict("slot", {})
+        editor.commit()
+        self.assertEqual(wallet_cache.load_slot("mirror_d", "fd", None)["balance"], 9)
+        # The next flush restores the disk copy from the mirror.
+        wallet_cache.save_slot("mirror_d", creds_fp="fd", balance=10)
+        wallet_cache.flush()
+        self.assertEqual(wallet_cache._read_slot("mirror_d")["balance"], 10)
+
+
+class TestPerSlotFiles(unittest.TestCase):
+
+    def setUp(self):
+        wallet_cache.flush()
+
+    def tearDown(self):
+        wallet_cache.flush()
+
+    def test_write_touches_only_its_slot_file(self):
+        wallet_cache.save_slot("perslot_a", creds_fp="fa", balance=1)
+        wallet_cache.save_slot("perslot_b", creds_fp="fb", balance=2)
+        wallet_cache.flush()
+        wallet_cache.save_slot("perslot_a", creds_fp="fa", balance=3)
+        self.assertEqual(wallet_cache._dirty, {"perslot_a"})
+        wallet_cache.flush()
+        self.assertEqual(wallet_cache._read_slot("perslot_a")["balance"], 3)
+        self.assertEqual(wallet_cache._read_slot("perslot_b")["balance"], 2)
+        index = wallet_cache._cache.get_dict("slots")
+        self.assertEqual(index["perslot_a"], "cache_perslot_a.json")
+        self.assertEqual(wallet_cache._cache.get_int("version", 0), wallet_cache._CACHE_VERSION)
+
+    def test_v2_cache_is_split_into_slot_files(self):
+        sk = "migrate_test_1"
+        saved_index = dict(wallet_cache._index)
+        try:
+            editor = wallet_cache._cache.edit()
+            editor.put_int("version", 2)
+            editor.put_dict("slots", {sk: {"creds_fp": "fm", "balance": 77,
+                                           "last_updated": 5,
+                                           "payments": [{"epoch_time": 9, "amount_sats": 3,
+                                                         "comment": "old"}]}})
+            editor.commit()
+            wallet_cache._slots.pop(sk, None)
+            index = wallet_cache._read_index()
+            self.assertEqual(index[sk], "cache_migrate_test_1.json")
+            self.assertEqual(wallet_cache._cache.get_int("version", 0), wallet_cache._CACHE_VERSION)
+            self.assertEqual(wallet_cache._read_slot(sk)["balance"], 77)
+            loaded = wallet_cache.load_slot(sk, "fm", None)
+            self.assertEqual(loaded["balance"], 77)
+            self.assertEqual([p.sort_key() for p in loaded["payments"]], [(9, 3, "old")])
+        finally:
+            wallet_cache._index.clear()
+            wallet_cache._index.update(saved_index)
+            wallet_cache._write_index()
+
+
+class TestColumnarPayments(unittest.TestCase):
+
+    def test_round_trip(self):
+        payments = [Payment(3, 10, "zap"), Payment(2, -4, ""), Payment(1, 7, "zap")]
+        columns = wallet_cache._encode_payments(payments)
+        self.assertEqual(columns["comments"], ["zap", ""])
+        self.assertEqual(columns["comment_ix"], [0, 1, 0])
+        self.assertEqual([p.sort_key() for p in wallet_cache._decode_payments(columns)],
+                         [p.sort_key() for p in payments])
+
+    def test_bad_rows_are_skipped(self):
+        columns = {"epoch_time": [3, 2], "amount_sats": [1, 1],
+                   "comment_ix": [0, 5], "comments": ["x"]}
+        self.assertEqual([p.sort_key() for p in wallet_cache._decode_payments(columns)],
+                         [(3, 1, "x")])
+
+    def test_malformed_columns_decode_to_nothing(self):
+        self.assertEqual(wallet_cache._decode_payments([{"epoch_time": 1}]), [])
+        self.assertEqual(wallet_cache._decode_payments({"epoch_time": [1]}), [])
+
+
+class TestLazyPayments(unittest.TestCase):
+
+    def _view(self, n):
+        payments = [Payment(100 - i, i + 1, "c{}".format(i % 2)) for i in range(n)]
+        return wallet_cache.CachedPayments(wallet_cache._encode_payments(payments)), payments
+
+    def test_head_builds_only_n(self):
+        view, payments = self._view(10)
+        self.assertEqual(len(view), 10)
+        head = view.head(3)
+        self.assertEqual([p.sort_key() for p in head], [p.sort_key() for p in payments[:3]])
+        # Iteration is a generator: pulling 3 rows yields the same head.
+        it = iter(view)
+        first = [next(it) for _ in range(3)]
+        self.assertEqual([p.sort_key() for p in first], [p.sort_key() for p in head])
+
+    def test_to_list_is_a_unique_sorted_list(self):
+        view, payments = self._view(5)
+        full = view.to_list()
+        self.assertEqual(len(full), 5)
+        self.assertTrue(full is view.to_list())
+        self.assertEqual([p.sort_key() for p in full], [p.sort_key() for p in payments])
+        self.assertTrue(hasattr(full, "add"))
+
+    def test_view_has_stable_version(self):
+        view, _ = self._view(2)
+        self.assertEqual(view.version, view.version)
+        other, _ = self._view(2)
+        self.assertNotEqual(view.version, other.version)
+
+    def test_load_slot_returns_view(self):
+        sk = "lazy_test_1"
+        wallet_cache.save_slot(sk, creds_fp="fl", payments=[Payment(5, 1, "a"), Payment(4, 2, "")])
+        loaded = wallet_cache.load_slot(sk, "fl", None)["payments"]
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual([p.sort_key() for p in loaded.head(1)], [(5, 1, "a")])
+        wallet_cache.flush()
+
+    def test_malformed_columns_are_empty(self):
+        self.assertEqual(len(wallet_cache.CachedPayments({"epoch_time": [1]})), 0)
+        self.assertEqual(list(wallet_cache.CachedPayments({"epoch_time": [1]})), [])
+
+
+class TestDisplaySnapshot(unittest.TestCase):
+
+    def setUp(self):
+        wallet_cache.flush()
+
+    def tearDown(self):
+        wallet_cache.flush()
+
+    def _snapshot(self, **overrides):
+        snapshot = {"creds_fp": "fs", "qr_fp": "qs", "render_fp": "sats|6|1,234.5",
+                    "balance": 21000, "balance_number": "21,000", "balance_unit": " sats",
+                    "payments_text": "row 1\nrow 2", "static_receive_code": "lightning:x"}
+        snapshot.update(overrides)
+        return snapshot
+
+    def test_round_trip_through_snapshot_file(self):
+        sk = "snap_test_1"
+        wallet_cache.save_snapshot(sk, self._snapshot())
+        wallet_cache.flush()
+        on_disk = wallet_cache._snapshot_file(sk).get_dict("snapshot")
+        self.assertEqual(on_disk["balance_number"], "21,000")
+        self.assertIsNone(wallet_cache._cache.get_dict("snapshots"))
+        # A cold start reads it back from the file.
+        del wallet_cache._snapshots[sk]
+        loaded = wallet_cache.load_snapshot(sk, "fs", "qs", "sats|6|1,234.5")
+        self.assertEqual(loaded["payments_text"], "row 1\nrow 2")
+        self.assertEqual(loaded["static_receive_code"], "lightning:x")
+
+    def test_rejected_on_credentials_or_render_mismatch(self):
+        sk = "snap_test_2"
+        wallet_cache.save_snapshot(sk, self._snapshot())
+        self.assertIsNone(wallet_cache.load_snapshot(sk, "other", "qs", "sats|6|1,234.5"))
+        self.assertIsNone(wallet_cache.load_snapshot(sk, None, "qs", "sats|6|1,234.5"))
+        self.assertIsNone(wallet_cache.load_snapshot(sk, "fs", "qs", "bits|6|1,234.5"))
+        self.assertIsNone(wallet_cache.load_snapshot("snap_test_missing", "fs", "qs", "x"))
+
+    def test_qr_dropped_on_qr_mismatch(self):
+        sk = "snap_test_3"
+        wallet_cache.save_snapshot(sk, self._snapshot())
+        loaded = wallet_cache.load_snapshot(sk, "fs", "changed", "sats|6|1,234.5")
+        self.assertIsNone(loaded["static_receive_code"])
+        self.assertEqual(loaded["balance_number"], "21,000")
+        # The stored snapshot itself is untouched.
+        self.assertEqual(wallet_cache.load_snapshot(sk, "fs", "qs", "sats|6|1,234.5")
+                         ["static_receive_code"], "lightning:x")
+
+    def test_snapshot_writes_never_dirty_index(self):
+        sk = "snap_test_4"
+        wallet_cache.save_snapshot(sk, self._snapshot())
+        self.assertFalse(wallet_cache._index_dirty)
+        wallet_cache.flush()
+        wallet_cache.save_snapshot(sk, self._snapshot())
+        self.assertNotIn(sk, wallet_cache._dirty_snapshots)
+        wallet_cache.save_snapshot(sk, self._snapshot(balance_number="21,001"))
+        self.assertEqual(wallet_cache._dirty_snapshots, {sk})
+        self.assertFalse(wallet_cache._index_dirty)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,9 @@ Unit tests for the money-path logic in wallet.py and nwc_wallet.py:
   - ensure_lightning_prefix      (QR receive-code prefixing, wallet.py)
   - Wallet.handle_new_balance    (balance state machine + callback deltas)
   - NWCWallet._mgr_notification_cb (live NIP-47 payment notifications)
+  - NWCWallet._mgr_payments_cb / _mgr_more_payments_cb (full vs
+                                   incremental list_transactions replies,
+                                   the persisted sync cursor)
   - Wallet._decode_surrogate_pairs (emoji tofu fix)
   - Wallet.try_parse_as_zap + NWCWallet.getCommentFromTransaction
 
@@ -33,6 +36,8 @@ for _m in ("nostr_service", "nwc_wallet", "wallet", "payment", "unique_sorted_li
         del sys.modules[_m]
 
 import wallet
+import wallet_cache
+from payment import Payment
 from wallet import Wallet, ensure_lightning_prefix
 from nwc_wallet import NWCWallet
 
@@ -261,6 +266,83 @@ class TestNWCNotifications(unittest.TestCase):
         self.assertEqual(self.deltas, [])  # no balance side effects
 
 
+class _FakeManager:
+    def __init__(self):
+        self.list_from = "unset"
+
+    def set_nwc_list_from(self, created_at):
+        self.list_from = created_at
+
+
+def _tx(created_at, msats=1000, description=""):
+    return {"type": "incoming", "amount": msats,
+            "created_at": created_at, "description": description}
+
+
+class TestNWCIncrementalSync(unittest.TestCase):
+
+    def setUp(self):
+        self._orig_tm = wallet.TaskManager
+        wallet.TaskManager = _RecordingTaskManager()
+        self.w = NWCWallet(NWC_URL)
+        self.w.slot_key = None
+        self.payment_pings = []
+        self.w.payments_updated_cb = lambda: self.payment_pings.append(1)
+
+    def tearDown(self):
+        wallet.TaskManager = self._orig_tm
+        wallet_cache.flush()
+
+    def _epochs(self):
+        return [p.epoch_time for p in self.w.payment_list]
+
+    def test_full_page_replaces_and_sets_cursor(self):
+        self.w._mgr_payments_cb([_tx(10), _tx(30), _tx(20)])
+        self.assertEqual(self._epochs(), [30, 20, 10])
+        self.assertEqual(self.w._sync_cursor, 30)
+        self.w._mgr_payments_cb([_tx(40)])
+        self.assertEqual(self._epochs(), [40])
+
+    def test_incremental_reply_merges(self):
+        self.w._mgr_payments_cb([_tx(10), _tx(20)])
+        self.w._mgr_more_payments_cb([_tx(20), _tx(25)])
+        self.assertEqual(self._epochs(), [25, 20, 10])
+        self.assertEqual(self.w._sync_cursor, 25)
+        self.assertEqual(self.payment_pings, [1, 1])
+
+    def test_incremental_without_news_changes_nothing(self):
+        self.w._mgr_payments_cb([_tx(10), _tx(20)])
+        self.w._mgr_more_payments_cb([_tx(20)])
+        self.w._mgr_more_payments_cb([])
+        self.assertEqual(self._epochs(), [20, 10])
+        self.assertEqual(self.payment_pings, [1])
+
+    def test_cursor_never_moves_back(self):
+        self.w._mgr_payments_cb([_tx(50)])
+        self.w._mgr_payments_cb([_tx(5)])
+        self.assertEqual(self.w._sync_cursor, 50)
+
+    def test_resume_seeds_list_and_cursor_from_cache(self):
+        sk = "nwc_sync_test"
+        wallet_cache.save_slot(sk, creds_fp="fs",
+                               payments=[Payment(7, 1, "")],
+                               sync_cursor=7)
+        self.w.slot_key = sk
+        self.w.creds_fingerprint = "fs"
+        mgr = _FakeManager()
+        self.w._resume_sync(mgr)
+        self.assertEqual(self._epochs(), [7])
+        self.assertEqual(mgr.list_from, 7)
+
+    def test_resume_without_cursor_asks_full_pages(self):
+        self.w.slot_key = "nwc_sync_test_empty"
+        self.w.creds_fingerprint = "fs"
+        mgr = _FakeManager()
+        self.w._resume_sync(mgr)
+        self.assertEqual(len(self.w.payment_list), 0)
+        self.assertIsNone(mgr.list_from)
+
+
 class TestSurrogatePairDecoding(unittest.TestCase):
     # _decode_surrogate_pairs ignores self -> exercised unbound.
 